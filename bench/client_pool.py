@@ -0,0 +1,96 @@
+"""
+Compare a new Azure OpenAI client per request against the shared, pooled one.
+
+Both talk to a local TLS stub server, so the difference is the cost of
+building a client plus the TCP and TLS handshakes a cold client pays.
+
+Usage:
+  ./run cmd python3 -m bench.client_pool [--requests 200] [--latency 0]
+"""
+
+import argparse
+import statistics
+import time
+
+from bench.stub_openai import StubOpenAIHandler
+from bench.stub_openai import StubServer
+from utils.openai import AzureOpenAIClient
+from utils.openai import create_http_client
+
+
+def timed(ask, requests):
+    """
+    Time each call of a function.
+
+    :param ask: Function sending 1 request
+    :type ask: callable
+    :param requests: Number of requests
+    :type requests: int
+    :return: list of latencies in milliseconds
+    """
+    latencies = []
+
+    for _ in range(requests):
+        start = time.perf_counter()
+        ask()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencies
+
+
+def summarize(name, latencies):
+    quantiles = statistics.quantiles(latencies, n=100)
+
+    return (
+        f"{name:<6} mean {statistics.mean(latencies):8.2f}ms  "
+        f"p50 {quantiles[49]:8.2f}ms  p95 {quantiles[94]:8.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Seconds the stub waits before answering",
+    )
+    args = parser.parse_args()
+
+    server = StubServer(StubOpenAIHandler, tls=True, latency=args.latency)
+    server.start()
+
+    def new_client():
+        return AzureOpenAIClient(
+            endpoint=server.url,
+            api_key="bench",
+            http_client=create_http_client(verify=server.ssl_context),
+        )
+
+    def ask(client):
+        client.get_answer(question="What is ML?", context="Bench")
+
+    def ask_cold():
+        client = new_client()
+        ask(client)
+        client.client.close()
+
+    warm_client = new_client()
+    ask(warm_client)
+
+    cold = timed(ask_cold, args.requests)
+    warm = timed(lambda: ask(warm_client), args.requests)
+
+    print(summarize("cold", cold))
+    print(summarize("warm", warm))
+    print(
+        f"warm connections are "
+        f"{statistics.mean(cold) / statistics.mean(warm):.1f}x faster"
+    )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
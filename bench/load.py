@@ -0,0 +1,383 @@
+"""
+Load test the auth, research list and research create endpoints under
+config/gunicorn.py with each worker model and report their latencies.
+
+Gunicorn, a stub Azure OpenAI API, a stub Pusher API and an outbox relay all
+run locally against the app's Postgres and Redis, so nothing leaves the
+machine and runs before and after a change can be compared.
+
+Usage:
+  ./run cmd python3 -m bench.load [--worker-models sync gthread asgi]
+    [--concurrency 16] [--duration 20] [--latency 0.5]
+    [--tokens-per-second 60] [--error-rate 0] [--json report.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from bench.stub_openai import StubOpenAIHandler
+from bench.stub_openai import StubServer
+from bench.stub_pusher import StubPusherHandler
+from ops.app import create_app
+from ops.research.models import Research
+from ops.seeds.synthetic import TextGenerator
+from ops.user.models import User
+
+USERNAME = "bench_load"
+PASSWORD = "bench_load_password"
+
+# Gunicorn arguments and app for each worker model, on top of
+# config/gunicorn.py.
+WORKER_MODELS = {
+    "sync": [
+        "--worker-class",
+        "sync",
+        "--threads",
+        "1",
+        "ops.app:create_app()",
+    ],
+    "gthread": ["--worker-class", "gthread", "ops.app:create_app()"],
+    "asgi": [
+        "--worker-class",
+        "uvicorn_worker.UvicornWorker",
+        "ops.asgi:create_asgi_app()",
+    ],
+}
+
+
+def login(client, token):
+    return client.post(
+        "/api/v1/", json={"identity": USERNAME, "password": PASSWORD}
+    )
+
+
+def list_researches(client, token):
+    return client.get(
+        "/api/v1/researches/",
+        params={"username": USERNAME, "limit": 20},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+
+def create_research(client, token):
+    return client.post(
+        "/api/v1/researches/",
+        json={"question": "What is machine learning?"},
+        headers={
+            "Authorization": f"Bearer {token}",
+            "X-Research-Cache": "bypass",
+        },
+    )
+
+
+ENDPOINTS = {
+    "auth": login,
+    "research_list": list_researches,
+    "research_create": create_research,
+}
+
+
+def seed(researches):
+    """
+    Create the user requests are sent as, with a research history to list.
+
+    :param researches: Number of researches in their history
+    :type researches: int
+    :return: None
+    """
+    app = create_app()
+
+    with app.app_context():
+        if User.find_by_identity(USERNAME):
+            return None
+
+        user = User(
+            username=USERNAME,
+            email=f"{USERNAME}@local.host",
+            password=PASSWORD,
+        )
+        user.save()
+
+        text = TextGenerator(seed=0)
+        mappings = []
+
+        for _ in range(researches):
+            mappings.append(
+                {
+                    "user_id": user.id,
+                    "question": text.question(),
+                    "answer": text.answer(),
+                    "status": "completed",
+                }
+            )
+
+        Research.bulk_insert(mappings)
+
+    return None
+
+
+def wait_until_up(base_url, process, timeout=60):
+    """
+    Wait for gunicorn to answer its health check.
+
+    :return: None
+    """
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited before it was up")
+
+        try:
+            if httpx.get(f"{base_url}/up/").status_code == 200:
+                return None
+        except httpx.HTTPError:
+            pass
+
+        time.sleep(0.25)
+
+    raise RuntimeError(f"gunicorn wasn't up after {timeout}s")
+
+
+def drive(base_url, endpoint, token, concurrency, duration):
+    """
+    Send requests to an endpoint from concurrency clients for duration
+    seconds, each client waits for its response before sending the next.
+
+    :return: dict of results
+    """
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client_loop():
+        results = []
+
+        with httpx.Client(base_url=base_url, timeout=120) as client:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+
+                try:
+                    status = endpoint(client, token).status_code
+                except httpx.HTTPError:
+                    status = 0
+
+                elapsed = (time.perf_counter() - start) * 1000
+                results.append((elapsed, status))
+
+        with lock:
+            samples.extend(results)
+
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=client_loop) for _ in range(concurrency)
+    ]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return summarize(samples, time.monotonic() - started)
+
+
+def summarize(samples, elapsed):
+    """
+    Summarize latencies (in milliseconds) and status codes.
+
+    :return: dict
+    """
+    latencies = [latency for latency, _ in samples]
+    errors = sum(1 for _, status in samples if not 200 <= status < 300)
+    quantiles = [0] * 99
+
+    if len(latencies) > 1:
+        quantiles = statistics.quantiles(latencies, n=100)
+
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": len(samples) / elapsed,
+        "p50": quantiles[49],
+        "p95": quantiles[94],
+        "p99": quantiles[98],
+    }
+
+
+def start_process(command, env):
+    return subprocess.Popen(
+        command,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_process(process):
+    process.terminate()
+
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def run_model(model, args, env):
+    """
+    Start gunicorn with a worker model and load test every endpoint.
+
+    :return: dict of results per endpoint
+    """
+    base_url = f"http://127.0.0.1:{args.port}"
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "-c",
+        "python:config.gunicorn",
+        "--bind",
+        f"127.0.0.1:{args.port}",
+        *WORKER_MODELS[model],
+    ]
+    env = {**env, "SERVER_NAME": f"127.0.0.1:{args.port}"}
+    gunicorn = start_process(command, env)
+
+    try:
+        wait_until_up(base_url, gunicorn)
+
+        with httpx.Client(base_url=base_url) as client:
+            token = login(client, None).json()["data"]["access_token"]
+
+        results = {}
+
+        for name in args.endpoints:
+            endpoint = ENDPOINTS[name]
+
+            drive(base_url, endpoint, token, args.concurrency, args.warmup)
+            results[name] = drive(
+                base_url, endpoint, token, args.concurrency, args.duration
+            )
+            print(format_row(model, name, results[name]), flush=True)
+    finally:
+        stop_process(gunicorn)
+
+    return results
+
+
+def format_row(model, endpoint, result):
+    return (
+        f"{model:<10} {endpoint:<16} {result['requests']:>8} "
+        f"{result['errors']:>7} {result['rps']:>9.1f} {result['p50']:>9.1f} "
+        f"{result['p95']:>9.1f} {result['p99']:>9.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--worker-models",
+        nargs="+",
+        choices=WORKER_MODELS,
+        default=list(WORKER_MODELS),
+    )
+    parser.add_argument(
+        "--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS)
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Gunicorn workers, defaults to WEB_CONCURRENCY's default",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=8,
+        help="Threads per gthread worker",
+    )
+    parser.add_argument("--researches", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=60)
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    openai = StubServer(
+        StubOpenAIHandler,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate,
+    ).start()
+    pusher = StubServer(StubPusherHandler).start()
+
+    env = {
+        **os.environ,
+        "AZURE_OPENAI_ENDPOINT": openai.url,
+        "AZURE_OPENAI_API_KEY": "bench",
+        "AZURE_OPENAI_HTTP2": "false",
+        "NOTIFIER": "pusher",
+        "PUSHER_HOST": "127.0.0.1",
+        "PUSHER_PORT": str(pusher.server_address[1]),
+        "PUSHER_SSL": "false",
+        "PYTHON_MAX_THREADS": str(args.threads),
+        # Measure the app itself, not how quickly it turns clients away.
+        "RATE_LIMIT_ENABLED": "false",
+        "RESEARCH_JOBS": "false",
+    }
+
+    if args.workers:
+        env["WEB_CONCURRENCY"] = str(args.workers)
+
+    seed(args.researches)
+
+    relay = start_process(
+        [
+            sys.executable,
+            "-m",
+            "flask",
+            "--app",
+            "ops.app:create_app()",
+            "notifications",
+            "relay",
+        ],
+        env,
+    )
+    report = {}
+
+    print(
+        f"{'model':<10} {'endpoint':<16} {'requests':>8} {'errors':>7} "
+        f"{'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    )
+
+    try:
+        for model in args.worker_models:
+            report[model] = run_model(model, args, env)
+    finally:
+        stop_process(relay)
+
+    print(f"openai stub: {dict(openai.stats)}")
+    print(f"pusher stub: {dict(pusher.stats)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": report}, f, indent=2)
+
+    openai.shutdown()
+    pusher.shutdown()
+
+
+if __name__ == "__main__":
+    main()
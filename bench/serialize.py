@@ -0,0 +1,120 @@
+"""
+Compare serializing list endpoints through ORM instances and marshmallow
+against the query_fields() + serializer() fast path.
+
+It runs against the app's database unless --database-url points elsewhere,
+the tables get created there if they don't exist yet.
+
+Usage:
+  ./run cmd python3 -m bench.serialize [--rows 10000] [--database-url URL]
+"""
+
+import argparse
+import random
+import string
+import time
+
+from config import settings
+from ops.app import create_app
+from ops.extensions import db
+from ops.research.models import Research
+from ops.research.schemas import ResearchSchema
+from ops.research.schemas import researches_schema
+from ops.user.models import User
+
+
+def random_text(length):
+    return "".join(random.choices(string.ascii_letters + " ", k=length))
+
+
+def seed(rows):
+    """
+    Create a user with a long research history.
+
+    :param rows: Number of researches
+    :type rows: int
+    :return: User id
+    """
+    user = User(username="bench_serialize", email="bench@serialize.local")
+    User.save_all([user])
+
+    Research.bulk_insert(
+        [
+            {
+                "user_id": user.id,
+                "question": random_text(random.randint(20, 300)),
+                "answer": random_text(random.randint(500, 2000)),
+                "status": "completed",
+            }
+            for _ in range(rows)
+        ]
+    )
+
+    return user.id
+
+
+def schema_path(user_id):
+    researches = Research.query.filter_by(user_id=user_id).all()
+
+    return researches_schema.dump(researches)
+
+
+def projection_path(user_id):
+    fields = ResearchSchema.Meta.fields
+    serialize = Research.serializer(fields)
+    rows = Research.query_fields(fields).filter_by(user_id=user_id).all()
+
+    return [serialize(row) for row in rows]
+
+
+def best_rate(path, user_id, rows, runs):
+    """
+    Run a serialization path a few times and keep the best rows / second.
+
+    :return: float
+    """
+    best = None
+
+    for _ in range(runs):
+        # Every request starts with an empty session (and identity map).
+        db.session.remove()
+
+        start = time.perf_counter()
+        path(user_id)
+        elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return rows / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--database-url", default=settings.SQLALCHEMY_DATABASE_URI
+    )
+    args = parser.parse_args()
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": args.database_url})
+
+    with app.app_context():
+        db.create_all()
+        user_id = seed(args.rows)
+
+        assert schema_path(user_id)[:10] == projection_path(user_id)[:10]
+
+        schema = best_rate(schema_path, user_id, args.rows, args.runs)
+        projection = best_rate(projection_path, user_id, args.rows, args.runs)
+
+        print(f"schema     {schema:>12,.0f} rows/s")
+        print(f"projection {projection:>12,.0f} rows/s")
+        print(f"projection is {projection / schema:.1f}x faster")
+
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+
+if __name__ == "__main__":
+    main()
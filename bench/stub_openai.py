@@ -0,0 +1,331 @@
+"""
+A local stand-in for the Azure OpenAI chat completions API.
+
+It speaks just enough of the API for utils.openai.AzureOpenAIClient so that
+benchmarks can run offline without paying for (or waiting on) real tokens.
+Latency, how fast tokens are generated and how often requests fail can be
+set to look like the real service.
+
+Usage:
+  ./run cmd python3 -m bench.stub_openai [--port 8081] [--latency 0.3]
+    [--tokens-per-second 60] [--answer-tokens 200] [--error-rate 0.01]
+"""
+
+import argparse
+import datetime
+import ipaddress
+import itertools
+import json
+import os
+import random
+import ssl
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+ANSWER = "Machine learning is a way of teaching computers by example."
+
+
+def completion(content, model="stub"):
+    """
+    Build a chat completion response body.
+
+    :param content: Answer
+    :type content: str
+    :param model: Model name
+    :type model: str
+    :return: dict
+    """
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 20,
+            "completion_tokens": len(content.split()),
+            "total_tokens": 20 + len(content.split()),
+        },
+    }
+
+
+def chunk(content, finish_reason=None, model="stub"):
+    """
+    Build a streamed chat completion chunk.
+
+    :param content: Answer delta
+    :type content: str
+    :param finish_reason: Why the answer ended, set on the last chunk
+    :type finish_reason: str
+    :param model: Model name
+    :type model: str
+    :return: dict
+    """
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": finish_reason,
+                "delta": {"content": content},
+            }
+        ],
+    }
+
+
+def answer_tokens(count):
+    """
+    Build an answer of count tokens (1 word is 1 token here).
+
+    :param count: Number of tokens
+    :type count: int
+    :return: list of str
+    """
+    words = itertools.cycle(ANSWER.split())
+
+    return [next(words) for _ in range(count)]
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 is needed for keep-alive connections.
+    protocol_version = "HTTP/1.1"
+    # Avoid 40ms delayed ACK stalls between the headers and the body.
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or "{}")
+        server = self.server
+
+        server.count("requests")
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if random.random() < server.error_rate:
+            server.count("errors")
+
+            return self.send_error_json(server.error_status)
+
+        count = min(server.answer_tokens, body.get("max_tokens") or 1 << 30)
+        tokens = answer_tokens(count)
+
+        if body.get("stream"):
+            return self.send_stream(tokens)
+
+        if server.tokens_per_second:
+            time.sleep(len(tokens) / server.tokens_per_second)
+
+        self.send_json(200, completion(" ".join(tokens)))
+
+    def send_stream(self, tokens):
+        """
+        Send tokens as server sent events, paced by the token rate.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for i, token in enumerate(tokens):
+            if self.server.tokens_per_second:
+                time.sleep(1 / self.server.tokens_per_second)
+
+            self.write_event(chunk(token if i == 0 else f" {token}"))
+
+        self.write_event(chunk("", finish_reason="stop"))
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.write_chunk(b"")
+
+    def write_event(self, data):
+        self.write_chunk(f"data: {json.dumps(data)}\n\n".encode("utf-8"))
+
+    def write_chunk(self, payload):
+        self.wfile.write(f"{len(payload):x}\r\n".encode("ascii"))
+        self.wfile.write(payload + b"\r\n")
+        self.wfile.flush()
+
+    def send_error_json(self, status):
+        headers = {"Retry-After": "1"} if status == 429 else {}
+        body = {
+            "error": {
+                "code": str(status),
+                "message": "Injected by the stub server",
+            }
+        }
+
+        self.send_json(status, body, headers)
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once, the default backlog of 5
+    # resets some of them before they're accepted.
+    request_queue_size = 128
+
+    # Defaults handlers read, override them with options.
+    latency = 0
+    tokens_per_second = 0
+    answer_tokens = len(ANSWER.split())
+    error_rate = 0
+    error_status = 500
+
+    def __init__(self, handler, port=0, tls=False, **options):
+        super().__init__(("127.0.0.1", port), handler)
+
+        for name, value in options.items():
+            setattr(self, name, value)
+
+        self.ssl_context = None
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+        if tls:
+            self.ssl_context = self._wrap_tls()
+
+    def count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    @property
+    def url(self):
+        scheme = "https" if self.ssl_context else "http"
+
+        return f"{scheme}://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        """
+        Serve requests in a background thread.
+
+        :return: self
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+        return self
+
+    def _wrap_tls(self):
+        """
+        Serve over TLS with a throwaway self-signed certificate.
+
+        :return: SSL context clients should trust
+        """
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "stub")])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(
+                x509.SubjectAlternativeName(
+                    [x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+                ),
+                critical=False,
+            )
+            .sign(key, hashes.SHA256())
+        )
+
+        cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+        key_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            cert_path = os.path.join(directory, "cert.pem")
+            key_path = os.path.join(directory, "key.pem")
+
+            with open(cert_path, "wb") as f:
+                f.write(cert_pem)
+            with open(key_path, "wb") as f:
+                f.write(key_pem)
+
+            server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            server_context.load_cert_chain(cert_path, key_path)
+
+        self.socket = server_context.wrap_socket(self.socket, server_side=True)
+
+        return ssl.create_default_context(cadata=cert_pem.decode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0,
+        help="Seconds before the first token",
+    )
+    parser.add_argument("--tokens-per-second", type=float, default=0)
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0,
+        help="Share of requests failing, from 0 to 1",
+    )
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    server = StubServer(
+        StubOpenAIHandler,
+        port=args.port,
+        tls=args.tls,
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    print(f"Serving a stub Azure OpenAI API on {server.url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+A local stand-in for Pusher's HTTP API, it accepts and counts the events
+relays trigger so load tests don't reach (or get rate limited by) Pusher.
+
+Point the app at it with PUSHER_HOST, PUSHER_PORT and PUSHER_SSL=false.
+
+Usage:
+  ./run cmd python3 -m bench.stub_pusher [--port 8082] [--latency 0.05]
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler
+
+from bench.stub_openai import StubServer
+
+
+class StubPusherHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 is needed for keep-alive connections.
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or "{}")
+        server = self.server
+
+        server.count("requests")
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if random.random() < server.error_rate:
+            server.count("errors")
+
+            return self.send_json(server.error_status, {})
+
+        # /apps/<app_id>/events sends 1 event, batch_events up to 10.
+        if self.path.split("?")[0].endswith("/batch_events"):
+            server.count("events", len(body.get("batch", [])))
+        else:
+            server.count("events")
+
+        self.send_json(200, {})
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    server = StubServer(
+        StubPusherHandler,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    print(f"Serving a stub Pusher API on {server.url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(dict(server.stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,18 @@ accesslog = "-"
 access_log_format = "%(h)s %(l)s %(u)s %(t)s '%(r)s' %(s)s %(b)s '%(f)s' '%(a)s' in %(D)sµs"  # noqa: E501
 
 workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2))
+# Streams (such as research events with NOTIFIER=redis) hold a thread each
+# for as long as they're open, they need more than 1 thread per worker.
 threads = int(os.getenv("PYTHON_MAX_THREADS", 1))
 
+# ASGI workers create researches on an event loop, each of them can wait on
+# many Azure OpenAI calls at once instead of 1 per thread.
+if str_to_bool(os.getenv("WEB_ASGI", "false")):
+    worker_class = "uvicorn_worker.UvicornWorker"
+    wsgi_app = "ops.asgi:create_asgi_app()"
+else:
+    wsgi_app = "ops.app:create_app()"
+
 reload = bool(str_to_bool(os.getenv("WEB_RELOAD", "false")))
 
 timeout = int(os.getenv("WEB_TIMEOUT", 120))
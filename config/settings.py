@@ -1,3 +1,4 @@
+import json
 import os
 
 from utils.main import str_to_bool
@@ -17,6 +18,18 @@ pg_db = os.getenv("POSTGRES_DB", pg_user)
 db = f"postgresql+psycopg://{pg_user}:{pg_pass}@{pg_host}:{pg_port}/{pg_db}"
 SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", db)
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+# Connections of the async engine used by async views (under an ASGI worker),
+# they're only held while saving, not while waiting on Azure OpenAI.
+SQLALCHEMY_ASYNC_POOL_SIZE = int(os.getenv("SQLALCHEMY_ASYNC_POOL_SIZE", 10))
+SQLALCHEMY_ASYNC_MAX_OVERFLOW = int(
+    os.getenv("SQLALCHEMY_ASYNC_MAX_OVERFLOW", 10)
+)
+
+# Every request has to be done within this many seconds (0 for no deadline),
+# clients can ask for less with an X-Request-Deadline header. Azure OpenAI
+# calls, their retries and database statements are cut short to make it, or
+# the request gets a 504. Keep it under WEB_TIMEOUT so workers aren't killed.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 100))
 
 # Redis.
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
@@ -26,16 +39,147 @@ PUSHER_APP_ID = os.getenv("PUSHER_APP_ID", "123")
 PUSHER_KEY = os.getenv("PUSHER_KEY", "123")
 PUSHER_SECRET = os.getenv("PUSHER_SECRET", "123")
 PUSHER_CLUSTER = os.getenv("PUSHER_CLUSTER", "us2")
-PUSHER_SSL = True
+# Talk to another Pusher compatible server instead of the cluster's, such as
+# the stub bench/load.py runs.
+PUSHER_HOST = os.getenv("PUSHER_HOST", None)
+PUSHER_PORT = int(os.getenv("PUSHER_PORT", 0)) or None
+PUSHER_SSL = bool(str_to_bool(os.getenv("PUSHER_SSL", "true")))
 PUSHER_AUTH_ENDPOINT = "/api/auth/pusher/"
 
+# Send realtime events with pusher, or with redis to stream them to browsers
+# from GET /api/v1/researches/events without a third party service. Each open
+# stream holds a web worker thread for up to 5 minutes, so redis needs enough
+# PYTHON_MAX_THREADS for every tab a worker serves.
+NOTIFIER = os.getenv("NOTIFIER", "pusher")
+
+# Relays send outbox events to Pusher in batches, this is how many times a
+# batch is tried before the relay backs off.
+PUSHER_RETRY_ATTEMPTS = int(os.getenv("PUSHER_RETRY_ATTEMPTS", 3))
+
 # Configure AZURE OPENAI API
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY", None)
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT", None)
 
+# Each worker process keeps a pool of keep-alive connections to Azure OpenAI.
+AZURE_OPENAI_MAX_CONNECTIONS = int(
+    os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", 20)
+)
+AZURE_OPENAI_MAX_KEEPALIVE = int(os.getenv("AZURE_OPENAI_MAX_KEEPALIVE", 10))
+# The async views of ASGI workers wait on many more requests at once.
+AZURE_OPENAI_ASYNC_MAX_CONNECTIONS = int(
+    os.getenv("AZURE_OPENAI_ASYNC_MAX_CONNECTIONS", 200)
+)
+AZURE_OPENAI_KEEPALIVE_EXPIRY = float(
+    os.getenv("AZURE_OPENAI_KEEPALIVE_EXPIRY", 30)
+)
+AZURE_OPENAI_CONNECT_TIMEOUT = float(
+    os.getenv("AZURE_OPENAI_CONNECT_TIMEOUT", 5)
+)
+AZURE_OPENAI_READ_TIMEOUT = float(os.getenv("AZURE_OPENAI_READ_TIMEOUT", 60))
+AZURE_OPENAI_HTTP2 = bool(str_to_bool(os.getenv("AZURE_OPENAI_HTTP2", "true")))
+
+# Throttled, failed and timed out requests are tried this many times, waiting
+# as long as Retry-After asks (up to the max wait) or backing off.
+AZURE_OPENAI_RETRY_ATTEMPTS = int(os.getenv("AZURE_OPENAI_RETRY_ATTEMPTS", 3))
+AZURE_OPENAI_MAX_RETRY_WAIT = float(
+    os.getenv("AZURE_OPENAI_MAX_RETRY_WAIT", 30)
+)
+
+# Stop calling Azure OpenAI for a while (and respond with a 503) once this
+# many requests failed or took longer than the slow call seconds (0 to
+# disable) within the window, across every process.
+AZURE_OPENAI_BREAKER_FAILURES = int(
+    os.getenv("AZURE_OPENAI_BREAKER_FAILURES", 5)
+)
+AZURE_OPENAI_BREAKER_WINDOW = int(os.getenv("AZURE_OPENAI_BREAKER_WINDOW", 30))
+AZURE_OPENAI_BREAKER_RESET_TIMEOUT = int(
+    os.getenv("AZURE_OPENAI_BREAKER_RESET_TIMEOUT", 30)
+)
+AZURE_OPENAI_BREAKER_SLOW_CALL = float(
+    os.getenv("AZURE_OPENAI_BREAKER_SLOW_CALL", 30)
+)
+
+# Limit requests to each deployment across every process, to stay within its
+# quota: at most this many in flight (0 for no limit) and this many tokens per
+# minute (0 for no limit). Requests over the limits wait up to the max queue
+# wait and are then rejected with a 429.
+AZURE_OPENAI_MAX_IN_FLIGHT = int(os.getenv("AZURE_OPENAI_MAX_IN_FLIGHT", 0))
+AZURE_OPENAI_TOKENS_PER_MINUTE = int(
+    os.getenv("AZURE_OPENAI_TOKENS_PER_MINUTE", 0)
+)
+AZURE_OPENAI_MAX_QUEUE_WAIT = float(
+    os.getenv("AZURE_OPENAI_MAX_QUEUE_WAIT", 5)
+)
+# Override the limits above per deployment, for example:
+# {"gpt-4": {"max_in_flight": 20, "tokens_per_minute": 80000}}
+AZURE_OPENAI_DEPLOYMENT_LIMITS = json.loads(
+    os.getenv("AZURE_OPENAI_DEPLOYMENT_LIMITS", "{}")
+)
+
+# Cache answers to identical questions in Redis for this many seconds (0 to
+# disable) and keep at most this many answers, evicting the least recently
+# used ones first.
+RESEARCH_CACHE_TTL = int(os.getenv("RESEARCH_CACHE_TTL", 86400))
+RESEARCH_CACHE_MAX_ENTRIES = int(
+    os.getenv("RESEARCH_CACHE_MAX_ENTRIES", 10000)
+)
+
+# Answer researches in a Celery worker instead of the web request. When this
+# is enabled creating a research returns a 202 with a job id to poll.
+RESEARCH_JOBS = bool(str_to_bool(os.getenv("RESEARCH_JOBS", "false")))
+
+# How many questions can be researched in 1 batch request, and how many of
+# them are sent to Azure OpenAI at the same time.
+RESEARCH_BATCH_MAX_QUESTIONS = int(
+    os.getenv("RESEARCH_BATCH_MAX_QUESTIONS", 10)
+)
+RESEARCH_BATCH_CONCURRENCY = int(os.getenv("RESEARCH_BATCH_CONCURRENCY", 5))
+
+# How long (in seconds) streamed answers are buffered in Redis so a client can
+# resume them with Last-Event-ID, and how long a resumed stream waits for new
+# chunks before giving up.
+RESEARCH_STREAM_TTL = int(os.getenv("RESEARCH_STREAM_TTL", 300))
+RESEARCH_STREAM_IDLE_TIMEOUT = int(
+    os.getenv("RESEARCH_STREAM_IDLE_TIMEOUT", 30)
+)
+
+# Token buckets limiting requests per user (with a valid JWT) and per IP
+# address, as a number of tokens per second, minute, hour or day. Rules are
+# looked up by endpoint and then by blueprint. Creating researches costs the
+# max_tokens their answers can use (800 by default), not 1 token per request.
+RATE_LIMIT_ENABLED = bool(str_to_bool(os.getenv("RATE_LIMIT_ENABLED", "true")))
+RESEARCH_CREATE_RATE_LIMIT = {
+    "per_user": "16000/minute",
+    "per_ip": "48000/minute",
+    "cost": "max_tokens",
+}
+RATE_LIMITS = {
+    "api_v1.auth.post": {"per_ip": "10/minute"},
+    "api_v1.auth": {"per_user": "60/minute", "per_ip": "300/minute"},
+    "api_v1.researches.post": RESEARCH_CREATE_RATE_LIMIT,
+    "api_v1.researches.batch": RESEARCH_CREATE_RATE_LIMIT,
+    "api_v1.researches.stream": RESEARCH_CREATE_RATE_LIMIT,
+    "api_v1.researches": {"per_user": "300/minute", "per_ip": "600/minute"},
+    **json.loads(os.getenv("RATE_LIMITS", "{}")),
+}
+
+# Cache users resolved from JWTs in Redis for this many seconds (0 to disable)
+# and in each worker process for a few seconds, up to this many users.
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))
+USER_CACHE_LOCAL_TTL = int(os.getenv("USER_CACHE_LOCAL_TTL", 5))
+USER_CACHE_LOCAL_MAXSIZE = int(os.getenv("USER_CACHE_LOCAL_MAXSIZE", 1000))
+
+# Remember log in and registration lookups of unknown e-mails and usernames
+# for this many seconds (0 to disable).
+USER_MISSING_CACHE_TTL = int(os.getenv("USER_MISSING_CACHE_TTL", 30))
+
+# /up/metrics is only served to requests with an Authorization: Bearer header
+# holding this token, leave it empty to not serve it at all.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 # Celery.
 CELERY_CONFIG = {
     "broker_url": REDIS_URL,
     "result_backend": REDIS_URL,
-    "include": [],
+    "include": ["ops.research.tasks", "ops.user.tasks"],
 }
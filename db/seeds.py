@@ -1,11 +1,40 @@
 # This file should contain records you want created when you run flask db seed.
-#
-# Example:
-# from yourapp.models import User
+from ops.research.models import Research
+from ops.user.models import User
 
+DEMO_RESEARCHES = [
+    (
+        "What is a database index?",
+        "A data structure that lets the database find rows without reading "
+        "the whole table, at the cost of slower writes and extra storage.",
+    ),
+    (
+        "What is keyset pagination?",
+        "Paginating by remembering the last row of a page and continuing "
+        "after it, which keeps every page as fast as the first one.",
+    ),
+    (
+        "What is a message queue?",
+        "A buffer between programs so producers can hand off work without "
+        "waiting for consumers to process it.",
+    ),
+]
 
-# initial_user = {
-#     'username': 'superadmin'
-# }
-# if User.find_by_username(initial_user['username']) is None:
-#     User(**initial_user).save()
+# Flask-DB runs this file with exec() inside a function, so comprehensions
+# can't see the names defined here, plain loops can.
+if User.find_by_identity("demo") is None:
+    user = User(username="demo", email="demo@local.host", password="password")
+    user.save()
+
+    researches = []
+    for question, answer in DEMO_RESEARCHES:
+        researches.append(
+            {
+                "user_id": user.id,
+                "question": question,
+                "answer": answer,
+                "status": "completed",
+            }
+        )
+
+    Research.bulk_insert(researches)
@@ -0,0 +1,44 @@
+"""add researches count to users
+
+Revision ID: 204af3c09720
+Revises: fc139950f52a
+Create Date: 2026-10-17 14:26:52.904117
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "204af3c09720"
+down_revision = "fc139950f52a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "users",
+        sa.Column(
+            "researches_count",
+            sa.Integer(),
+            server_default="0",
+            nullable=False,
+        ),
+    )
+    op.execute(
+        """
+        UPDATE users
+        SET researches_count = counts.researches_count
+        FROM (
+            SELECT user_id, count(*) AS researches_count
+            FROM researches
+            GROUP BY user_id
+        ) AS counts
+        WHERE users.id = counts.user_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_column("users", "researches_count")
@@ -0,0 +1,37 @@
+"""add researches pagination index
+
+Revision ID: 2ac6ce002e63
+Revises: e48278284231
+Create Date: 2026-10-17 11:02:15.604913
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2ac6ce002e63"
+down_revision = "e48278284231"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the index without blocking writes to the researches table.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_researches_user_id_created_on_id",
+            "researches",
+            ["user_id", sa.text("created_on DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_researches_user_id_created_on_id",
+            table_name="researches",
+            postgresql_concurrently=True,
+        )
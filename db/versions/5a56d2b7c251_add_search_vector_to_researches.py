@@ -0,0 +1,58 @@
+"""add search vector to researches
+
+Revision ID: 5a56d2b7c251
+Revises: b942d25b8e22
+Create Date: 2026-10-17 17:11:26.530874
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "5a56d2b7c251"
+down_revision = "b942d25b8e22"
+branch_labels = None
+depends_on = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(question, '')), 'A')"
+    " || setweight(to_tsvector('english', coalesce(answer, '')), 'B')"
+)
+
+
+def upgrade():
+    # Adding a stored generated column rewrites the table once.
+    op.add_column(
+        "researches",
+        sa.Column(
+            "search_vector",
+            postgresql.TSVECTOR(),
+            sa.Computed(SEARCH_VECTOR, persisted=True),
+            nullable=True,
+        ),
+    )
+
+    # Build the index without blocking writes to the researches table.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_researches_search_vector",
+            "researches",
+            ["search_vector"],
+            unique=False,
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_researches_search_vector",
+            table_name="researches",
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+
+    op.drop_column("researches", "search_vector")
@@ -0,0 +1,43 @@
+"""create outbox
+
+Revision ID: b942d25b8e22
+Revises: e6d71daa17ac
+Create Date: 2026-10-17 16:02:48.113590
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+import lib.util_sqlalchemy
+
+# revision identifiers, used by Alembic.
+revision = "b942d25b8e22"
+down_revision = "e6d71daa17ac"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "outbox",
+        sa.Column(
+            "created_on",
+            lib.util_sqlalchemy.AwareDateTime(),
+            nullable=True,
+        ),
+        sa.Column(
+            "updated_on",
+            lib.util_sqlalchemy.AwareDateTime(),
+            nullable=True,
+        ),
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("channel", sa.String(length=200), nullable=False),
+        sa.Column("event", sa.String(length=200), nullable=False),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("outbox")
@@ -0,0 +1,44 @@
+"""add status to researches
+
+Revision ID: e48278284231
+Revises:
+Create Date: 2026-10-17 09:12:41.318227
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e48278284231"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "researches",
+        sa.Column(
+            "status",
+            sa.Enum(
+                "pending",
+                "completed",
+                "failed",
+                name="research_statuses",
+                native_enum=False,
+            ),
+            nullable=False,
+            server_default="completed",
+        ),
+    )
+    op.create_index(
+        op.f("ix_researches_status"), "researches", ["status"], unique=False
+    )
+    op.alter_column("researches", "answer", server_default="")
+
+
+def downgrade():
+    op.alter_column("researches", "answer", server_default=None)
+    op.drop_index(op.f("ix_researches_status"), table_name="researches")
+    op.drop_column("researches", "status")
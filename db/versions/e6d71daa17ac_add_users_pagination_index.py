@@ -0,0 +1,37 @@
+"""add users pagination index
+
+Revision ID: e6d71daa17ac
+Revises: 204af3c09720
+Create Date: 2026-10-17 15:08:33.471920
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e6d71daa17ac"
+down_revision = "204af3c09720"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the index without blocking writes to the users table.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_created_on_id",
+            "users",
+            [sa.text("created_on DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_created_on_id",
+            table_name="users",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,49 @@
+"""add users lower identity indexes
+
+Revision ID: fc139950f52a
+Revises: 2ac6ce002e63
+Create Date: 2026-10-17 13:41:07.218534
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "fc139950f52a"
+down_revision = "2ac6ce002e63"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Build the indexes without blocking writes to the users table.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_lower_email",
+            "users",
+            [sa.text("lower(email)")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_users_lower_username",
+            "users",
+            [sa.text("lower(username)")],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_lower_username",
+            table_name="users",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_users_lower_email",
+            table_name="users",
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,330 @@
+import asyncio
+import contextlib
+import logging
+import math
+import time
+import uuid
+
+import redis.exceptions
+
+log = logging.getLogger(__name__)
+
+# Take a slot (a lease which expires, in case its process dies) if fewer
+# than max_in_flight are taken, and take cost tokens from a bucket refilled
+# at tokens_per_minute. Returns {admitted, seconds to wait before retrying}.
+ACQUIRE_SCRIPT = """
+local slots, bucket = KEYS[1], KEYS[2]
+local lease_id, lease_seconds = ARGV[1], tonumber(ARGV[2])
+local max_in_flight, tokens_per_minute = tonumber(ARGV[3]), tonumber(ARGV[4])
+local cost = math.min(tonumber(ARGV[5]), tokens_per_minute)
+
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+redis.call("ZREMRANGEBYSCORE", slots, "-inf", now)
+
+if max_in_flight > 0 and redis.call("ZCARD", slots) >= max_in_flight then
+  return {0, "0"}
+end
+
+if tokens_per_minute > 0 then
+  local rate = tokens_per_minute / 60
+  local state = redis.call("HMGET", bucket, "tokens", "updated")
+  local tokens = tonumber(state[1]) or tokens_per_minute
+  local updated = tonumber(state[2]) or now
+
+  tokens = math.min(tokens_per_minute, tokens + (now - updated) * rate)
+
+  if tokens < cost then
+    redis.call("HSET", bucket, "tokens", tokens, "updated", now)
+    return {0, tostring((cost - tokens) / rate)}
+  end
+
+  redis.call("HSET", bucket, "tokens", tokens - cost, "updated", now)
+  redis.call("EXPIRE", bucket, 120)
+end
+
+redis.call("ZADD", slots, now + lease_seconds, lease_id)
+redis.call("EXPIRE", slots, math.ceil(lease_seconds))
+
+return {1, "0"}
+"""
+
+# Give a slot back along with the tokens it reserved but didn't use.
+RELEASE_SCRIPT = """
+local slots, bucket = KEYS[1], KEYS[2]
+local lease_id, refund = ARGV[1], tonumber(ARGV[2])
+local tokens_per_minute = tonumber(ARGV[3])
+
+redis.call("ZREM", slots, lease_id)
+
+if refund > 0 and tokens_per_minute > 0 then
+  local tokens = tonumber(redis.call("HGET", bucket, "tokens"))
+
+  if tokens then
+    tokens = math.min(tokens_per_minute, tokens + refund)
+    redis.call("HSET", bucket, "tokens", tokens)
+  end
+end
+
+return 1
+"""
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a call can't be admitted within the maximum queue wait.
+    """
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = max(1, math.ceil(retry_after))
+
+        super().__init__(
+            f"{name} is at capacity, retry in {self.retry_after}s"
+        )
+
+
+class Lease(object):
+    """
+    A slot and tokens taken from an AdmissionControl, set used_tokens once
+    they're known so the unused ones go back to the budget.
+    """
+
+    def __init__(self, lease_id, cost):
+        self.lease_id = lease_id
+        self.cost = cost
+        self.used_tokens = None
+        self.queued = False
+
+
+class AdmissionControl(object):
+    """
+    Limit calls to a service across every process (and server) with a
+    distributed semaphore of in-flight calls and a tokens per minute budget,
+    both kept in Redis.
+
+    Calls which can't be admitted right away queue (polling Redis) for up to
+    max_queue_wait seconds, calls which wouldn't make it are shed right away.
+
+    When Redis is unavailable calls are admitted, Redis being down is no
+    reason to stop calling the service.
+    """
+
+    # How often queued calls check for a free slot.
+    POLL_INTERVAL = 0.05
+
+    def __init__(
+        self,
+        client,
+        name,
+        max_in_flight=0,
+        tokens_per_minute=0,
+        max_queue_wait=0,
+        lease_seconds=300,
+    ):
+        self.client = client
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue_wait = max_queue_wait
+        self.lease_seconds = lease_seconds
+
+        self.slots_key = f"admission:{name}:slots"
+        self.queue_key = f"admission:{name}:queue"
+        self.bucket_key = f"admission:{name}:bucket"
+        self.stats_key = f"admission:{name}:stats"
+
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    @property
+    def enabled(self):
+        return self.max_in_flight > 0 or self.tokens_per_minute > 0
+
+    @contextlib.contextmanager
+    def admit(self, cost, max_wait=None):
+        """
+        Wait for a slot and cost tokens, then hold them during the call.
+
+        :param cost: Tokens the call is expected to use
+        :type cost: int
+        :param max_wait: Queue for less than max_queue_wait, such as until a
+            request's deadline
+        :type max_wait: float
+        :raises AdmissionRejected: When the call isn't admitted in time
+        :return: Lease
+        """
+        start = time.monotonic()
+        lease = Lease(str(uuid.uuid4()), cost)
+
+        while True:
+            wait = self._try_acquire(lease, start, max_wait)
+
+            if wait is None:
+                break
+
+            time.sleep(wait)
+
+        try:
+            yield lease
+        finally:
+            self._release_lease(lease)
+
+    @contextlib.asynccontextmanager
+    async def admit_async(self, cost, max_wait=None):
+        """
+        The async version of admit(), queued calls don't block the loop.
+
+        :param cost: Tokens the call is expected to use
+        :type cost: int
+        :param max_wait: Queue for less than max_queue_wait
+        :type max_wait: float
+        :raises AdmissionRejected: When the call isn't admitted in time
+        :return: Lease
+        """
+        start = time.monotonic()
+        lease = Lease(str(uuid.uuid4()), cost)
+
+        while True:
+            # Redis is called from a thread, not to block the loop.
+            wait = await asyncio.to_thread(
+                self._try_acquire, lease, start, max_wait
+            )
+
+            if wait is None:
+                break
+
+            await asyncio.sleep(wait)
+
+        try:
+            yield lease
+        finally:
+            await asyncio.to_thread(self._release_lease, lease)
+
+    def stats(self):
+        """
+        Return the admission gauges and counters, for metrics.
+
+        :return: dict, or None while Redis can't be reached
+        """
+        now = time.time()
+
+        try:
+            in_flight, waiting, counters = (
+                self.client.pipeline()
+                .zcount(self.slots_key, now, "+inf")
+                .zcount(self.queue_key, now, "+inf")
+                .hgetall(self.stats_key)
+                .execute()
+            )
+        except redis.exceptions.RedisError:
+            log.warning("Admission %s can't reach Redis", self.name)
+            return None
+        counters = {
+            name.decode("utf-8"): float(value)
+            for name, value in counters.items()
+        }
+        queued = counters.get("queued", 0)
+        queue_wait = counters.get("queue_wait_seconds", 0)
+
+        return {
+            "in_flight": in_flight,
+            "waiting": waiting,
+            "admitted": int(counters.get("admitted", 0)),
+            "queued": int(queued),
+            "rejected": int(counters.get("rejected", 0)),
+            "avg_queue_wait_ms": queue_wait / queued * 1000 if queued else 0,
+        }
+
+    def _try_acquire(self, lease, start, max_wait=None):
+        """
+        Try to take a slot and tokens once.
+
+        :return: None once admitted, or seconds to wait before trying again
+        :raises AdmissionRejected: When the call wouldn't be admitted in time
+        """
+        if not self.enabled:
+            return None
+
+        waited = time.monotonic() - start
+
+        try:
+            admitted, retry_after = self._acquire(
+                keys=[self.slots_key, self.bucket_key],
+                args=[
+                    lease.lease_id,
+                    self.lease_seconds,
+                    self.max_in_flight,
+                    self.tokens_per_minute,
+                    lease.cost,
+                ],
+            )
+        except redis.exceptions.RedisError:
+            log.warning("Admission %s can't reach Redis", self.name)
+            return None
+
+        if admitted:
+            self._record(lease, "admitted", waited)
+            return None
+
+        wait = max(float(retry_after), self.POLL_INTERVAL)
+
+        if max_wait is None or max_wait > self.max_queue_wait:
+            max_wait = self.max_queue_wait
+
+        if waited + wait > max_wait:
+            self._record(lease, "rejected", waited)
+            raise AdmissionRejected(self.name, wait)
+
+        if not lease.queued:
+            lease.queued = True
+            self._record(lease, "waiting", waited)
+
+        return wait
+
+    def _release_lease(self, lease):
+        if not self.enabled:
+            return None
+
+        refund = 0
+
+        if lease.used_tokens is not None:
+            refund = max(0, lease.cost - lease.used_tokens)
+
+        try:
+            self._release(
+                keys=[self.slots_key, self.bucket_key],
+                args=[lease.lease_id, refund, self.tokens_per_minute],
+            )
+        except redis.exceptions.RedisError:
+            log.warning("Admission %s can't reach Redis", self.name)
+
+        return None
+
+    def _record(self, lease, outcome, waited):
+        """
+        Update the gauges and counters of a call which was admitted,
+        rejected or started waiting.
+        """
+        pipeline = self.client.pipeline()
+
+        if outcome == "waiting":
+            # Queued calls expire from the gauge if their process dies.
+            expires = time.time() + self.max_queue_wait + 1
+            pipeline.zadd(self.queue_key, {lease.lease_id: expires})
+            pipeline.expire(self.queue_key, math.ceil(self.max_queue_wait + 1))
+        else:
+            pipeline.hincrby(self.stats_key, outcome, 1)
+
+            if lease.queued:
+                pipeline.zrem(self.queue_key, lease.lease_id)
+
+        if outcome == "admitted" and lease.queued:
+            pipeline.hincrby(self.stats_key, "queued", 1)
+            pipeline.hincrbyfloat(self.stats_key, "queue_wait_seconds", waited)
+
+        try:
+            pipeline.execute()
+        except redis.exceptions.RedisError:
+            log.warning("Admission %s can't reach Redis", self.name)
@@ -0,0 +1,234 @@
+import asyncio
+import contextlib
+import logging
+import math
+import time
+
+import redis.exceptions
+
+log = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a service while its circuit is open.
+    """
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = max(1, math.ceil(retry_after))
+
+        super().__init__(
+            f"The {name} circuit is open, retry in {self.retry_after}s"
+        )
+
+
+class CircuitBreaker(object):
+    """
+    Stop calling a failing service for a while. The circuit's state is kept
+    in Redis so every process (and server) trips and recovers together.
+
+    Failures (errors and slow calls) are counted in a fixed window, reaching
+    the threshold opens the circuit for reset_timeout seconds. After that 1
+    caller gets to probe the service (half open), its call either closes the
+    circuit or opens it again.
+
+    When Redis is unavailable the circuit stays closed, Redis being down is
+    no reason to stop calling the service.
+    """
+
+    # How long callers wait on a half open circuit while another probes it.
+    PROBE_RETRY_AFTER = 1
+
+    def __init__(
+        self,
+        client,
+        name,
+        failure_threshold=5,
+        window=30,
+        reset_timeout=30,
+        slow_call_seconds=0,
+    ):
+        self.client = client
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+
+        self.open_key = f"circuit:{name}:open_until"
+        self.probe_key = f"circuit:{name}:probe"
+        self.failures_key = f"circuit:{name}:failures"
+
+    @contextlib.contextmanager
+    def protect(self, is_failure=lambda error: True):
+        """
+        Guard a call to the service.
+
+        :param is_failure: Whether an error counts towards opening the
+            circuit, errors such as a bad request don't
+        :type is_failure: callable
+        :raises CircuitOpenError: When the service shouldn't be called
+        :return: None
+        """
+        probe = self.allow()
+        start = time.monotonic()
+
+        try:
+            yield
+        except Exception as error:
+            self._record(probe, is_failure(error))
+            raise
+
+        self._record(probe, self._too_slow(start))
+
+    @contextlib.asynccontextmanager
+    async def protect_async(self, is_failure=lambda error: True):
+        """
+        The async version of protect(), Redis is called from a thread so it
+        doesn't block the loop.
+
+        :param is_failure: Whether an error counts towards opening the
+            circuit, errors such as a bad request don't
+        :type is_failure: callable
+        :raises CircuitOpenError: When the service shouldn't be called
+        :return: None
+        """
+        probe = await asyncio.to_thread(self.allow)
+        start = time.monotonic()
+
+        try:
+            yield
+        except Exception as error:
+            await asyncio.to_thread(self._record, probe, is_failure(error))
+            raise
+
+        await asyncio.to_thread(self._record, probe, self._too_slow(start))
+
+    def allow(self):
+        """
+        Check whether the service can be called.
+
+        :raises CircuitOpenError: When the circuit is open
+        :return: True when this call probes a half open circuit
+        """
+        try:
+            open_until = self.client.get(self.open_key)
+
+            if open_until is None:
+                return False
+
+            remaining = float(open_until) - time.time()
+
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+
+            if self.client.set(
+                self.probe_key, 1, nx=True, ex=math.ceil(self.reset_timeout)
+            ):
+                return True
+        except redis.exceptions.RedisError:
+            log.warning("Circuit %s can't reach Redis", self.name)
+            return False
+
+        raise CircuitOpenError(self.name, self.PROBE_RETRY_AFTER)
+
+    def _too_slow(self, start):
+        elapsed = time.monotonic() - start
+
+        return (
+            bool(self.slow_call_seconds) and elapsed > self.slow_call_seconds
+        )
+
+    def _record(self, probe, failed):
+        if failed:
+            self.record_failure(probe)
+        else:
+            self.record_success(probe)
+
+    def record_success(self, probe=False):
+        """
+        Close the circuit after a successful probe.
+
+        :param probe: Whether the call probed a half open circuit
+        :type probe: bool
+        :return: None
+        """
+        if not probe:
+            return None
+
+        try:
+            self.client.delete(
+                self.open_key, self.probe_key, self.failures_key
+            )
+        except redis.exceptions.RedisError:
+            log.warning("Circuit %s can't reach Redis", self.name)
+
+        return None
+
+    def record_failure(self, probe=False):
+        """
+        Count a failure, opening the circuit at the threshold (or right away
+        when a probe failed).
+
+        :param probe: Whether the call probed a half open circuit
+        :type probe: bool
+        :return: None
+        """
+        try:
+            if not probe:
+                failures = self.client.incr(self.failures_key)
+
+                if failures == 1:
+                    self.client.expire(self.failures_key, self.window)
+
+                if failures < self.failure_threshold:
+                    return None
+
+            self._open()
+        except redis.exceptions.RedisError:
+            log.warning("Circuit %s can't reach Redis", self.name)
+
+        return None
+
+    def state(self):
+        """
+        Describe the circuit, for metrics. Its state is unknown while Redis
+        can't be reached, calls are let through meanwhile.
+
+        :return: dict
+        """
+        try:
+            open_until, failures = (
+                self.client.pipeline()
+                .get(self.open_key)
+                .get(self.failures_key)
+                .execute()
+            )
+        except redis.exceptions.RedisError:
+            log.warning("Circuit %s can't reach Redis", self.name)
+            return {"state": "unknown", "failures": None}
+
+        if open_until is None:
+            state = "closed"
+        elif float(open_until) > time.time():
+            state = "open"
+        else:
+            state = "half_open"
+
+        return {"state": state, "failures": int(failures or 0)}
+
+    def _open(self):
+        log.warning("Opening the %s circuit", self.name)
+
+        # Forget an abandoned circuit eventually, the next call closes it.
+        (
+            self.client.pipeline()
+            .set(
+                self.open_key,
+                time.time() + self.reset_timeout,
+                ex=math.ceil(self.reset_timeout * 10),
+            )
+            .delete(self.probe_key, self.failures_key)
+            .execute()
+        )
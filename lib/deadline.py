@@ -0,0 +1,233 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import math
+import time
+
+import psycopg.errors
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+DEADLINE_HEADER = "X-Request-Deadline"
+
+# Monotonic time the current request (or job) has to be done by, if any. It's
+# a context variable so threads and event loop tasks each have their own.
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when work can't finish before its deadline.
+    """
+
+    def __init__(self, message="The deadline was exceeded"):
+        super().__init__(message)
+
+
+def remaining():
+    """
+    Return how many seconds are left before the deadline.
+
+    :return: float (negative once exceeded) or None without a deadline
+    """
+    deadline = _deadline.get()
+
+    if deadline is None:
+        return None
+
+    return deadline - time.monotonic()
+
+
+def expired():
+    """
+    Check whether the deadline passed.
+
+    :return: bool
+    """
+    left = remaining()
+
+    return left is not None and left <= 0
+
+
+def check():
+    """
+    Stop work which would start after the deadline.
+
+    :raises DeadlineExceeded: When the deadline passed
+    :return: None
+    """
+    if expired():
+        raise DeadlineExceeded()
+
+    return None
+
+
+def timeout(seconds):
+    """
+    Shorten a timeout so it ends by the deadline.
+
+    :param seconds: Timeout without a deadline
+    :type seconds: float
+    :return: float
+    """
+    left = remaining()
+
+    if left is None:
+        return seconds
+
+    return max(0.001, min(seconds, left))
+
+
+@contextlib.contextmanager
+def limit(seconds):
+    """
+    Run a block with a deadline, an earlier deadline already set is kept.
+
+    :param seconds: Seconds the block has, None for no limit of its own
+    :type seconds: float
+    :return: None
+    """
+    deadline = _deadline.get()
+
+    if seconds is not None:
+        end = time.monotonic() + seconds
+        deadline = end if deadline is None else min(deadline, end)
+
+    token = _deadline.set(deadline)
+
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def stop_at_deadline(wait):
+    """
+    A tenacity stop condition, there's no point in waiting for a retry which
+    would start after the deadline.
+
+    :param wait: Tenacity wait of the same Retrying
+    :type wait: callable
+    :return: callable
+    """
+
+    def stop(retry_state):
+        left = remaining()
+
+        return left is not None and wait(retry_state) >= left
+
+    return stop
+
+
+def cancel_at_deadline(view):
+    """
+    Cancel an async view once the request's deadline passes, its awaited
+    calls (and open transactions) are cancelled with it.
+
+    :param view: Async view
+    :type view: callable
+    :return: Async view
+    """
+
+    @functools.wraps(view)
+    async def wrapper(*args, **kwargs):
+        try:
+            async with asyncio.timeout(remaining()):
+                return await view(*args, **kwargs)
+        except TimeoutError as e:
+            if not expired():
+                raise
+
+            raise DeadlineExceeded() from e
+
+    return wrapper
+
+
+def request_deadline(app):
+    """
+    Give every request a deadline from the REQUEST_DEADLINE setting, which
+    clients can shorten with an X-Request-Deadline header (in seconds).
+    Responses with a deadline that already passed are a 504.
+
+    The deadline covers making the response, streamed bodies such as server
+    sent events have their own limits.
+
+    :param app: Flask application instance
+    :return: None
+    """
+
+    @app.before_request
+    def start_deadline():
+        seconds = app.config["REQUEST_DEADLINE"] or None
+
+        try:
+            requested = float(request.headers.get(DEADLINE_HEADER, "nan"))
+        except ValueError:
+            requested = math.nan
+
+        if math.isfinite(requested):
+            seconds = requested if seconds is None else min(seconds, requested)
+
+        if seconds is not None:
+            _deadline.set(time.monotonic() + seconds)
+
+        check()
+
+        return None
+
+    @app.after_request
+    def end_deadline(response):
+        _deadline.set(None)
+
+        return response
+
+    @app.teardown_request
+    def clear_deadline(error=None):
+        # Threads serve many requests, a deadline mustn't outlive its own.
+        _deadline.set(None)
+
+        return None
+
+    return None
+
+
+@event.listens_for(Session, "after_begin")
+def set_statement_timeout(session, transaction, connection):
+    """
+    Let Postgres cancel statements still running at the deadline, SET LOCAL
+    only lasts for the transaction (pgbouncer friendly).
+
+    :raises DeadlineExceeded: When a transaction would begin after it
+    :return: None
+    """
+    left = remaining()
+
+    if left is None or connection.dialect.name != "postgresql":
+        return None
+
+    check()
+    connection.exec_driver_sql(
+        f"SET LOCAL statement_timeout = {math.ceil(left * 1000)}"
+    )
+
+    return None
+
+
+@event.listens_for(Engine, "handle_error")
+def raise_deadline_exceeded(context):
+    """
+    Report statements Postgres cancelled at the deadline as a missed
+    deadline, rather than a database error.
+
+    :raises DeadlineExceeded: When the deadline cancelled a statement
+    :return: None
+    """
+    original = context.original_exception
+
+    if isinstance(original, psycopg.errors.QueryCanceled) and expired():
+        raise DeadlineExceeded() from original
+
+    return None
@@ -0,0 +1,208 @@
+import asyncio
+import contextvars
+import functools
+import io
+
+from a2wsgi import WSGIMiddleware
+from a2wsgi.wsgi import build_environ
+from flask import request
+from flask import request_started
+from werkzeug.exceptions import HTTPException
+
+ASYNC_VIEWS = {}
+
+
+def async_view(endpoint):
+    """
+    Serve an endpoint with a coroutine when the app runs under an ASGI
+    worker, its regular view keeps serving WSGI workers.
+
+    :param endpoint: Full endpoint name, such as api_v1.researches.post
+    :type endpoint: str
+    :return: Decorator
+    """
+
+    def decorator(view):
+        ASYNC_VIEWS[endpoint] = view
+
+        return view
+
+    return decorator
+
+
+class FlaskASGI(object):
+    """
+    Serve a Flask app over ASGI. Endpoints with an async view run on the
+    event loop so 1 worker can wait on many slow calls at once, every other
+    request runs through the regular WSGI app in a thread pool.
+
+    Async views go through the same before and after request hooks, error
+    handlers and teardowns as sync views. The hooks are sync, they run in a
+    thread so they don't block the loop. Hooks and the view share 1 context,
+    so context variables set by before request hooks reach the view like
+    they do with WSGI.
+
+    Behind a proxy the client's address of async views comes from the ASGI
+    server (uvicorn trusts X-Forwarded-For from its forwarded_allow_ips),
+    ProxyFix only wraps the WSGI app.
+    """
+
+    def __init__(self, app, views=None, on_shutdown=()):
+        self.app = app
+        self.views = ASYNC_VIEWS if views is None else views
+        self.on_shutdown = on_shutdown
+        self.wsgi = WSGIMiddleware(app)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        view = self.match(scope)
+
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+
+        body = await read_body(receive)
+        environ = build_environ(scope, io.BytesIO(body))
+        status, headers, body = await self.handle(view, environ)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (name.lower().encode("latin1"), value.encode("latin1"))
+                    for name, value in headers
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def match(self, scope):
+        """
+        Find the async view of a request, if its endpoint has one.
+
+        :param scope: ASGI connection scope
+        :type scope: dict
+        :return: Coroutine function or None
+        """
+        if scope["type"] != "http":
+            return None
+
+        adapter = self.app.url_map.bind("localhost")
+
+        try:
+            endpoint, _ = adapter.match(scope["path"], scope["method"])
+        except HTTPException:
+            # Not found, redirects, etc. are left to the WSGI app.
+            return None
+
+        return self.views.get(endpoint)
+
+    async def handle(self, view, environ):
+        """
+        Handle a request with an async view, like Flask.wsgi_app() does.
+
+        :param view: Async view
+        :type view: callable
+        :param environ: WSGI environ of the request
+        :type environ: dict
+        :return: tuple of (status, headers, body)
+        """
+        ctx = self.app.request_context(environ)
+        error = None
+
+        try:
+            try:
+                ctx.push()
+                response = await self.dispatch(view)
+            except Exception as e:
+                error = e
+                response = self.app.handle_exception(e)
+
+            try:
+                body = b"".join(response.iter_encoded())
+            finally:
+                response.close()
+
+            return response.status_code, response.headers.to_wsgi_list(), body
+        finally:
+            if error is not None and self.app.should_ignore_error(error):
+                error = None
+
+            ctx.pop(error)
+
+    async def dispatch(self, view):
+        """
+        Flask.full_dispatch_request() with an async view.
+
+        :param view: Async view
+        :type view: callable
+        :return: Flask response
+        """
+        app = self.app
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+
+        def in_thread(func, *args):
+            return loop.run_in_executor(
+                None, functools.partial(context.run, func, *args)
+            )
+
+        try:
+            request_started.send(app, _async_wrapper=app.ensure_sync)
+            rv = await in_thread(app.preprocess_request)
+
+            if rv is None:
+                rv = await asyncio.create_task(
+                    view(**request.view_args), context=context
+                )
+        except Exception as e:
+            rv = app.handle_user_exception(e)
+
+        response = app.make_response(rv)
+
+        return await in_thread(app.process_response, response)
+
+    async def lifespan(self, receive, send):
+        """
+        Run the shutdown callbacks (such as closing connection pools) when
+        the worker stops.
+
+        :return: None
+        """
+        while True:
+            message = await receive()
+
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for callback in self.on_shutdown:
+                    await callback()
+
+                await send({"type": "lifespan.shutdown.complete"})
+                return None
+
+
+async def read_body(receive):
+    """
+    Read a request's whole body.
+
+    :param receive: ASGI receive callable
+    :type receive: callable
+    :return: bytes
+    """
+    body = bytearray()
+
+    while True:
+        message = await receive()
+
+        if message["type"] == "http.disconnect":
+            break
+
+        body.extend(message.get("body", b""))
+
+        if not message.get("more_body"):
+            break
+
+    return bytes(body)
@@ -0,0 +1,96 @@
+import asyncio
+
+from flask import current_app
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+
+
+class AsyncSyncSession(Session):
+    """
+    The sync session behind every async session. It's a class of its own so
+    ORM events can listen to async sessions too, without listening to every
+    session there is.
+    """
+
+
+class AsyncSQLAlchemy(object):
+    """
+    Async sessions on the app's database with psycopg 3's async driver, for
+    views served by an ASGI worker. Flask-SQLAlchemy's sessions are sync and
+    block the event loop.
+
+    Async connections belong to the event loop they were opened on, so each
+    loop gets its own engine (an ASGI worker runs 1 loop for its lifetime).
+    """
+
+    sync_session_class = AsyncSyncSession
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Keep track of the app's engines, they're created on first use.
+
+        :param app: Flask application instance
+        :return: None
+        """
+        app.config.setdefault("SQLALCHEMY_ASYNC_POOL_SIZE", 10)
+        app.config.setdefault("SQLALCHEMY_ASYNC_MAX_OVERFLOW", 10)
+        app.extensions["async_sqlalchemy"] = {}
+
+        return None
+
+    @property
+    def engine(self):
+        """
+        Return the current app's engine for the running event loop.
+
+        :return: AsyncEngine
+        """
+        engines = current_app.extensions["async_sqlalchemy"]
+        loop = asyncio.get_running_loop()
+
+        if loop not in engines:
+            config = current_app.config
+            engines[loop] = create_async_engine(
+                config["SQLALCHEMY_DATABASE_URI"],
+                pool_size=config["SQLALCHEMY_ASYNC_POOL_SIZE"],
+                max_overflow=config["SQLALCHEMY_ASYNC_MAX_OVERFLOW"],
+                pool_pre_ping=True,
+            )
+
+        return engines[loop]
+
+    def session(self):
+        """
+        Start an async session, use it as an async context manager.
+
+        Objects aren't expired on commit because their attributes can't be
+        lazy loaded once the session is closed, set everything a response
+        needs (such as server defaults) before saving.
+
+        :return: AsyncSession
+        """
+        return AsyncSession(
+            self.engine,
+            expire_on_commit=False,
+            sync_session_class=self.sync_session_class,
+        )
+
+    async def dispose(self, app):
+        """
+        Close the connections of an app's engine for the running event loop.
+
+        :param app: Flask application instance
+        :return: None
+        """
+        engines = app.extensions["async_sqlalchemy"]
+        engine = engines.pop(asyncio.get_running_loop(), None)
+
+        if engine is not None:
+            await engine.dispose()
+
+        return None
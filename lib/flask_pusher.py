@@ -1,6 +1,17 @@
+import logging
+
+import requests
 from pusher import Pusher
+from pusher.errors import PusherBadStatus
+from tenacity import Retrying
+from tenacity import retry_if_exception_type
+from tenacity import stop_after_attempt
+from tenacity import wait_exponential
 
 from config import settings
+from lib import deadline
+
+log = logging.getLogger(__name__)
 
 pusher = Pusher(
     app_id=settings.PUSHER_APP_ID,
@@ -8,4 +19,62 @@ pusher = Pusher(
     secret=settings.PUSHER_SECRET,
     cluster=settings.PUSHER_CLUSTER,
     ssl=settings.PUSHER_SSL,
+    host=settings.PUSHER_HOST,
+    port=settings.PUSHER_PORT,
 )
+
+
+class PusherDispatcher(object):
+    """
+    Send many Pusher events with as few API calls as possible.
+    """
+
+    # The most events Pusher accepts in 1 trigger_batch call.
+    BATCH_SIZE = 10
+
+    # Server errors and network problems are worth retrying, a bad request
+    # will fail no matter how many times it's sent.
+    RETRYABLE_ERRORS = (PusherBadStatus, requests.RequestException)
+
+    def __init__(self, client, retry_attempts=3):
+        self.client = client
+        self.retry_attempts = retry_attempts
+
+    def send(self, events):
+        """
+        Send events in batches, retrying each batch with a backoff. Batches
+        Pusher rejects are logged and skipped.
+
+        :param events: Dicts with a channel, name and data
+        :type events: list
+        :return: Number of events sent
+        """
+        sent = 0
+
+        for i in range(0, len(events), self.BATCH_SIZE):
+            batch = events[i : i + self.BATCH_SIZE]
+
+            try:
+                self._send(batch)
+            except self.RETRYABLE_ERRORS:
+                raise
+            except Exception:
+                log.exception("Dropping %s Pusher events", len(batch))
+                continue
+
+            sent += len(batch)
+
+        return sent
+
+    def _send(self, batch):
+        # Retries which would start after the deadline (if any) aren't made.
+        wait = wait_exponential(multiplier=0.5, max=5)
+        retrying = Retrying(
+            retry=retry_if_exception_type(self.RETRYABLE_ERRORS),
+            stop=stop_after_attempt(self.retry_attempts)
+            | deadline.stop_at_deadline(wait),
+            wait=wait,
+            reraise=True,
+        )
+
+        return retrying(self.client.trigger_batch, batch)
@@ -0,0 +1,267 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+import redis.exceptions
+
+from config import settings
+from lib.flask_pusher import PusherDispatcher
+from lib.flask_pusher import pusher
+from ops.initializers import redis as _redis
+
+log = logging.getLogger(__name__)
+
+
+class RedisNotifier(object):
+    """
+    Publish events to Redis, browsers get them through RedisHub and an SSE
+    endpoint instead of a third party service.
+    """
+
+    RETRYABLE_ERRORS = (
+        redis.exceptions.ConnectionError,
+        redis.exceptions.TimeoutError,
+    )
+
+    def __init__(self, client, prefix="notifications"):
+        self.client = client
+        self.prefix = prefix
+
+    def send(self, events):
+        """
+        Publish events in 1 round trip.
+
+        :param events: Dicts with a channel, name and data
+        :type events: list
+        :return: Number of events sent
+        """
+        pipeline = self.client.pipeline(transaction=False)
+
+        for event in events:
+            pipeline.publish(
+                f"{self.prefix}:{event['channel']}",
+                json.dumps({"name": event["name"], "data": event["data"]}),
+            )
+
+        pipeline.execute()
+
+        return len(events)
+
+
+class RedisHub(object):
+    """
+    Share 1 Redis subscription between every stream a process serves. Each
+    channel is subscribed to once, no matter how many streams listen to it,
+    and messages are fanned out to the streams' queues.
+
+    redis-py's PubSub isn't thread safe, so only the listener thread uses it.
+    subscribe() and unsubscribe() change which channels are wanted and wake
+    the listener up with a message on its own control channel, it then
+    subscribes and unsubscribes to match between reading messages.
+    """
+
+    # How long subscribe() waits for Redis to confirm the subscription.
+    SUBSCRIBE_TIMEOUT = 5
+
+    def __init__(self, client, prefix="notifications"):
+        self.client = client
+        self.prefix = prefix
+        self.control_channel = f"{prefix}:hub:{uuid.uuid4().hex}"
+        self._queues = {}
+        self._subscribed = {}
+        self._lock = threading.Lock()
+        self._listening = False
+
+    def subscribe(self, channel):
+        """
+        Start receiving a channel's events.
+
+        :param channel: Channel name
+        :type channel: str
+        :return: Queue the channel's events get put in
+        """
+        events = queue.SimpleQueue()
+
+        with self._lock:
+            if channel not in self._queues:
+                self._queues[channel] = set()
+                self._subscribed[channel] = threading.Event()
+
+            self._queues[channel].add(events)
+            subscribed = self._subscribed[channel]
+
+            if not self._listening:
+                self._listening = True
+                threading.Thread(target=self._listen, daemon=True).start()
+
+        # Events published before Redis confirms the subscription are lost.
+        if not subscribed.is_set():
+            self._wake()
+            subscribed.wait(self.SUBSCRIBE_TIMEOUT)
+
+        return events
+
+    def unsubscribe(self, channel, events):
+        """
+        Stop putting a channel's events in a queue.
+
+        :param channel: Channel name
+        :type channel: str
+        :param events: Queue returned by subscribe()
+        :type events: queue.SimpleQueue
+        :return: None
+        """
+        with self._lock:
+            queues = self._queues.get(channel, set())
+            queues.discard(events)
+
+            if queues or channel not in self._queues:
+                return None
+
+            del self._queues[channel]
+            del self._subscribed[channel]
+
+        self._wake()
+
+        return None
+
+    def _wake(self):
+        try:
+            self.client.publish(self.control_channel, "")
+        except RedisNotifier.RETRYABLE_ERRORS:
+            # The listener still catches up within a second.
+            log.warning("Can't wake up the notifications listener")
+
+    def _listen(self):
+        pubsub = self.client.pubsub()
+        # Channels subscribed to, and the ones Redis confirmed.
+        subscribed = set()
+        confirmed = set()
+
+        while True:
+            with self._lock:
+                # Nobody is listening anymore, let the connection go.
+                if not self._queues:
+                    self._listening = False
+                    pubsub.close()
+                    return None
+
+                wanted = {self.control_channel}
+                wanted.update(f"{self.prefix}:{c}" for c in self._queues)
+
+            try:
+                for channel in wanted - subscribed:
+                    pubsub.subscribe(channel)
+                    subscribed.add(channel)
+
+                for channel in subscribed - wanted:
+                    pubsub.unsubscribe(channel)
+                    subscribed.discard(channel)
+                    confirmed.discard(channel)
+
+                self._confirm(confirmed)
+                message = pubsub.get_message(timeout=1.0)
+            except RedisNotifier.RETRYABLE_ERRORS:
+                # The next get_message() reconnects and resubscribes.
+                log.exception("Lost the notifications subscription")
+                time.sleep(1)
+                continue
+
+            if message is None or message["type"] not in (
+                "subscribe",
+                "message",
+            ):
+                continue
+
+            channel = message["channel"].decode("utf-8")
+
+            if message["type"] == "subscribe":
+                confirmed.add(channel)
+                self._confirm(confirmed)
+                continue
+
+            channel = channel.removeprefix(f"{self.prefix}:")
+
+            with self._lock:
+                queues = list(self._queues.get(channel, ()))
+
+            for events in queues:
+                events.put(json.loads(message["data"]))
+
+    def _confirm(self, confirmed):
+        """
+        Let subscribe() calls waiting on confirmed channels return.
+
+        :param confirmed: Prefixed channels Redis confirmed
+        :type confirmed: set
+        :return: None
+        """
+        with self._lock:
+            for channel, subscribed in self._subscribed.items():
+                if f"{self.prefix}:{channel}" in confirmed:
+                    subscribed.set()
+
+        return None
+
+
+def create_notifier(backend):
+    """
+    Create the notifier outbox events are sent with.
+
+    :param backend: Either pusher or redis
+    :type backend: str
+    :return: Notifier with a send(events) method
+    """
+    if backend == "pusher":
+        return PusherDispatcher(
+            pusher, retry_attempts=settings.PUSHER_RETRY_ATTEMPTS
+        )
+
+    if backend == "redis":
+        return RedisNotifier(_redis)
+
+    raise ValueError(f"Unknown notifier backend: {backend}")
+
+
+notifier = create_notifier(settings.NOTIFIER)
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """
+    Get this process' shared RedisHub, creating it on first use.
+
+    :return: RedisHub
+    """
+    global _hub
+
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = RedisHub(_redis)
+
+    return _hub
+
+
+def reset_hub():
+    """
+    Forget the shared hub, forked children (gunicorn workers) must never
+    share the parent's subscription.
+
+    :return: None
+    """
+    global _hub, _hub_lock
+
+    _hub = None
+    _hub_lock = threading.Lock()
+
+    return None
+
+
+os.register_at_fork(after_in_child=reset_hub)
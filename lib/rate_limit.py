@@ -0,0 +1,246 @@
+import logging
+import math
+
+import redis.exceptions
+from flask import current_app
+from flask import g
+from flask import jsonify
+from flask import request
+from flask_jwt_extended import get_jwt_identity
+from flask_jwt_extended import verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from ops.initializers import redis as _redis
+
+log = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+# Refill every bucket (KEYS) and take ARGV[1] tokens from all of them, or
+# from none of them when 1 doesn't have enough. ARGV then holds a capacity
+# and period (in seconds) per bucket. Returns whether the call is allowed
+# and per bucket: {tokens left, seconds until full, seconds until allowed}.
+TOKEN_BUCKET_SCRIPT = """
+local cost = tonumber(ARGV[1])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local allowed = 1
+local buckets = {}
+
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[i * 2])
+  local period = tonumber(ARGV[i * 2 + 1])
+  local rate = capacity / period
+  local state = redis.call("HMGET", key, "tokens", "updated")
+  local tokens = tonumber(state[1]) or capacity
+  local updated = tonumber(state[2]) or now
+
+  tokens = math.min(capacity, tokens + (now - updated) * rate)
+  buckets[i] = {capacity, period, rate, tokens, math.min(cost, capacity)}
+
+  if tokens < buckets[i][5] then
+    allowed = 0
+  end
+end
+
+local results = {}
+
+for i, key in ipairs(KEYS) do
+  local capacity, period, rate, tokens, needed = unpack(buckets[i])
+  local retry_after = 0
+
+  if allowed == 1 then
+    tokens = tokens - needed
+  elseif tokens < needed then
+    retry_after = (needed - tokens) / rate
+  end
+
+  redis.call("HSET", key, "tokens", tokens, "updated", now)
+  redis.call("EXPIRE", key, math.ceil(period))
+
+  results[i] = {
+    tostring(tokens),
+    tostring((capacity - tokens) / rate),
+    tostring(retry_after),
+  }
+end
+
+return {allowed, results}
+"""
+
+
+def parse_rate(rate):
+    """
+    Parse a rate such as 20/minute.
+
+    :param rate: Number of tokens per second, minute, hour or day
+    :type rate: str
+    :return: tuple of (capacity, period in seconds)
+    """
+    capacity, period = rate.split("/")
+
+    return int(capacity), PERIODS[period.strip()]
+
+
+class Bucket(object):
+    """
+    The state of 1 token bucket after a hit.
+    """
+
+    def __init__(self, capacity, period, tokens, reset, retry_after):
+        self.capacity = capacity
+        self.period = period
+        self.remaining = max(0, math.floor(tokens))
+        self.reset = math.ceil(reset)
+        self.retry_after = math.ceil(retry_after)
+
+    @property
+    def policy(self):
+        return f"{self.capacity};w={self.period}"
+
+
+class RateLimiter(object):
+    """
+    Token buckets kept in Redis, each hit is checked and counted atomically
+    so every process shares the same buckets.
+    """
+
+    def __init__(self, client, prefix="rate_limit"):
+        self.client = client
+        self.prefix = prefix
+        self._hit = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def hit(self, limits, cost=1):
+        """
+        Take cost tokens from every bucket, or from none of them if any of
+        them doesn't have enough.
+
+        :param limits: (key, capacity, period in seconds) of each bucket
+        :type limits: list
+        :param cost: Tokens this hit takes
+        :type cost: int
+        :return: tuple of (allowed, list of Bucket)
+        """
+        keys = [f"{self.prefix}:{key}" for key, _, _ in limits]
+        args = [cost]
+
+        for _, capacity, period in limits:
+            args.extend([capacity, period])
+
+        allowed, results = self._hit(keys=keys, args=args)
+        buckets = [
+            Bucket(capacity, period, *map(float, result))
+            for (_, capacity, period), result in zip(limits, results)
+        ]
+
+        return bool(allowed), buckets
+
+
+limiter = RateLimiter(_redis)
+
+
+def rate_limited(blueprint, costs=None):
+    """
+    Rate limit every route of a blueprint with the RATE_LIMITS setting,
+    looked up by endpoint (api_v1.researches.post) and then by blueprint
+    (api_v1.researches). Responses get RateLimit-* headers.
+
+    :param blueprint: Flask blueprint
+    :param costs: Functions weighting a request by name, for rules with a
+        cost such as max_tokens
+    :type costs: dict
+    :return: None
+    """
+    costs = costs or {}
+
+    @blueprint.before_request
+    def check_rate_limit():
+        if not current_app.config["RATE_LIMIT_ENABLED"]:
+            return None
+
+        limits = current_app.config["RATE_LIMITS"]
+        # Routes without their own rule share their blueprint's buckets.
+        name = request.endpoint
+
+        if name not in limits:
+            name = request.blueprint
+
+        rule = limits.get(name, {})
+        buckets = rate_limit_keys(name, rule)
+
+        if not buckets:
+            return None
+
+        cost = costs[rule["cost"]](request) if "cost" in rule else 1
+
+        try:
+            allowed, g.rate_limit = limiter.hit(buckets, max(1, cost))
+        except redis.exceptions.RedisError:
+            log.warning("Rate limits can't reach Redis")
+            return None
+
+        if allowed:
+            return None
+
+        retry_after = max(bucket.retry_after for bucket in g.rate_limit)
+        response = jsonify(
+            {
+                "error": {
+                    "message": "Too many requests, please try again in "
+                    f"{retry_after} seconds"
+                }
+            }
+        )
+        response.headers["Retry-After"] = str(retry_after)
+
+        return response, 429
+
+    @blueprint.after_request
+    def add_rate_limit_headers(response):
+        if "rate_limit" not in g:
+            return response
+
+        # Report the bucket closest to running out.
+        bucket = min(g.rate_limit, key=lambda bucket: bucket.remaining)
+        response.headers["RateLimit-Limit"] = str(bucket.capacity)
+        response.headers["RateLimit-Remaining"] = str(bucket.remaining)
+        response.headers["RateLimit-Reset"] = str(bucket.reset)
+        response.headers["RateLimit-Policy"] = ", ".join(
+            bucket.policy for bucket in g.rate_limit
+        )
+
+        return response
+
+    return None
+
+
+def rate_limit_keys(name, rule):
+    """
+    Build the buckets a request takes tokens from, per user when it has a
+    valid JWT and per IP address.
+
+    :param name: Endpoint or blueprint the rule is for
+    :type name: str
+    :param rule: Rates by kind (per_user, per_ip) and an optional cost
+    :type rule: dict
+    :return: list of (key, capacity, period in seconds)
+    """
+    buckets = []
+
+    if "per_user" in rule:
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except (JWTExtendedException, PyJWTError):
+            identity = None
+
+        if identity is not None:
+            key = f"{name}:user:{identity}"
+            buckets.append((key, *parse_rate(rule["per_user"])))
+
+    if "per_ip" in rule:
+        key = f"{name}:ip:{request.remote_addr}"
+        buckets.append((key, *parse_rate(rule["per_ip"])))
+
+    return buckets
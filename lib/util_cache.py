@@ -0,0 +1,204 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis.exceptions
+
+from ops.initializers import redis as _redis
+
+log = logging.getLogger(__name__)
+
+
+class TTLCache(object):
+    """
+    A small, thread safe, in process LRU cache whose entries expire.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Get a value unless it expired.
+
+        :param key: Key
+        :type key: str
+        :return: Value or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key, value):
+        """
+        Set a value, evicting the least recently used one when full.
+
+        :param key: Key
+        :type key: str
+        :param value: Value
+        :return: None
+        """
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return None
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return None
+
+    def delete(self, *keys):
+        """
+        Delete 1 or more keys.
+
+        :return: None
+        """
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+        return None
+
+    def clear(self):
+        """
+        Delete every key.
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+
+        return None
+
+
+class TieredCache(object):
+    """
+    Cache JSON serializable values in process first and then in Redis.
+
+    The in process tier saves a Redis round trip for hot keys but it can't be
+    invalidated from other processes, so keep its TTL short.
+
+    When Redis is unavailable its tier is skipped, lookups are misses and
+    callers fall back to the database.
+    """
+
+    def __init__(self, prefix, ttl, local_ttl, local_maxsize):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = TTLCache(local_maxsize, local_ttl)
+
+    def get(self, key):
+        """
+        Get a value from the first tier that has it.
+
+        :param key: Key
+        :type key: str
+        :return: Value or None
+        """
+        value = self.local.get(key)
+
+        if value is not None:
+            return value
+
+        if self.ttl <= 0:
+            return None
+
+        try:
+            payload = _redis.get(self._redis_key(key))
+        except redis.exceptions.RedisError:
+            log.warning("Cache %s can't reach Redis", self.prefix)
+            return None
+
+        if payload is None:
+            return None
+
+        value = json.loads(payload)
+        self.local.set(key, value)
+
+        return value
+
+    def set(self, key, value):
+        """
+        Store a value in both tiers.
+
+        :param key: Key
+        :type key: str
+        :param value: JSON serializable value
+        :return: None
+        """
+        self.local.set(key, value)
+
+        if self.ttl <= 0:
+            return None
+
+        try:
+            _redis.set(self._redis_key(key), json.dumps(value), ex=self.ttl)
+        except redis.exceptions.RedisError:
+            log.warning("Cache %s can't reach Redis", self.prefix)
+
+        return None
+
+    def delete(self, *keys):
+        """
+        Delete 1 or more keys from both tiers.
+
+        :return: None
+        """
+        keys = [key for key in keys if key is not None]
+
+        if not keys:
+            return None
+
+        self.local.delete(*keys)
+
+        try:
+            _redis.delete(*[self._redis_key(key) for key in keys])
+        except redis.exceptions.RedisError:
+            log.warning("Cache %s can't reach Redis", self.prefix)
+
+        return None
+
+    def clear(self):
+        """
+        Delete every key from both tiers, for writes which skip the code that
+        deletes keys one by one. This process' tier is the only local one
+        cleared.
+
+        :return: None
+        """
+        self.local.clear()
+
+        try:
+            keys = list(
+                _redis.scan_iter(match=self._redis_key("*"), count=1000)
+            )
+
+            for i in range(0, len(keys), 1000):
+                _redis.delete(*keys[i : i + 1000])
+        except redis.exceptions.RedisError:
+            log.warning("Cache %s can't reach Redis", self.prefix)
+
+        return None
+
+    def _redis_key(self, key):
+        return f"{self.prefix}:{key}"
@@ -0,0 +1,103 @@
+import uuid
+
+from ops.initializers import redis
+
+
+class JobProgress(object):
+    """
+    Track the progress of a background job in Redis so any web worker can
+    report on it, and only to whoever started it.
+    """
+
+    def __init__(self, kind, job_id, ttl=86400):
+        self.kind = kind
+        self.job_id = job_id
+        self.key = f"{kind}:{job_id}"
+        self.ttl = ttl
+
+    @classmethod
+    def start(cls, kind, owner, ttl=86400):
+        """
+        Start tracking a new job.
+
+        :param kind: Kind of job, it prefixes the Redis key
+        :type kind: str
+        :param owner: Id of who started the job
+        :type owner: int or str
+        :param ttl: Seconds the progress is kept after the last update
+        :type ttl: int
+        :return: JobProgress instance
+        """
+        job = cls(kind, uuid.uuid4().hex, ttl=ttl)
+        job._save(owner=owner, status="pending", done=0, total=0)
+
+        return job
+
+    @classmethod
+    def find(cls, kind, job_id, owner):
+        """
+        Find a job that's still tracked and was started by owner.
+
+        :param kind: Kind of job
+        :type kind: str
+        :param job_id: Job id
+        :type job_id: str
+        :param owner: Id of who is asking
+        :type owner: int or str
+        :return: JobProgress instance or None
+        """
+        job = cls(kind, job_id)
+        job_owner = redis.hget(job.key, "owner")
+
+        if job_owner is None or job_owner.decode("utf-8") != str(owner):
+            return None
+
+        return job
+
+    def update(self, done, total):
+        """
+        Record how far along the job is.
+
+        :param done: Items processed so far
+        :type done: int
+        :param total: Items to process
+        :type total: int
+        :return: None
+        """
+        return self._save(status="running", done=done, total=total)
+
+    def finish(self, status="completed"):
+        """
+        Record how the job ended.
+
+        :param status: Either completed or failed
+        :type status: str
+        :return: None
+        """
+        return self._save(status=status)
+
+    def to_dict(self):
+        """
+        Return the job's progress.
+
+        :return: dict
+        """
+        progress = {
+            key.decode("utf-8"): value.decode("utf-8")
+            for key, value in redis.hgetall(self.key).items()
+        }
+
+        return {
+            "id": self.job_id,
+            "status": progress.get("status"),
+            "done": int(progress.get("done", 0)),
+            "total": int(progress.get("total", 0)),
+        }
+
+    def _save(self, **fields):
+        pipeline = redis.pipeline()
+        pipeline.hset(self.key, mapping=fields)
+        pipeline.expire(self.key, self.ttl)
+        pipeline.execute()
+
+        return None
@@ -1,6 +1,13 @@
+import base64
+import binascii
 import datetime
+import functools
+import json
+from contextlib import contextmanager
 
 from sqlalchemy import DateTime
+from sqlalchemy import tuple_
+from sqlalchemy.orm import make_transient_to_detached
 from sqlalchemy.types import TypeDecorator
 
 from lib.util_datetime import tzware_datetime
@@ -55,7 +62,105 @@ class ResourceMixin(object):
         return field, direction
 
     @classmethod
-    def get_bulk_action_ids(cls, scope, ids, omit_ids=[], query=""):
+    def query_fields(cls, fields):
+        """
+        Query only the given fields as plain rows. Skipping model instances
+        avoids the identity map bookkeeping of loading full objects, which is
+        most of the cost of listing many rows.
+
+        Fields the model doesn't have are skipped, just like marshmallow does
+        when serializing an instance.
+
+        :param fields: Field names
+        :type fields: tuple
+        :return: SQLAlchemy query
+        """
+        columns = [
+            getattr(cls, field).label(field)
+            for field in fields
+            if hasattr(cls, field)
+        ]
+
+        return cls.query.with_entities(*columns)
+
+    @classmethod
+    @functools.cache
+    def serializer(cls, fields):
+        """
+        Compile a function which serializes rows from query_fields() into
+        dicts, matching what a marshmallow schema with the same Meta.fields
+        would output.
+
+        :param fields: Field names
+        :type fields: tuple
+        :return: function
+        """
+        fields = tuple(field for field in fields if hasattr(cls, field))
+        isoformat_fields = [
+            field
+            for field in fields
+            if temporal_type(getattr(cls, field).type)
+        ]
+
+        def serialize(row):
+            item = dict(zip(fields, row))
+
+            for field in isoformat_fields:
+                if item[field] is not None:
+                    item[field] = item[field].isoformat()
+
+            return item
+
+        return serialize
+
+    @classmethod
+    def paginate_keyset(cls, query, limit, cursor=None):
+        """
+        Return a page of results ordered newest first. Rather than using an
+        OFFSET, each page continues after the (created_on, id) of the last
+        row of the previous page so every page is as fast as the first one.
+
+        The (created_on, id) columns are always selected, after the query's
+        own columns, so serializer() leaves them out of rows from
+        query_fields() which didn't ask for them.
+
+        :param query: Query to paginate, such as from query_fields()
+        :type query: SQLAlchemy query
+        :param limit: Maximum number of results
+        :type limit: int
+        :param cursor: Cursor returned along with the previous page
+        :type cursor: str
+        :return: tuple of (results, cursor of the next page or None)
+        """
+        query = query.add_columns(
+            cls.created_on.label("keyset_created_on"),
+            cls.id.label("keyset_id"),
+        )
+
+        if cursor:
+            created_on, id = decode_cursor(cursor)
+            query = query.filter(
+                tuple_(cls.created_on, cls.id) < (created_on, id)
+            )
+
+        results = (
+            query.order_by(cls.created_on.desc(), cls.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+
+        if len(results) <= limit:
+            return results, None
+
+        results = results[:limit]
+        last = results[-1]
+
+        return results, encode_cursor(last.keyset_created_on, last.keyset_id)
+
+    @classmethod
+    def get_bulk_action_ids(
+        cls, scope, ids, omit_ids=[], query="", criteria=()
+    ):
         """
         Determine which IDs are to be modified.
 
@@ -67,22 +172,32 @@ class ResourceMixin(object):
         :type omit_ids: list
         :param query: Search query (if applicable)
         :type query: str
+        :param criteria: Only allow items matching these filters, such as
+                         the ones owned by the current user
+        :type criteria: tuple
         :return: list
         """
         omit_ids = list(map(str, omit_ids))
 
         if scope == "all_search_results":
             # Change the scope to go from selected ids to all search results.
-            ids = cls.query.with_entities(cls.id).filter(cls.search(query))
+            ids = cls.query.with_entities(cls.id).filter(
+                cls.search(query), *criteria
+            )
 
             # SQLAlchemy returns back a list of tuples, we want a list of strs.
             ids = [str(item[0]) for item in ids]
+        elif criteria:
+            ids = cls.query.with_entities(cls.id).filter(
+                cls.id.in_([int(id) for id in ids]), *criteria
+            )
+            ids = [str(item[0]) for item in ids]
 
         # Remove 1 or more items from the list, this could be useful in spots
         # where you may want to protect the current user from deleting
         # themselves when bulk deleting user accounts.
         if omit_ids:
-            ids = [id for id in ids if id not in omit_ids]
+            ids = [id for id in ids if str(id) not in omit_ids]
 
         return ids
 
@@ -102,6 +217,113 @@ class ResourceMixin(object):
 
         return delete_count
 
+    @classmethod
+    def bulk_delete_in_chunks(cls, ids, chunk_size=1000, progress=None):
+        """
+        Delete many model instances through bulk_delete(), committing after
+        every chunk so no transaction holds its locks for long.
+
+        :param ids: List of ids to be deleted
+        :type ids: list
+        :param chunk_size: Ids deleted per transaction
+        :type chunk_size: int
+        :param progress: Called with (deleted, total) after every chunk
+        :type progress: callable
+        :return: Number of deleted instances
+        """
+        ids = [int(id) for id in ids]
+        deleted = 0
+
+        for i in range(0, len(ids), chunk_size):
+            deleted += cls.bulk_delete(ids[i : i + chunk_size])
+
+            if progress:
+                progress(deleted, len(ids))
+
+        return deleted
+
+    def to_cache(self, exclude=()):
+        """
+        Dump the instance's columns into a JSON serializable dict.
+
+        :param exclude: Columns to leave out
+        :type exclude: tuple
+        :return: dict
+        """
+        data = {}
+
+        for column in self.__table__.columns:
+            if column.key in exclude:
+                continue
+
+            value = getattr(self, column.key)
+
+            if value is not None and temporal_type(column.type):
+                value = value.isoformat()
+
+            data[column.key] = value
+
+        return data
+
+    @classmethod
+    def from_cache(cls, data):
+        """
+        Rebuild an instance from to_cache() and attach it to the session
+        without querying the database. Columns which weren't cached get
+        lazy loaded if they're ever accessed.
+
+        :param data: Output of to_cache()
+        :type data: dict
+        :return: Model instance
+        """
+        instance = cls.__mapper__.class_manager.new_instance()
+        columns = cls.__table__.columns
+
+        for key, value in data.items():
+            python_type = temporal_type(columns[key].type)
+
+            if value is not None and python_type:
+                value = python_type.fromisoformat(value)
+
+            setattr(instance, key, value)
+
+        make_transient_to_detached(instance)
+
+        return db.session.merge(instance, load=False)
+
+    @classmethod
+    def save_all(cls, instances):
+        """
+        Save many model instances in 1 transaction. SQLAlchemy batches rows
+        of the same model into multi row INSERT ... RETURNING statements, so
+        this takes a few round trips instead of 1 per instance.
+
+        :param instances: Model instances
+        :type instances: list
+        :return: Model instances, with their ids
+        """
+        with unit_of_work() as session:
+            session.add_all(instances)
+
+        return instances
+
+    @classmethod
+    def bulk_insert(cls, mappings):
+        """
+        Insert many rows in 1 transaction without creating model instances,
+        which is the fastest way to write a lot of rows through the ORM.
+
+        Python side column defaults are applied but ORM events don't run.
+
+        :param mappings: 1 dict of column values per row
+        :type mappings: list
+        :return: Ids of the inserted rows, in the same order as mappings
+        """
+        with unit_of_work() as session:
+            ids = insert_returning_ids(session, cls, mappings)
+
+        return ids
+
     def save(self):
         """
         Save a model instance.
@@ -133,3 +355,144 @@ class ResourceMixin(object):
 
         values = ", ".join("%s=%r" % (n, getattr(self, n)) for n in columns)
         return "<%s %s(%s)>" % (obj_id, self.__class__.__name__, values)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Commit everything added to the session inside the block at once, or roll
+    it all back if the block raises.
+
+    Usage:
+      with unit_of_work() as session:
+          session.add_all(instances)
+
+    :return: SQLAlchemy session
+    """
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def insert_returning_ids(session, model, mappings):
+    """
+    Insert rows with insertmanyvalues, without committing.
+
+    :param session: SQLAlchemy session
+    :type session: Session
+    :param model: Model class
+    :type model: class
+    :param mappings: 1 dict of column values per row
+    :type mappings: list
+    :return: Ids of the inserted rows, in the same order as mappings
+    """
+    if not mappings:
+        return []
+
+    return session.scalars(
+        db.insert(model).returning(model.id, sort_by_parameter_order=True),
+        mappings,
+    ).all()
+
+
+def temporal_type(type_):
+    """
+    Get the Python type of a column which holds dates, times or datetimes.
+
+    :param type_: SQLAlchemy column type
+    :type type_: TypeEngine
+    :return: date, time or datetime class, None for any other column
+    """
+    if isinstance(type_, TypeDecorator):
+        type_ = type_.impl_instance
+
+    try:
+        python_type = type_.python_type
+    except NotImplementedError:
+        return None
+
+    if issubclass(python_type, (datetime.date, datetime.time)):
+        return python_type
+
+    return None
+
+
+def encode_cursor(created_on, id):
+    """
+    Encode the position of a row into an opaque pagination cursor.
+
+    :param created_on: Row creation date
+    :type created_on: datetime
+    :param id: Row id
+    :type id: int
+    :return: str
+    """
+    return _encode_position([created_on.isoformat(), id])
+
+
+def decode_cursor(cursor):
+    """
+    Decode a pagination cursor created by encode_cursor.
+
+    :param cursor: Cursor
+    :type cursor: str
+    :return: tuple of (created_on, id)
+    :raises ValueError: If the cursor is invalid
+    """
+    try:
+        created_on, id = _decode_position(cursor)
+        created_on = datetime.datetime.fromisoformat(created_on)
+
+        if created_on.tzinfo is None:
+            raise ValueError("cursor dates must be TZ-aware")
+
+        return created_on, int(id)
+    except (TypeError, ValueError):
+        raise ValueError(f"{cursor!r} is not a valid cursor")
+
+
+def encode_rank_cursor(rank, id):
+    """
+    Encode the position of a row in ranked results (such as search results)
+    into an opaque pagination cursor.
+
+    :param rank: Row rank
+    :type rank: float
+    :param id: Row id
+    :type id: int
+    :return: str
+    """
+    return _encode_position([rank, id])
+
+
+def decode_rank_cursor(cursor):
+    """
+    Decode a pagination cursor created by encode_rank_cursor.
+
+    :param cursor: Cursor
+    :type cursor: str
+    :return: tuple of (rank, id)
+    :raises ValueError: If the cursor is invalid
+    """
+    try:
+        rank, id = _decode_position(cursor)
+
+        return float(rank), int(id)
+    except (TypeError, ValueError):
+        raise ValueError(f"{cursor!r} is not a valid cursor")
+
+
+def _encode_position(values):
+    position = json.dumps(values).encode("utf-8")
+
+    return base64.urlsafe_b64encode(position).decode("ascii")
+
+
+def _decode_position(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(str(e))
@@ -0,0 +1,49 @@
+import json
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Stop nginx (and ingress-nginx) from buffering the event stream.
+    "X-Accel-Buffering": "no",
+}
+
+# A comment line, clients ignore it but it keeps proxies from timing out idle
+# streams and lets servers notice clients which went away.
+SSE_KEEPALIVE = ": keepalive\n\n"
+
+
+def format_sse(data, event=None, event_id=None):
+    """
+    Format a message for a text/event-stream response.
+
+    :param data: JSON serializable payload
+    :type data: object
+    :param event: Optional event name
+    :type event: str
+    :param event_id: Optional id the client can resume from
+    :type event_id: int
+    :return: str
+    """
+    message = ""
+
+    if event_id is not None:
+        message += f"id: {event_id}\n"
+
+    if event:
+        message += f"event: {event}\n"
+
+    # json.dumps never emits raw newlines so the payload fits on 1 data line.
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+def parse_last_event_id(value):
+    """
+    Parse a Last-Event-ID header, falling back to the start of the stream.
+
+    :param value: Header value
+    :type value: str
+    :return: int
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
@@ -10,10 +10,13 @@ from flask_jwt_extended import unset_jwt_cookies
 from marshmallow import ValidationError
 
 from lib.flask_pusher import pusher as _pusher
+from lib.rate_limit import rate_limited
+from ops.research.models import Research
 from ops.user.models import User
 from ops.user.schemas import auth_schema
 
 auth = Blueprint("auth", __name__, url_prefix="/")
+rate_limited(auth)
 
 
 @auth.post("")
@@ -99,6 +102,11 @@ auth = Blueprint("auth", __name__, url_prefix="/")
                     },
                 },
             },
+            "429": {
+                "description": "Too many log in attempts from this IP "
+                "address, retry after the Retry-After header's seconds",
+                "headers": {"Retry-After": {"type": "integer"}},
+            },
         },
     }
 )
@@ -177,7 +185,9 @@ def delete():
     {
         "tags": ["Authentication"],
         "summary": "Authenticate Pusher connection",
-        "description": "Authenticates Pusher connection for real-time updates",
+        "description": "Authenticates a Pusher connection for real-time "
+        "updates, users can only subscribe to their own "
+        "private-research-{user_id} channel",
         "security": [{"Bearer": []}],
         "parameters": [
             {
@@ -186,6 +196,7 @@ def delete():
                 "required": True,
                 "type": "string",
                 "description": "Name of the Pusher channel",
+                "example": "private-research-1",
             },
             {
                 "name": "socket_id",
@@ -224,6 +235,18 @@ def delete():
                     },
                 },
             },
+            "403": {
+                "description": "The channel belongs to another user",
+                "schema": {
+                    "type": "object",
+                    "properties": {
+                        "error": {
+                            "type": "string",
+                            "example": "Forbidden channel",
+                        }
+                    },
+                },
+            },
         },
     }
 )
@@ -232,6 +255,10 @@ def pusher():
         response = {"error": "Invalid input"}
         return jsonify(response), 400
 
+    if request.form.get("channel_name") != Research.channel(current_user.id):
+        response = {"error": "Forbidden channel"}
+        return jsonify(response), 403
+
     response = _pusher.authenticate(
         channel=request.form["channel_name"],
         socket_id=request.form["socket_id"],
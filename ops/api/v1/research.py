@@ -1,30 +1,66 @@
+import asyncio
 import json
+import queue
+import time
 from http import HTTPStatus
 from typing import Dict
+from typing import Optional
 from typing import Tuple
 from typing import Union
 
 from flasgger import swag_from
 from flask import Blueprint
+from flask import Response
+from flask import current_app
+from flask import g
 from flask import request
+from flask import stream_with_context
+from flask import url_for
 from flask_jwt_extended import current_user
 from flask_jwt_extended import jwt_required
 from marshmallow import ValidationError
 
-from lib.flask_pusher import pusher
+from lib.deadline import DEADLINE_HEADER
+from lib.deadline import cancel_at_deadline
+from lib.flask_asgi import async_view
+from lib.notifier import get_hub
+from lib.rate_limit import rate_limited
+from lib.util_jobs import JobProgress
+from lib.util_sqlalchemy import unit_of_work
+from lib.util_sse import SSE_HEADERS
+from lib.util_sse import SSE_KEEPALIVE
+from lib.util_sse import format_sse
+from lib.util_sse import parse_last_event_id
+from ops.extensions import async_db
+from ops.research.cache import CACHE_MODES
+from ops.research.models import ANSWER_PARAMS
 from ops.research.models import Research
+from ops.research.models import mark_matches
+from ops.research.schemas import ResearchSchema
 from ops.research.schemas import add_research_schema
-from ops.research.schemas import researches_schema
+from ops.research.schemas import batch_research_schema
+from ops.research.schemas import bulk_delete_schema
+from ops.research.schemas import research_schema
+from ops.research.streams import AnswerStream
+from ops.research.tasks import answer_research
+from ops.research.tasks import delete_researches
 from ops.user.models import User
-from utils.openai import AzureOpenAIClient
 
 researches = Blueprint("researches", __name__, url_prefix="/researches/")
 
+RESEARCHES_PER_PAGE = 20
+
+# Errors of AI responses which can't be read.
+ANSWER_ERRORS = (KeyError, json.JSONDecodeError)
+MAX_RESEARCHES_PER_PAGE = 100
+MAX_SEARCH_QUERY_LENGTH = 200
+
 # Swagger documentation
 GET_RESEARCHES_DOCS = {
     "tags": ["Research"],
     "summary": "Get user research history",
-    "description": "Get all research questions and answers for a user",
+    "description": "Get a user's research questions and answers, newest "
+    "first, 1 page at a time",
     "security": [{"Bearer": []}],
     "parameters": [
         {
@@ -34,7 +70,23 @@ GET_RESEARCHES_DOCS = {
             "required": True,
             "description": "Username to fetch research history for",
             "example": "john_doe",
-        }
+        },
+        {
+            "name": "limit",
+            "in": "query",
+            "type": "integer",
+            "required": False,
+            "default": RESEARCHES_PER_PAGE,
+            "maximum": MAX_RESEARCHES_PER_PAGE,
+            "description": "Number of researches per page",
+        },
+        {
+            "name": "cursor",
+            "in": "query",
+            "type": "string",
+            "required": False,
+            "description": "next_cursor from the previous page",
+        },
     ],
     "responses": {
         "200": {
@@ -63,12 +115,22 @@ GET_RESEARCHES_DOCS = {
                                 },
                             },
                         },
-                    }
+                    },
+                    "meta": {
+                        "type": "object",
+                        "properties": {
+                            "next_cursor": {
+                                "type": "string",
+                                "description": "Cursor of the next page, "
+                                "null on the last page",
+                            }
+                        },
+                    },
                 },
             },
         },
         "400": {
-            "description": "Missing username parameter",
+            "description": "Missing username parameter or invalid cursor",
             "schema": {
                 "type": "object",
                 "properties": {
@@ -105,6 +167,95 @@ GET_RESEARCHES_DOCS = {
     },
 }
 
+SEARCH_RESEARCHES_DOCS = {
+    "tags": ["Research"],
+    "summary": "Search your research history",
+    "description": "Full text search over the questions and answers of your "
+    "researches, best matches first. The question and answer are HTML "
+    "escaped and their matching words are wrapped in <mark> tags.",
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "q",
+            "in": "query",
+            "type": "string",
+            "required": True,
+            "maxLength": MAX_SEARCH_QUERY_LENGTH,
+            "description": 'Search query, supports "quoted phrases", or and '
+            "-excluded words",
+            "example": "machine learning -deep",
+        },
+        {
+            "name": "limit",
+            "in": "query",
+            "type": "integer",
+            "required": False,
+            "default": RESEARCHES_PER_PAGE,
+            "maximum": MAX_RESEARCHES_PER_PAGE,
+            "description": "Number of results per page",
+        },
+        {
+            "name": "cursor",
+            "in": "query",
+            "type": "string",
+            "required": False,
+            "description": "next_cursor from the previous page",
+        },
+    ],
+    "responses": {
+        "200": {
+            "description": "Search results retrieved successfully",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "data": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": "integer", "example": 1},
+                                "question": {
+                                    "type": "string",
+                                    "example": "What is <mark>machine</mark> "
+                                    "<mark>learning</mark>?",
+                                },
+                                "answer": {
+                                    "type": "string",
+                                    "example": "<mark>Machine</mark> "
+                                    "<mark>learning</mark> is a way of …",
+                                },
+                                "status": {
+                                    "type": "string",
+                                    "example": "completed",
+                                },
+                                "rank": {"type": "number", "example": 0.4},
+                                "created_on": {
+                                    "type": "string",
+                                    "format": "date-time",
+                                    "example": "2025-01-14T18:39:03Z",
+                                },
+                            },
+                        },
+                    },
+                    "meta": {
+                        "type": "object",
+                        "properties": {
+                            "next_cursor": {
+                                "type": "string",
+                                "description": "Cursor of the next page, "
+                                "null on the last page",
+                            }
+                        },
+                    },
+                },
+            },
+        },
+        "400": {"description": "Missing query or invalid cursor"},
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+    },
+}
+
+
 POST_RESEARCH_DOCS = {
     "tags": ["Research"],
     "summary": "Create new research question",
@@ -122,11 +273,36 @@ POST_RESEARCH_DOCS = {
                         "type": "string",
                         "example": "What is machine learning?",
                         "description": "Research question to be answered",
-                    }
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "example": 800,
+                        "description": "Longest answer in tokens, defaults "
+                        "to 800. Creating researches counts this many tokens "
+                        "against the rate limit.",
+                    },
                 },
                 "required": ["question"],
             },
-        }
+        },
+        {
+            "name": "X-Research-Cache",
+            "in": "header",
+            "type": "string",
+            "enum": ["use", "refresh", "bypass"],
+            "required": False,
+            "description": "Use the answer cache (default), refresh the "
+            "cached answer or bypass the cache entirely. The response's "
+            "X-Research-Cache header is HIT, MISS, REFRESH or BYPASS.",
+        },
+        {
+            "name": DEADLINE_HEADER,
+            "in": "header",
+            "type": "number",
+            "required": False,
+            "description": "Seconds you're willing to wait for a response, "
+            "the server's own deadline applies when it's shorter",
+        },
     ],
     "responses": {
         "200": {
@@ -156,6 +332,27 @@ POST_RESEARCH_DOCS = {
                 },
             },
         },
+        "202": {
+            "description": "Research queued (when RESEARCH_JOBS is enabled)",
+            "headers": {
+                "Location": {
+                    "type": "string",
+                    "description": "URL to poll for the research status",
+                }
+            },
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "data": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer", "example": 1},
+                            "status": {"type": "string", "example": "pending"},
+                        },
+                    }
+                },
+            },
+        },
         "400": {
             "description": "Invalid request body",
             "schema": {
@@ -181,6 +378,13 @@ POST_RESEARCH_DOCS = {
                 },
             },
         },
+        "429": {
+            "description": "Rate limited, retry after the Retry-After "
+            "header's seconds. Every response has RateLimit-Limit, "
+            "RateLimit-Remaining, RateLimit-Reset and RateLimit-Policy "
+            "headers.",
+            "headers": {"Retry-After": {"type": "integer"}},
+        },
         "500": {
             "description": "OpenAI API error",
             "schema": {
@@ -193,21 +397,358 @@ POST_RESEARCH_DOCS = {
                 },
             },
         },
+        "503": {
+            "description": "Azure OpenAI is failing, retry after the "
+            "Retry-After header's seconds",
+            "headers": {"Retry-After": {"type": "integer"}},
+        },
+        "504": {
+            "description": "The research couldn't be answered and saved "
+            "before the request's deadline"
+        },
     },
     "x-webhook": {
         "name": "Pusher Event",
-        "url": "private-research",
+        "url": "private-research-{user_id}",
         "event": "new-research",
-        "description": "Notification sent when new research is created",
+        "description": "Notification sent to the owner of a research once "
+        "it's answered, fetch the full answer with GET /researches/{id}",
         "payload": {
-            "question": "string",
-            "answer": "string",
-            "username": "string",
+            "id": "integer",
+            "status": "string",
+            "question": "string (first 140 characters)",
+            "preview": "string (first 140 characters of the answer)",
+        },
+    },
+}
+
+
+GET_RESEARCH_DOCS = {
+    "tags": ["Research"],
+    "summary": "Get a single research",
+    "description": "Poll the status and answer of one of your researches",
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "research_id",
+            "in": "path",
+            "type": "integer",
+            "required": True,
+            "description": "Research (job) id returned when it was created",
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Research retrieved successfully",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "data": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "integer", "example": 1},
+                            "status": {
+                                "type": "string",
+                                "enum": ["pending", "completed", "failed"],
+                            },
+                            "question": {
+                                "type": "string",
+                                "example": "What is machine learning?",
+                            },
+                            "answer": {
+                                "type": "string",
+                                "example": "Explain Machine learning",
+                            },
+                            "created_on": {
+                                "type": "string",
+                                "format": "date-time",
+                                "example": "2025-01-14T18:39:03Z",
+                            },
+                        },
+                    }
+                },
+            },
+        },
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+        "404": {"description": "Research not found"},
+    },
+}
+
+
+BATCH_RESEARCH_DOCS = {
+    "tags": ["Research"],
+    "summary": "Create several research questions at once",
+    "description": "Answer a list of questions concurrently and save them "
+    "together. Each question succeeds or fails on its own, results are in "
+    "the same order as the questions.",
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "body",
+            "in": "body",
+            "required": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "questions": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "example": [
+                            "What is machine learning?",
+                            "What is deep learning?",
+                        ],
+                        "description": "Up to RESEARCH_BATCH_MAX_QUESTIONS "
+                        "research questions",
+                    },
+                    "max_tokens": {
+                        "type": "integer",
+                        "example": 800,
+                        "description": "Longest answer in tokens for each "
+                        "question, defaults to 800",
+                    },
+                },
+                "required": ["questions"],
+            },
+        },
+        {
+            "name": "X-Research-Cache",
+            "in": "header",
+            "type": "string",
+            "enum": ["use", "refresh", "bypass"],
+            "required": False,
+            "description": "Use the answer cache (default), refresh the "
+            "cached answers or bypass the cache entirely",
+        },
+        POST_RESEARCH_DOCS["parameters"][2],
+    ],
+    "responses": {
+        "200": {
+            "description": "Batch processed, check each result's success",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "data": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "success": {"type": "boolean"},
+                                "question": {"type": "string"},
+                                "research": {
+                                    "type": "object",
+                                    "description": "The saved research, "
+                                    "when successful",
+                                },
+                                "error": {
+                                    "type": "object",
+                                    "description": "Why it failed, when "
+                                    "not successful",
+                                },
+                            },
+                        },
+                    }
+                },
+            },
+        },
+        "400": {"description": "Invalid request body"},
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+        "422": {"description": "Too few or too many questions"},
+        "429": POST_RESEARCH_DOCS["responses"]["429"],
+        "503": {
+            "description": "Azure OpenAI is failing, retry after the "
+            "Retry-After header's seconds",
+            "headers": {"Retry-After": {"type": "integer"}},
+        },
+        "504": POST_RESEARCH_DOCS["responses"]["504"],
+    },
+}
+
+
+STREAM_RESEARCH_DOCS = {
+    "tags": ["Research"],
+    "summary": "Create new research question and stream its answer",
+    "description": "Relay the AI-generated answer as Server-Sent Events while "
+    "it's being generated. The first `stream` event holds the stream id used "
+    "to resume the stream. Each `delta` event holds a chunk of the answer and "
+    "a final `done` event holds the saved research (or `error` on failure).",
+    "security": [{"Bearer": []}],
+    "produces": ["text/event-stream"],
+    "parameters": POST_RESEARCH_DOCS["parameters"],
+    "responses": {
+        "200": {"description": "Stream of answer events"},
+        "400": POST_RESEARCH_DOCS["responses"]["400"],
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+        "422": POST_RESEARCH_DOCS["responses"]["422"],
+        "429": POST_RESEARCH_DOCS["responses"]["429"],
+    },
+}
+
+RESUME_STREAM_DOCS = {
+    "tags": ["Research"],
+    "summary": "Resume an answer stream",
+    "description": "Replay the events after Last-Event-ID and keep following "
+    "the stream until the answer is done.",
+    "security": [{"Bearer": []}],
+    "produces": ["text/event-stream"],
+    "parameters": [
+        {
+            "name": "stream_id",
+            "in": "path",
+            "type": "string",
+            "required": True,
+            "description": "Stream id from the first `stream` event",
+        },
+        {
+            "name": "Last-Event-ID",
+            "in": "header",
+            "type": "integer",
+            "required": False,
+            "description": "Id of the last event received",
+        },
+    ],
+    "responses": {
+        "200": {"description": "Stream of answer events"},
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+        "404": {"description": "Stream not found or expired"},
+    },
+}
+
+
+BULK_DELETE_DOCS = {
+    "tags": ["Research"],
+    "summary": "Delete many of your researches",
+    "description": "Queue a job deleting either the selected researches or "
+    "every research matching a search query, then poll its progress at the "
+    "Location header's URL",
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "body",
+            "in": "body",
+            "required": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "scope": {
+                        "type": "string",
+                        "enum": ["all_selected_items", "all_search_results"],
+                        "default": "all_selected_items",
+                    },
+                    "ids": {
+                        "type": "array",
+                        "items": {"type": "integer"},
+                        "description": "Researches to delete when deleting "
+                        "the selected items",
+                    },
+                    "omit_ids": {
+                        "type": "array",
+                        "items": {"type": "integer"},
+                        "description": "Researches to keep",
+                    },
+                    "q": {
+                        "type": "string",
+                        "description": "Search query when deleting all "
+                        "search results",
+                    },
+                },
+            },
+        }
+    ],
+    "responses": {
+        "202": {
+            "description": "Job queued",
+            "headers": {
+                "Location": {
+                    "type": "string",
+                    "description": "URL to poll the job's progress",
+                }
+            },
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "data": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "status": {"type": "string", "example": "pending"},
+                        },
+                    }
+                },
+            },
         },
+        "400": {"description": "Invalid request body"},
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+        "422": {"description": "Validation error"},
     },
 }
 
 
+GET_BULK_DELETE_DOCS = {
+    "tags": ["Research"],
+    "summary": "Get the progress of a bulk delete",
+    "security": [{"Bearer": []}],
+    "parameters": [
+        {
+            "name": "job_id",
+            "in": "path",
+            "type": "string",
+            "required": True,
+            "description": "Job id returned when the job was queued",
+        }
+    ],
+    "responses": {
+        "200": {
+            "description": "Job progress",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "data": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string"},
+                            "status": {
+                                "type": "string",
+                                "enum": [
+                                    "pending",
+                                    "running",
+                                    "completed",
+                                    "failed",
+                                ],
+                            },
+                            "done": {"type": "integer", "example": 2000},
+                            "total": {"type": "integer", "example": 5000},
+                        },
+                    }
+                },
+            },
+        },
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+        "404": {"description": "Job not found or expired"},
+    },
+}
+
+
+EVENTS_DOCS = {
+    "tags": ["Research"],
+    "summary": "Follow your research events",
+    "description": "Stream the same new-research events Pusher would send, "
+    "when the redis notifier is enabled. Streams end after a few minutes, "
+    "EventSource reconnects on its own. Each open stream holds a worker "
+    "thread, serve it with threaded (gthread) workers.",
+    "security": [{"Bearer": []}],
+    "produces": ["text/event-stream"],
+    "responses": {
+        "200": {"description": "Stream of research events"},
+        "401": {"description": "Unauthorized - Valid JWT token required"},
+        "404": {"description": "Events are sent through Pusher instead"},
+    },
+}
+
+# Seconds between keepalive comments and before an events stream is ended.
+EVENTS_KEEPALIVE = 15
+EVENTS_MAX_AGE = 300
+
+
 @researches.before_request
 @jwt_required()
 def before_request() -> None:
@@ -215,14 +756,62 @@ def before_request() -> None:
     pass
 
 
+def requested_tokens(request) -> int:
+    """Weigh creating researches by the most tokens their answers can use."""
+    json_data = request.get_json(silent=True)
+
+    if not isinstance(json_data, dict):
+        return 1
+
+    max_tokens = json_data.get("max_tokens")
+
+    if not isinstance(max_tokens, int) or max_tokens < 1:
+        max_tokens = ANSWER_PARAMS["max_tokens"]
+
+    questions = json_data.get("questions")
+
+    if isinstance(questions, list):
+        return max_tokens * max(1, len(questions))
+
+    return max_tokens
+
+
+rate_limited(researches, costs={"max_tokens": requested_tokens})
+
+
+@researches.after_request
+def after_request(response: Response) -> Response:
+    """Let clients know if their answer came from the answer cache."""
+    if "research_cache" in g:
+        response.headers["X-Research-Cache"] = g.research_cache
+
+    return response
+
+
+def get_cache_mode() -> str:
+    """Read the answer cache mode (use, refresh or bypass) from a header."""
+    cache_mode = request.headers.get("X-Research-Cache", "use").lower()
+
+    return cache_mode if cache_mode in CACHE_MODES else "use"
+
+
 def create_error_response(message: str, status_code: int) -> Tuple[Dict, int]:
     """Create a standardized error response."""
     return {"error": {"message": message}}, status_code
 
 
-def create_success_response(data: Union[Dict, list]) -> Tuple[Dict, int]:
+def create_success_response(
+    data: Union[Dict, list],
+    status_code: int = HTTPStatus.OK,
+    meta: Optional[Dict] = None,
+) -> Tuple[Dict, int]:
     """Create a standardized success response."""
-    return {"data": data}, HTTPStatus.OK
+    response = {"data": data}
+
+    if meta is not None:
+        response["meta"] = meta
+
+    return response, status_code
 
 
 @researches.get("/")
@@ -242,73 +831,464 @@ def index() -> Tuple[Dict, int]:
             "Username does not exist.", HTTPStatus.NOT_FOUND
         )
 
-    researches_query = Research.query.filter_by(user_id=user.id).order_by(
-        Research.created_on.desc()
+    limit = request.args.get("limit", RESEARCHES_PER_PAGE, type=int)
+    limit = min(max(limit, 1), MAX_RESEARCHES_PER_PAGE)
+
+    fields = ResearchSchema.Meta.fields
+
+    try:
+        page, next_cursor = Research.paginate_keyset(
+            Research.query_fields(fields).filter(Research.user_id == user.id),
+            limit,
+            request.args.get("cursor"),
+        )
+    except ValueError:
+        return create_error_response(
+            "Cursor is invalid.", HTTPStatus.BAD_REQUEST
+        )
+
+    serialize = Research.serializer(fields)
+
+    return create_success_response(
+        [serialize(row) for row in page], meta={"next_cursor": next_cursor}
     )
 
-    return create_success_response(researches_schema.dump(researches_query))
+
+@researches.get("search")
+@swag_from(SEARCH_RESEARCHES_DOCS)
+def search() -> Tuple[Dict, int]:
+    """Search the current user's research history."""
+    query = request.args.get("q", "").strip()
+
+    if not query or len(query) > MAX_SEARCH_QUERY_LENGTH:
+        return create_error_response(
+            f"q must be 1 to {MAX_SEARCH_QUERY_LENGTH} characters.",
+            HTTPStatus.BAD_REQUEST,
+        )
+
+    limit = request.args.get("limit", RESEARCHES_PER_PAGE, type=int)
+    limit = min(max(limit, 1), MAX_RESEARCHES_PER_PAGE)
+
+    try:
+        results, next_cursor = Research.search_page(
+            query, current_user.id, limit, request.args.get("cursor")
+        )
+    except ValueError:
+        return create_error_response(
+            "Cursor is invalid.", HTTPStatus.BAD_REQUEST
+        )
+
+    data = [
+        {
+            **result._asdict(),
+            "created_on": result.created_on.isoformat(),
+            "question": mark_matches(result.question),
+            "answer": mark_matches(result.answer),
+        }
+        for result in results
+    ]
+
+    return create_success_response(data, meta={"next_cursor": next_cursor})
 
 
 @researches.post("")
 @swag_from(POST_RESEARCH_DOCS)
 def post() -> Tuple[Dict, int]:
     """Create a new research entry with AI-generated answer."""
+    data, error = load_request(add_research_schema)
+    if error is not None:
+        return error
+
+    if current_app.config["RESEARCH_JOBS"]:
+        return queue_research(
+            data["question"], get_cache_mode(), data.get("max_tokens")
+        )
+
+    try:
+        answer = Research.fetch_answer(
+            data["question"], get_cache_mode(), data.get("max_tokens")
+        )
+    except ANSWER_ERRORS as e:
+        return answer_error_response(e)
+
+    if answer is None:
+        return answer_error_response()
+
+    research = completed_research(data["question"], answer)
+    research.notify()
+    research.save()
+
+    return create_success_response(research_data(research))
+
+
+@async_view("api_v1.researches.post")
+@cancel_at_deadline
+async def post_async() -> Tuple[Dict, int]:
+    """Like post(), waiting on Azure OpenAI without holding a thread."""
+    data, error = load_request(add_research_schema)
+    if error is not None:
+        return error
+
+    if current_app.config["RESEARCH_JOBS"]:
+        return await asyncio.to_thread(
+            queue_research,
+            data["question"],
+            get_cache_mode(),
+            data.get("max_tokens"),
+        )
+
+    try:
+        answer = await Research.afetch_answer(
+            data["question"], get_cache_mode(), data.get("max_tokens")
+        )
+    except ANSWER_ERRORS as e:
+        return answer_error_response(e)
+
+    if answer is None:
+        return answer_error_response()
+
+    research = completed_research(data["question"], answer)
+
+    async with async_db.session() as session, session.begin():
+        await session.run_sync(research.notify)
+
+    return create_success_response(research_data(research))
+
+
+@researches.post("batch")
+@swag_from(BATCH_RESEARCH_DOCS)
+def batch() -> Tuple[Dict, int]:
+    """Create research entries for several questions, answered concurrently."""
+    data, error = load_request(batch_research_schema)
+    if error is not None:
+        return error
+
+    questions, results, valid = validate_batch(data["questions"])
+    answers = Research.fetch_answers(
+        questions,
+        current_app.config["RESEARCH_BATCH_CONCURRENCY"],
+        get_cache_mode(),
+        data.get("max_tokens"),
+    )
+    created = answered_researches(questions, valid, answers, results)
+
+    with unit_of_work() as session:
+        save_batch(session, created, results)
+
+    return create_success_response(results)
+
+
+@async_view("api_v1.researches.batch")
+@cancel_at_deadline
+async def batch_async() -> Tuple[Dict, int]:
+    """Like batch(), waiting on Azure OpenAI without holding a thread."""
+    data, error = load_request(batch_research_schema)
+    if error is not None:
+        return error
+
+    questions, results, valid = validate_batch(data["questions"])
+    answers = await Research.afetch_answers(
+        questions,
+        current_app.config["RESEARCH_BATCH_CONCURRENCY"],
+        get_cache_mode(),
+        data.get("max_tokens"),
+    )
+    created = answered_researches(questions, valid, answers, results)
+
+    async with async_db.session() as session, session.begin():
+        await session.run_sync(save_batch, created, results)
+
+    return create_success_response(results)
+
+
+def load_request(schema) -> Tuple[Optional[Dict], Optional[Tuple[Dict, int]]]:
+    """Load the JSON body with a schema, or create the error response."""
     json_data = request.get_json()
     if not json_data:
-        return create_error_response(
+        return None, create_error_response(
             "Invalid request body", HTTPStatus.BAD_REQUEST
         )
 
     try:
-        data = add_research_schema.load(json_data)
+        return schema.load(json_data), None
     except ValidationError as err:
-        return create_error_response(
+        return None, create_error_response(
             err.messages, HTTPStatus.UNPROCESSABLE_ENTITY
         )
 
-    client = AzureOpenAIClient()
-    ai_response = client.get_answer(
-        question=data["question"],
-        context="AI assistant that explains technical concepts clearly.",
-    )
 
-    if not ai_response:
+def answer_error_response(error: Optional[Exception] = None) -> Tuple:
+    """Create the error response of a research which couldn't be answered."""
+    if error is not None:
         return create_error_response(
-            "Failed to get response from Azure OpenAI",
+            f"Error processing AI response: {str(error)}",
             HTTPStatus.INTERNAL_SERVER_ERROR,
         )
 
+    return create_error_response(
+        "Failed to get response from Azure OpenAI",
+        HTTPStatus.INTERNAL_SERVER_ERROR,
+    )
+
+
+def completed_research(question: str, answer: str) -> Research:
+    """Create (but don't save) the current user's answered research."""
+    research = Research()
+    research.user_id = current_user.id
+    research.question = question
+    research.answer = answer
+    # Set explicitly, async saves don't read server defaults back.
+    research.status = "completed"
+
+    return research
+
+
+def research_data(research: Research) -> Dict:
+    """Describe a saved research in a response."""
+    return {
+        "created_on": research.created_on,
+        "id": research.id,
+        "question": research.question,
+        "answer": research.answer,
+    }
+
+
+def validate_batch(questions: list) -> Tuple[list, list, list]:
+    """
+    Validate each question of a batch, the invalid ones get a result. Returns
+    the valid questions, the results and the indexes of the valid questions.
+    """
+    results = [None] * len(questions)
+    valid = []
+
+    for i, question in enumerate(questions):
+        errors = add_research_schema.validate({"question": question})
+
+        if errors:
+            results[i] = batch_result(question, error=errors)
+        else:
+            valid.append(i)
+
+    return [questions[i] for i in valid], results, valid
+
+
+def answered_researches(
+    questions: list, valid: list, answers: list, results: list
+) -> list:
+    """Create the researches of a batch, unanswered ones get a result."""
+    created = []
+
+    for question, i, answer in zip(questions, valid, answers):
+        if answer is None:
+            results[i] = batch_result(
+                question,
+                error={"message": "Failed to get response from Azure OpenAI"},
+            )
+            continue
+
+        created.append((i, completed_research(question, answer)))
+
+    return created
+
+
+def save_batch(session, created: list, results: list) -> None:
+    """Insert the researches of a batch and their events, not committed."""
+    # 1 flush inserts every research (in as few statements as possible).
+    session.add_all([research for _, research in created])
+    session.flush()
+
+    for i, research in created:
+        research.notify(session)
+        # Committing expires it, reading it back would take a query.
+        results[i] = batch_result(
+            research.question, research=research_schema.dump(research)
+        )
+
+
+def batch_result(
+    question: str,
+    research: Optional[Dict] = None,
+    error: Optional[Dict] = None,
+) -> Dict:
+    """Describe how 1 question of a batch went."""
+    if error is not None:
+        return {"success": False, "question": question, "error": error}
+
+    return {"success": True, "question": question, "research": research}
+
+
+@researches.post("stream")
+@swag_from(STREAM_RESEARCH_DOCS)
+def stream() -> Union[Response, Tuple[Dict, int]]:
+    """Create a new research entry and stream its answer as it's generated."""
+    data, error = load_request(add_research_schema)
+    if error is not None:
+        return error
+
+    user_id = current_user.id
+    cache_mode = get_cache_mode()
+    answer_stream = AnswerStream.start(user_id)
+    location = url_for(
+        "api_v1.researches.resume_stream", stream_id=answer_stream.stream_id
+    )
+
+    def generate():
+        yield format_sse(
+            {"stream_id": answer_stream.stream_id, "resume_url": location},
+            event="stream",
+        )
+
+        for event_id, event, event_data in answer_stream.answer(
+            data["question"], user_id, cache_mode, data.get("max_tokens")
+        ):
+            yield format_sse(event_data, event=event, event_id=event_id)
+
+    return create_sse_response(generate(), {"Location": location})
+
+
+@researches.get("stream/<stream_id>")
+@swag_from(RESUME_STREAM_DOCS)
+def resume_stream(stream_id: str) -> Union[Response, Tuple[Dict, int]]:
+    """Resume an answer stream from the Last-Event-ID the client received."""
+    answer_stream = AnswerStream.find(stream_id, current_user.id)
+
+    if not answer_stream:
+        return create_error_response(
+            "Stream does not exist or has expired.", HTTPStatus.NOT_FOUND
+        )
+
+    last_event_id = parse_last_event_id(request.headers.get("Last-Event-ID"))
+
+    def generate():
+        for event_id, event, event_data in answer_stream.events(last_event_id):
+            yield format_sse(event_data, event=event, event_id=event_id)
+
+    return create_sse_response(generate())
+
+
+@researches.get("events")
+@swag_from(EVENTS_DOCS)
+def events() -> Union[Response, Tuple[Dict, int]]:
+    """Stream the current user's research events from Redis."""
+    if current_app.config["NOTIFIER"] != "redis":
+        return create_error_response(
+            "Events are sent through Pusher.", HTTPStatus.NOT_FOUND
+        )
+
+    channel = Research.channel(current_user.id)
+
+    def generate():
+        hub = get_hub()
+        events = hub.subscribe(channel)
+        deadline = time.monotonic() + EVENTS_MAX_AGE
+
+        try:
+            # Flush the headers right away so the client knows it's connected.
+            yield SSE_KEEPALIVE
+
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    yield SSE_KEEPALIVE
+                    continue
+
+                yield format_sse(event["data"], event=event["name"])
+        finally:
+            hub.unsubscribe(channel, events)
+
+    return create_sse_response(generate())
+
+
+@researches.post("bulk_delete")
+@swag_from(BULK_DELETE_DOCS)
+def bulk_delete() -> Tuple[Dict, int, Dict]:
+    """Queue a job deleting many of the current user's researches."""
+    json_data = request.get_json(silent=True)
+    if not json_data:
+        return create_error_response(
+            "Invalid request body", HTTPStatus.BAD_REQUEST
+        )
+
     try:
-        answer_content = ai_response["choices"][0]["message"]["content"]
-
-        research = Research()
-        research.user_id = current_user.id
-        research.question = data["question"]
-        research.answer = answer_content
-        research.save()
-
-        # Trigger Pusher notification
-        pusher.trigger(
-            "private-research",
-            "new-research",
-            {
-                "question": research.question,
-                "answer": research.answer,
-                "username": current_user.username,
-            },
+        data = bulk_delete_schema.load(json_data)
+    except ValidationError as err:
+        return create_error_response(
+            err.messages, HTTPStatus.UNPROCESSABLE_ENTITY
         )
 
-        response_data = {
-            "created_on": research.created_on,
-            "id": research.id,
-            "question": research.question,
-            "answer": research.answer,
-        }
+    job = JobProgress.start("research:bulk_delete", current_user.id)
+    delete_researches.delay(
+        job.job_id,
+        current_user.id,
+        data["scope"],
+        data["ids"],
+        data["omit_ids"],
+        data["q"],
+    )
+
+    response, status_code = create_success_response(
+        {"id": job.job_id, "status": "pending"}, HTTPStatus.ACCEPTED
+    )
+    location = url_for("api_v1.researches.show_bulk_delete", job_id=job.job_id)
+
+    return response, status_code, {"Location": location}
 
-        return create_success_response(response_data)
 
-    except (KeyError, json.JSONDecodeError) as e:
+@researches.get("bulk_delete/<job_id>")
+@swag_from(GET_BULK_DELETE_DOCS)
+def show_bulk_delete(job_id: str) -> Tuple[Dict, int]:
+    """Get the progress of one of the current user's bulk deletes."""
+    job = JobProgress.find("research:bulk_delete", job_id, current_user.id)
+
+    if not job:
         return create_error_response(
-            f"Error processing AI response: {str(e)}",
-            HTTPStatus.INTERNAL_SERVER_ERROR,
+            "Job does not exist or has expired.", HTTPStatus.NOT_FOUND
         )
+
+    return create_success_response(job.to_dict())
+
+
+def create_sse_response(events, headers: Dict = None) -> Response:
+    """Create a Server-Sent Events response from a generator of messages."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={**SSE_HEADERS, **(headers or {})},
+    )
+
+
+def queue_research(
+    question: str, cache_mode: str, max_tokens: Optional[int] = None
+) -> Tuple[Dict, int, Dict]:
+    """Save a pending research and answer it in a Celery worker."""
+    research = Research()
+    research.user_id = current_user.id
+    research.question = question
+    research.status = "pending"
+    research.save()
+
+    answer_research.delay(research.id, cache_mode, max_tokens)
+
+    response, status_code = create_success_response(
+        {"id": research.id, "status": research.status}, HTTPStatus.ACCEPTED
+    )
+    location = url_for("api_v1.researches.show", research_id=research.id)
+
+    return response, status_code, {"Location": location}
+
+
+@researches.get("/<int:research_id>")
+@swag_from(GET_RESEARCH_DOCS)
+def show(research_id: int) -> Tuple[Dict, int]:
+    """Get the status and answer of one of the current user's researches."""
+    research = Research.query.filter_by(
+        id=research_id, user_id=current_user.id
+    ).first()
+
+    if not research:
+        return create_error_response(
+            "Research does not exist.", HTTPStatus.NOT_FOUND
+        )
+
+    return create_success_response(research_schema.dump(research))
@@ -1,16 +1,26 @@
+import json
+
 from flasgger import swag_from
 from flask import Blueprint
+from flask import Response
 from flask import jsonify
 from flask import request
+from flask import stream_with_context
 from flask_jwt_extended import jwt_required
 from marshmallow import ValidationError
 
 from ops.user.models import User
+from ops.user.schemas import UserSchema
 from ops.user.schemas import registration_schema
-from ops.user.schemas import users_schema
 
 user = Blueprint("user", __name__, url_prefix="/user")
 
+USERS_PER_PAGE = 50
+MAX_USERS_PER_PAGE = 500
+
+# How many rows the database sends at a time while streaming NDJSON.
+STREAM_BATCH_SIZE = 1000
+
 
 @user.before_request
 def before_request():
@@ -24,8 +34,29 @@ def before_request():
     {
         "tags": ["Users"],
         "summary": "Get all users",
-        "description": "Returns all users. Requires authentication.",
+        "description": "Returns users newest first, 1 page at a time. Send "
+        "Accept: application/x-ndjson to stream every user instead, 1 JSON "
+        "object per line. Requires authentication.",
         "security": [{"Bearer": []}],
+        "produces": ["application/json", "application/x-ndjson"],
+        "parameters": [
+            {
+                "name": "limit",
+                "in": "query",
+                "type": "integer",
+                "required": False,
+                "default": USERS_PER_PAGE,
+                "maximum": MAX_USERS_PER_PAGE,
+                "description": "Number of users per page",
+            },
+            {
+                "name": "cursor",
+                "in": "query",
+                "type": "string",
+                "required": False,
+                "description": "next_cursor from the previous page",
+            },
+        ],
         "responses": {
             "200": {
                 "description": "List of users retrieved successfully",
@@ -46,12 +77,27 @@ def before_request():
                                         "type": "string",
                                         "example": "john@example.com",
                                     },
+                                    "researches_posted": {
+                                        "type": "integer",
+                                        "example": 3,
+                                    },
                                 },
                             },
-                        }
+                        },
+                        "meta": {
+                            "type": "object",
+                            "properties": {
+                                "next_cursor": {
+                                    "type": "string",
+                                    "description": "Cursor of the next page, "
+                                    "null on the last page",
+                                }
+                            },
+                        },
                     },
                 },
             },
+            "400": {"description": "Cursor is invalid"},
             "401": {
                 "description": "Unauthorized - Valid JWT token required",
                 "schema": {
@@ -68,11 +114,58 @@ def before_request():
     }
 )
 def index():
-    users = User.query.all()
-    response = {"data": users_schema.dump(users)}
+    fields = UserSchema.Meta.fields
+    serialize = User.serializer(fields)
+
+    if wants_ndjson():
+        return stream_users(fields, serialize)
+
+    limit = request.args.get("limit", USERS_PER_PAGE, type=int)
+    limit = min(max(limit, 1), MAX_USERS_PER_PAGE)
+
+    try:
+        users, next_cursor = User.paginate_keyset(
+            User.query_fields(fields), limit, request.args.get("cursor")
+        )
+    except ValueError:
+        return jsonify({"error": "Cursor is invalid"}), 400
+
+    response = {
+        "data": [serialize(row) for row in users],
+        "meta": {"next_cursor": next_cursor},
+    }
     return jsonify(response), 200
 
 
+def wants_ndjson():
+    best = request.accept_mimetypes.best_match(
+        ["application/json", "application/x-ndjson"]
+    )
+
+    return best == "application/x-ndjson"
+
+
+def stream_users(fields, serialize):
+    """
+    Stream every user as newline delimited JSON. Rows are read through a
+    server side cursor a batch at a time and written out as they arrive, so
+    memory use doesn't grow with the number of users.
+    """
+    query = (
+        User.query_fields(fields)
+        .order_by(User.created_on.desc(), User.id.desc())
+        .yield_per(STREAM_BATCH_SIZE)
+    )
+
+    def generate():
+        for row in query:
+            yield json.dumps(serialize(row)) + "\n"
+
+    return Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+
+
 @user.post("")
 @swag_from(
     {
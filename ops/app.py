@@ -6,14 +6,22 @@ from flask_cors import CORS
 from werkzeug.debug import DebuggedApplication
 from werkzeug.middleware.proxy_fix import ProxyFix
 
+from lib.admission import AdmissionRejected
+from lib.circuit_breaker import CircuitOpenError
+from lib.deadline import DeadlineExceeded
+from lib.deadline import request_deadline
 from ops.api.v1 import api_v1
+from ops.extensions import async_db
 from ops.extensions import db
 from ops.extensions import debug_toolbar
 from ops.extensions import flask_static_digest
 from ops.extensions import jwt
 from ops.extensions import swagger
+from ops.notifications.commands import notifications
 from ops.page.views import page
+from ops.seeds.commands import seed
 from ops.up.views import up
+from ops.user.commands import users
 from ops.user.models import User
 
 
@@ -55,12 +63,15 @@ def create_app(settings_override=None):
         app.config.update(settings_override)
 
     middleware(app)
+    request_deadline(app)
 
     app.register_blueprint(up)
     app.register_blueprint(page)
     app.register_blueprint(api_v1)
 
     extensions(app)
+    commands(app)
+    error_handlers(app)
     jwt_callbacks()
 
     return app
@@ -76,6 +87,7 @@ def extensions(app):
     debug_toolbar.init_app(app)
     jwt.init_app(app)
     db.init_app(app)
+    async_db.init_app(app)
     swagger.init_app(app)
     flask_static_digest.init_app(app)
     CORS(app)
@@ -83,6 +95,70 @@ def extensions(app):
     return None
 
 
+def commands(app):
+    """
+    Register 0 or more CLI command groups (mutates the app passed in).
+
+    :param app: Flask application instance
+    :return: None
+    """
+    app.cli.add_command(notifications)
+    app.cli.add_command(seed)
+    app.cli.add_command(users)
+
+    return None
+
+
+def error_handlers(app):
+    """
+    Register 0 or more error handlers (mutates the app passed in).
+
+    :param app: Flask application instance
+    :return: None
+    """
+
+    @app.errorhandler(CircuitOpenError)
+    def circuit_open(error):
+        response = jsonify(
+            {
+                "error": {
+                    "message": "Azure OpenAI is unavailable, please try "
+                    f"again in {error.retry_after} seconds"
+                }
+            }
+        )
+        response.headers["Retry-After"] = str(error.retry_after)
+
+        return response, 503
+
+    @app.errorhandler(AdmissionRejected)
+    def admission_rejected(error):
+        response = jsonify(
+            {
+                "error": {
+                    "message": "Too many research requests right now, please "
+                    f"try again in {error.retry_after} seconds"
+                }
+            }
+        )
+        response.headers["Retry-After"] = str(error.retry_after)
+
+        return response, 429
+
+    @app.errorhandler(DeadlineExceeded)
+    def deadline_exceeded(error):
+        response = {
+            "error": {
+                "message": "The request couldn't be completed before its "
+                "deadline"
+            }
+        }
+
+        return jsonify(response), 504
+
+    return None
+
+
 def jwt_callbacks():
     """
     Set up custom behavior for JWT based authentication.
@@ -93,7 +169,7 @@ def jwt_callbacks():
     @jwt.user_lookup_loader
     def user_lookup_callback(_jwt_header, jwt_data):
         identity = jwt_data["sub"]
-        return User.query.filter((User.username == identity)).first()
+        return User.find_by_jwt_identity(identity)
 
     @jwt.unauthorized_loader
     def unauthorized_callback(_jwt_payload):
@@ -0,0 +1,24 @@
+from lib.flask_asgi import FlaskASGI
+from ops.app import create_app
+from ops.extensions import async_db
+from utils.openai import aclose_client
+
+
+def create_asgi_app(settings_override=None):
+    """
+    Create an ASGI application around the Flask app factory. Creating
+    researches runs async views, so 1 worker can wait on hundreds of Azure
+    OpenAI calls at once, and every other request runs the regular views.
+
+    Serve it with an ASGI worker, such as:
+      gunicorn -k uvicorn_worker.UvicornWorker "ops.asgi:create_asgi_app()"
+
+    :param settings_override: Override settings
+    :return: ASGI app
+    """
+    app = create_app(settings_override=settings_override)
+
+    async def dispose_engines():
+        await async_db.dispose(app)
+
+    return FlaskASGI(app, on_shutdown=[dispose_engines, aclose_client])
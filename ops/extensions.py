@@ -5,9 +5,12 @@ from flask_marshmallow import Marshmallow
 from flask_sqlalchemy import SQLAlchemy
 from flask_static_digest import FlaskStaticDigest
 
+from lib.flask_async_sqlalchemy import AsyncSQLAlchemy
+
 debug_toolbar = DebugToolbarExtension()
 jwt = JWTManager()
 db = SQLAlchemy()
+async_db = AsyncSQLAlchemy()
 marshmallow = Marshmallow()
 flask_static_digest = FlaskStaticDigest()
 swagger = Swagger()
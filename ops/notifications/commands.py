@@ -0,0 +1,114 @@
+import logging
+import time
+
+import click
+import psycopg
+from flask.cli import AppGroup
+from sqlalchemy.exc import DBAPIError
+
+from lib import deadline
+from lib.notifier import notifier
+from ops.extensions import db
+from ops.notifications.models import OUTBOX_CHANNEL
+from ops.notifications.models import Outbox
+
+log = logging.getLogger(__name__)
+
+notifications = AppGroup("notifications", help="Manage notifications.")
+
+
+@notifications.command("relay")
+@click.option("--batch-size", default=100, help="Events sent per batch.")
+@click.option(
+    "--interval",
+    default=5.0,
+    help="Seconds between checks for events when nothing wakes it up.",
+)
+@click.option(
+    "--batch-deadline",
+    default=30.0,
+    help="Seconds a batch has to be sent (retries included) before it's "
+    "given up on and its rows are unlocked.",
+)
+def relay(batch_size, interval, batch_deadline):
+    """
+    Send outbox events until stopped. Run as many as needed.
+    """
+    listener = None
+    backoff = 0
+
+    try:
+        while True:
+            try:
+                if listener is None:
+                    listener = listen()
+
+                while relay_batch(batch_size, batch_deadline) == batch_size:
+                    pass
+
+                backoff = 0
+
+                for _ in listener.driver_connection.notifies(
+                    timeout=interval, stop_after=1
+                ):
+                    pass
+            except (*notifier.RETRYABLE_ERRORS, deadline.DeadlineExceeded):
+                db.session.rollback()
+                backoff = wait_to_retry(backoff)
+            except (DBAPIError, psycopg.OperationalError):
+                # Postgres restarted or failed over, listen again.
+                db.session.rollback()
+
+                if listener is not None:
+                    listener.invalidate()
+                    listener = None
+
+                backoff = wait_to_retry(backoff)
+    finally:
+        # It's in autocommit mode and listening, it can't go back to the pool.
+        if listener is not None:
+            listener.invalidate()
+
+
+def wait_to_retry(backoff):
+    """
+    Log the error being handled and sleep with an exponential backoff.
+
+    :param backoff: Seconds slept after the previous error, 0 if none
+    :type backoff: int
+    :return: Seconds slept
+    """
+    backoff = min(max(backoff * 2, 1), 60)
+    log.exception("Relaying failed, retrying in %ss", backoff)
+    time.sleep(backoff)
+
+    return backoff
+
+
+def listen():
+    """
+    Open a dedicated connection which is woken up by Outbox.add(). Hold on
+    to the returned pooled connection, once it's garbage collected it goes
+    back to the pool and stops listening.
+
+    :return: Pooled connection
+    """
+    connection = db.engine.raw_connection()
+    connection.driver_connection.autocommit = True
+    connection.driver_connection.execute(f"LISTEN {OUTBOX_CHANNEL}")
+
+    return connection
+
+
+def relay_batch(batch_size, batch_deadline):
+    """
+    Relay 1 batch of events before its deadline.
+
+    :param batch_size: How many events to send at most
+    :type batch_size: int
+    :param batch_deadline: Seconds the batch has
+    :type batch_deadline: float
+    :return: Number of events relayed
+    """
+    with deadline.limit(batch_deadline):
+        return Outbox.relay(batch_size)
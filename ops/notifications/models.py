@@ -0,0 +1,109 @@
+from lib.notifier import notifier
+from lib.util_datetime import tzware_datetime
+from lib.util_sqlalchemy import ResourceMixin
+from ops.extensions import db
+
+# Postgres channel relays LISTEN on, see Outbox.add().
+OUTBOX_CHANNEL = "outbox"
+
+
+class Outbox(ResourceMixin, db.Model):
+    """
+    Events waiting to be sent with the configured notifier. They're written
+    in the same transaction as the change they're about, so an event exists
+    if and only if that change was committed.
+    """
+
+    __tablename__ = "outbox"
+    id = db.Column(db.BigInteger, primary_key=True)
+
+    channel = db.Column(db.String(200), nullable=False)
+    event = db.Column(db.String(200), nullable=False)
+    data = db.Column(db.JSON, nullable=False)
+
+    @classmethod
+    def add(cls, channel, event, data, session=None):
+        """
+        Add an event to the current transaction, it's not committed here.
+
+        :param channel: Channel name
+        :type channel: str
+        :param event: Event name
+        :type event: str
+        :param data: JSON serializable payload
+        :type data: dict
+        :param session: Session of the transaction, defaults to db.session
+        :type session: Session
+        :return: Outbox instance
+        """
+        session = session or db.session
+        outbox = Outbox(channel=channel, event=event, data=data)
+        session.add(outbox)
+
+        # Postgres only delivers this once (and if) the transaction commits,
+        # which wakes up the relays right when there's something to send.
+        session.execute(db.select(db.func.pg_notify(OUTBOX_CHANNEL, "")))
+
+        return outbox
+
+    @classmethod
+    def relay(cls, batch_size=100):
+        """
+        Send and delete the oldest batch of events.
+
+        Rows are locked with SKIP LOCKED so each relay process gets its own
+        batch. Events are only deleted after the notifier sent them, if a relay
+        dies half way its batch gets sent again (at least once delivery).
+
+        :param batch_size: How many events to send at most
+        :type batch_size: int
+        :return: Number of events relayed
+        """
+        events = db.session.scalars(
+            db.select(Outbox)
+            .order_by(Outbox.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        if not events:
+            db.session.rollback()
+            return 0
+
+        try:
+            notifier.send(
+                [
+                    {"channel": e.channel, "name": e.event, "data": e.data}
+                    for e in events
+                ]
+            )
+        except Exception:
+            db.session.rollback()
+            raise
+
+        db.session.execute(
+            db.delete(Outbox)
+            .where(Outbox.id.in_([event.id for event in events]))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        return len(events)
+
+    @classmethod
+    def stats(cls):
+        """
+        Return how many events are waiting and how old the oldest one is.
+
+        :return: dict
+        """
+        depth, oldest = db.session.execute(
+            db.select(db.func.count(Outbox.id), db.func.min(Outbox.created_on))
+        ).one()
+
+        return {
+            "depth": depth,
+            "lag_seconds": (
+                (tzware_datetime() - oldest).total_seconds() if oldest else 0
+            ),
+        }
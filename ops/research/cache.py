@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import time
+
+from flask import current_app
+from flask import g
+from flask import has_request_context
+from redis.exceptions import RedisError
+
+from ops.initializers import redis
+
+log = logging.getLogger(__name__)
+
+CACHE_MODES = ("use", "refresh", "bypass")
+
+
+class AnswerCache(object):
+    """
+    Exact-match cache of Azure OpenAI answers stored in Redis.
+
+    Answers are keyed on the normalized question along with everything else
+    that influences the completion. A sorted set of keys scored by their last
+    access time keeps the cache bounded by evicting the least recently used
+    answers first.
+    """
+
+    PREFIX = "research:cache"
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_key = f"{self.PREFIX}:index"
+        self.hits_key = f"{self.PREFIX}:hits"
+        self.misses_key = f"{self.PREFIX}:misses"
+
+    @classmethod
+    def from_config(cls):
+        """
+        Create a cache using the current app's settings.
+
+        :return: AnswerCache instance
+        """
+        return cls(
+            current_app.config["RESEARCH_CACHE_TTL"],
+            current_app.config["RESEARCH_CACHE_MAX_ENTRIES"],
+        )
+
+    @classmethod
+    def key(cls, question, context, deployment, **params):
+        """
+        Build the cache key for a completion request.
+
+        :param question: Research question
+        :type question: str
+        :param context: System context
+        :type context: str
+        :param deployment: Azure OpenAI deployment name
+        :type deployment: str
+        :param params: Sampling parameters (temperature, top_p, etc.)
+        :return: str
+        """
+        normalized_question = " ".join(question.split()).casefold()
+        payload = json.dumps(
+            [normalized_question, context, deployment, params], sort_keys=True
+        )
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+        return f"{cls.PREFIX}:answer:{digest}"
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def fetch(self, key, compute, mode="use"):
+        """
+        Return the cached answer for a key, or compute and cache it.
+
+        :param key: Cache key
+        :type key: str
+        :param compute: Function returning a fresh answer (or None)
+        :type compute: callable
+        :param mode: Either use, refresh (skip the lookup) or bypass
+        :type mode: str
+        :return: str or None
+        """
+        (answer,) = self.lookup([key], mode)
+
+        if answer is None:
+            answer = compute()
+            self.store([key], [answer], mode)
+
+        return answer
+
+    def lookup(self, keys, mode="use"):
+        """
+        Look up the answers of several keys, only when the mode is use.
+
+        :param keys: Cache keys
+        :type keys: list
+        :param mode: Either use, refresh (skip the lookup) or bypass
+        :type mode: str
+        :return: list of str or None for the answers to compute
+        """
+        if mode != "use" or not self.enabled:
+            return [None] * len(keys)
+
+        answers = [self.get(key) for key in keys]
+
+        if all(answer is not None for answer in answers):
+            self._record("HIT")
+
+        return answers
+
+    def store(self, keys, answers, mode="use"):
+        """
+        Cache freshly computed answers, unless the mode is bypass. Answers
+        which are None aren't cached.
+
+        :param keys: Cache keys
+        :type keys: list
+        :param answers: Answers of the keys
+        :type answers: list
+        :param mode: Either use, refresh or bypass
+        :type mode: str
+        :return: None
+        """
+        if not self.enabled:
+            mode = "bypass"
+
+        if mode != "bypass":
+            for key, answer in zip(keys, answers):
+                if answer is not None:
+                    self.set(key, answer)
+
+        self._record("MISS" if mode == "use" else mode.upper())
+
+        return None
+
+    def get(self, key):
+        """
+        Look up an answer, counting the hit or miss.
+
+        :param key: Cache key
+        :type key: str
+        :return: str or None
+        """
+        answer = redis.get(key)
+
+        pipeline = redis.pipeline()
+
+        if answer is None:
+            pipeline.incr(self.misses_key)
+        else:
+            pipeline.incr(self.hits_key)
+            pipeline.expire(key, self.ttl)
+            pipeline.zadd(self.index_key, {key: time.time()}, xx=True)
+
+        pipeline.execute()
+
+        return answer.decode("utf-8") if answer is not None else None
+
+    def set(self, key, answer):
+        """
+        Store an answer and evict the least recently used ones if needed.
+
+        :param key: Cache key
+        :type key: str
+        :param answer: Answer
+        :type answer: str
+        :return: None
+        """
+        now = time.time()
+
+        pipeline = redis.pipeline()
+        pipeline.set(key, answer, ex=self.ttl)
+        pipeline.zadd(self.index_key, {key: now})
+        # Answers which weren't read within their TTL have already expired.
+        pipeline.zremrangebyscore(self.index_key, "-inf", now - self.ttl)
+        pipeline.zcard(self.index_key)
+        *_, entries = pipeline.execute()
+
+        if entries > self.max_entries:
+            evicted = redis.zpopmin(self.index_key, entries - self.max_entries)
+            redis.delete(*[evicted_key for evicted_key, _ in evicted])
+
+        return None
+
+    def stats(self):
+        """
+        Return the cache's counters.
+
+        :return: dict, or None while Redis can't be reached
+        """
+        try:
+            hits, misses, entries = (
+                redis.pipeline()
+                .get(self.hits_key)
+                .get(self.misses_key)
+                .zcard(self.index_key)
+                .execute()
+            )
+        except RedisError:
+            log.warning("The answer cache can't reach Redis")
+            return None
+
+        return {
+            "hits": int(hits or 0),
+            "misses": int(misses or 0),
+            "entries": entries,
+        }
+
+    @staticmethod
+    def _record(status):
+        """
+        Remember how the cache served the current request.
+
+        :param status: HIT, MISS, REFRESH or BYPASS
+        :type status: str
+        :return: None
+        """
+        if has_request_context():
+            g.research_cache = status
+
+        return None
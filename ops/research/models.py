@@ -1,11 +1,83 @@
+import asyncio
+from collections import Counter
+from collections import OrderedDict
+
+from markupsafe import escape
 from sqlalchemy import desc
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 from lib.util_sqlalchemy import ResourceMixin
+from lib.util_sqlalchemy import decode_rank_cursor
+from lib.util_sqlalchemy import encode_rank_cursor
+from lib.util_sqlalchemy import insert_returning_ids
+from lib.util_sqlalchemy import unit_of_work
+from ops.extensions import async_db
 from ops.extensions import db
+from ops.notifications.models import Outbox
+from ops.research.cache import AnswerCache
+from utils.openai import get_client
+
+RESEARCH_CONTEXT = "AI assistant that explains technical concepts clearly."
+
+# Sampling parameters used for every research, they're part of the cache key.
+ANSWER_PARAMS = {"max_tokens": 800, "temperature": 0.7, "top_p": 0.95}
+
+# Each user only gets events about their own researches.
+CHANNEL = "private-research-{user_id}"
+
+# How much of the question and answer events include, clients fetch the rest.
+PREVIEW_LENGTH = 140
+
+# Text search configuration researches are indexed and searched with.
+SEARCH_CONFIG = "english"
+
+# Questions weigh more than answers when ranking search results.
+SEARCH_VECTOR = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(question, '')), 'A')"
+    f" || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(answer, '')), 'B')"
+)
+
+# Questions and answers are user supplied. ts_headline wraps matches in these
+# private use characters (taken out of the text beforehand), the text is then
+# HTML escaped and they become <mark> tags, see mark_matches().
+START_SEL = "\ue000"
+STOP_SEL = "\ue001"
+
+# Questions are kept whole and answers are cut down to a few short fragments
+# around the matches.
+HEADLINE_OPTIONS = f'StartSel="{START_SEL}", StopSel="{STOP_SEL}"'
+QUESTION_HEADLINE_OPTIONS = f"{HEADLINE_OPTIONS}, HighlightAll=true"
+ANSWER_HEADLINE_OPTIONS = (
+    f"{HEADLINE_OPTIONS}, MaxFragments=2, MaxWords=20, MinWords=5, "
+    'FragmentDelimiter=" … "'
+)
 
 
 class Research(ResourceMixin, db.Model):
+    STATUS = OrderedDict(
+        [
+            ("pending", "Pending"),
+            ("completed", "Completed"),
+            ("failed", "Failed"),
+        ]
+    )
+
     __tablename__ = "researches"
+    __table_args__ = (
+        # Lets Postgres walk a user's history newest first for pagination.
+        db.Index(
+            "ix_researches_user_id_created_on_id",
+            "user_id",
+            db.text("created_on DESC"),
+            db.text("id DESC"),
+        ),
+        db.Index(
+            "ix_researches_search_vector",
+            "search_vector",
+            postgresql_using="gin",
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     # Relationships.
@@ -18,7 +90,18 @@ class Research(ResourceMixin, db.Model):
     user = db.relationship("User", viewonly=True)
 
     question = db.Column(db.String(2000), nullable=False)
-    answer = db.Column(db.String(2000), nullable=False)
+    answer = db.Column(db.String(2000), nullable=False, server_default="")
+    status = db.Column(
+        db.Enum(*STATUS, name="research_statuses", native_enum=False),
+        index=True,
+        nullable=False,
+        server_default="completed",
+    )
+
+    # Full text search, Postgres keeps it up to date.
+    search_vector = db.deferred(
+        db.Column(TSVECTOR, db.Computed(SEARCH_VECTOR, persisted=True))
+    )
 
     @classmethod
     def latest(cls, limit):
@@ -33,3 +116,528 @@ class Research(ResourceMixin, db.Model):
             .limit(limit)
             .all()
         )
+
+    @classmethod
+    def search(cls, query):
+        """
+        Search researches by their question and answer.
+
+        :param query: Search query, supports "quoted phrases", or and -not
+        :type query: str
+        :return: SQLAlchemy filter
+        """
+        return Research.search_vector.bool_op("@@")(search_query(query))
+
+    @classmethod
+    def search_rank(cls, query):
+        """
+        Rank how well researches match a search query, higher is better.
+
+        :param query: Search query
+        :type query: str
+        :return: SQLAlchemy expression
+        """
+        return db.func.ts_rank_cd(Research.search_vector, search_query(query))
+
+    @classmethod
+    def search_page(cls, query, user_id, limit, cursor=None):
+        """
+        Return a page of a user's researches matching a search query, best
+        matches first, with the matching words highlighted.
+
+        Only the page's rows get highlighted, which is the expensive part, so
+        it's done after ranking and limiting the matches.
+
+        :param query: Search query
+        :type query: str
+        :param user_id: Whose researches to search
+        :type user_id: int
+        :param limit: Maximum number of results
+        :type limit: int
+        :param cursor: Cursor returned along with the previous page
+        :type cursor: str
+        :return: tuple of (results, cursor of the next page or None)
+        :raises ValueError: If the cursor is invalid
+        """
+        rank = Research.search_rank(query)
+
+        matches = db.select(Research.id, rank.label("rank")).where(
+            Research.user_id == user_id, Research.search(query)
+        )
+
+        if cursor:
+            matches = matches.where(
+                tuple_(rank, Research.id) < decode_rank_cursor(cursor)
+            )
+
+        matches = (
+            matches.order_by(rank.desc(), Research.id.desc())
+            .limit(limit + 1)
+            .subquery()
+        )
+
+        results = db.session.execute(
+            db.select(
+                Research.id,
+                Research.created_on,
+                Research.status,
+                headline(
+                    Research.question, query, QUESTION_HEADLINE_OPTIONS
+                ).label("question"),
+                headline(
+                    Research.answer, query, ANSWER_HEADLINE_OPTIONS
+                ).label("answer"),
+                matches.c.rank,
+            )
+            .join(matches, Research.id == matches.c.id)
+            .order_by(matches.c.rank.desc(), matches.c.id.desc())
+        ).all()
+
+        if len(results) <= limit:
+            return results, None
+
+        results = results[:limit]
+        last = results[-1]
+
+        return results, encode_rank_cursor(last.rank, last.id)
+
+    @classmethod
+    def bulk_insert(cls, mappings):
+        """
+        Insert many researches and update their users' counters in the same
+        transaction.
+
+        :param mappings: 1 dict of column values per research
+        :type mappings: list
+        :return: Ids of the inserted researches
+        """
+        with unit_of_work() as session:
+            ids = insert_returning_ids(session, Research, mappings)
+            deltas = Counter(mapping["user_id"] for mapping in mappings)
+            count_researches(session.connection(), deltas)
+
+        return ids
+
+    @classmethod
+    def bulk_delete(cls, ids):
+        """
+        Delete 1 or more researches and update their users' counters in the
+        same transaction.
+
+        :param ids: List of ids to be deleted
+        :type ids: list
+        :return: Number of deleted instances
+        """
+        user_ids = db.session.scalars(
+            db.delete(Research)
+            .where(Research.id.in_(ids))
+            .returning(Research.user_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        deltas = {
+            user_id: -count for user_id, count in Counter(user_ids).items()
+        }
+        count_researches(db.session.connection(), deltas)
+        db.session.commit()
+
+        return len(user_ids)
+
+    @classmethod
+    def fetch_answer(cls, question, cache_mode="use", max_tokens=None):
+        """
+        Ask Azure OpenAI to answer a research question, unless the same
+        question was recently answered with the same settings.
+
+        :param question: Research question
+        :type question: str
+        :param cache_mode: Either use, refresh or bypass the answer cache
+        :type cache_mode: str
+        :param max_tokens: Longest answer in tokens, None for the default
+        :type max_tokens: int
+        :return: str or None if Azure OpenAI did not respond
+        """
+        batch = AnswerBatch([question], cache_mode, max_tokens)
+
+        if not batch.questions:
+            return batch.answers[0]
+
+        ai_response = batch.client.get_answer(
+            question=question, context=RESEARCH_CONTEXT, **batch.params
+        )
+
+        return batch.answered([answer_content(ai_response)])[0]
+
+    @classmethod
+    async def afetch_answer(cls, question, cache_mode="use", max_tokens=None):
+        """
+        The async version of fetch_answer(), for async views.
+
+        :param question: Research question
+        :type question: str
+        :param cache_mode: Either use, refresh or bypass the answer cache
+        :type cache_mode: str
+        :param max_tokens: Longest answer in tokens, None for the default
+        :type max_tokens: int
+        :return: str or None if Azure OpenAI did not respond
+        """
+        batch = await asyncio.to_thread(
+            AnswerBatch, [question], cache_mode, max_tokens
+        )
+
+        if not batch.questions:
+            return batch.answers[0]
+
+        ai_response = await batch.client.aget_answer(
+            question=question, context=RESEARCH_CONTEXT, **batch.params
+        )
+        answers = await asyncio.to_thread(
+            batch.answered, [answer_content(ai_response)]
+        )
+
+        return answers[0]
+
+    @classmethod
+    def fetch_answers(
+        cls, questions, concurrency, cache_mode="use", max_tokens=None
+    ):
+        """
+        Answer several research questions at once, asking Azure OpenAI for
+        the ones which aren't cached concurrently.
+
+        :param questions: Research questions
+        :type questions: list
+        :param concurrency: Maximum number of Azure OpenAI requests at once
+        :type concurrency: int
+        :param cache_mode: Either use, refresh or bypass the answer cache
+        :type cache_mode: str
+        :param max_tokens: Longest answer in tokens, None for the default
+        :type max_tokens: int
+        :return: list of str or None if Azure OpenAI did not respond, in the
+            same order as questions
+        """
+        batch = AnswerBatch(questions, cache_mode, max_tokens)
+
+        if not batch.questions:
+            return batch.answers
+
+        ai_responses = batch.client.get_answers(
+            batch.questions,
+            RESEARCH_CONTEXT,
+            concurrency=concurrency,
+            **batch.params,
+        )
+
+        return batch.answered(map(answer_content, ai_responses))
+
+    @classmethod
+    async def afetch_answers(
+        cls, questions, concurrency, cache_mode="use", max_tokens=None
+    ):
+        """
+        The async version of fetch_answers(), for async views. The answer
+        cache is read and written in a thread so it doesn't block the loop.
+
+        :param questions: Research questions
+        :type questions: list
+        :param concurrency: Maximum number of Azure OpenAI requests at once
+        :type concurrency: int
+        :param cache_mode: Either use, refresh or bypass the answer cache
+        :type cache_mode: str
+        :param max_tokens: Longest answer in tokens, None for the default
+        :type max_tokens: int
+        :return: list of str or None if Azure OpenAI did not respond, in the
+            same order as questions
+        """
+        batch = await asyncio.to_thread(
+            AnswerBatch, questions, cache_mode, max_tokens
+        )
+
+        if not batch.questions:
+            return batch.answers
+
+        ai_responses = await batch.client.aget_answers(
+            batch.questions,
+            RESEARCH_CONTEXT,
+            concurrency=concurrency,
+            **batch.params,
+        )
+
+        return await asyncio.to_thread(
+            batch.answered, list(map(answer_content, ai_responses))
+        )
+
+    @classmethod
+    def stream_answer(cls, question, cache_mode="use", max_tokens=None):
+        """
+        Ask Azure OpenAI to answer a research question, token by token. A
+        cached answer is streamed back as a single chunk.
+
+        :param question: Research question
+        :type question: str
+        :param cache_mode: Either use, refresh or bypass the answer cache
+        :type cache_mode: str
+        :param max_tokens: Longest answer in tokens, None for the default
+        :type max_tokens: int
+        :return: Iterator of answer deltas or None if Azure OpenAI did not
+            respond
+        """
+        batch = AnswerBatch([question], cache_mode, max_tokens)
+
+        if not batch.questions:
+            return iter(batch.answers)
+
+        deltas = batch.client.stream_answer(
+            question=question, context=RESEARCH_CONTEXT, **batch.params
+        )
+
+        if deltas is None:
+            return None
+
+        def cache_when_done():
+            chunks = []
+
+            for delta in deltas:
+                chunks.append(delta)
+                yield delta
+
+            batch.answered(["".join(chunks)])
+
+        return cache_when_done()
+
+    @classmethod
+    def channel(cls, user_id):
+        """
+        Return the name of the channel a user's research events are sent to.
+
+        :param user_id: User id
+        :type user_id: int
+        :return: str
+        """
+        return CHANNEL.format(user_id=user_id)
+
+    def notify(self, session=None):
+        """
+        Let the owner of this research know that it has been answered. The
+        event only has a preview, the full answer can be fetched by its id.
+
+        The event is added to the outbox in the current transaction, call this
+        before save() so both get committed together.
+
+        :param session: Session of the transaction, defaults to db.session
+        :type session: Session
+        :return: None
+        """
+        session = session or db.session
+
+        # Flush so the research has an id.
+        session.add(self)
+        session.flush()
+
+        Outbox.add(
+            Research.channel(self.user_id),
+            "new-research",
+            {
+                "id": self.id,
+                "status": self.status,
+                "question": preview(self.question),
+                "preview": preview(self.answer),
+            },
+            session=session,
+        )
+
+        return None
+
+
+def answer_params(max_tokens=None):
+    """
+    Return the sampling parameters, with a research's own max_tokens.
+
+    :param max_tokens: Longest answer in tokens, None for the default
+    :type max_tokens: int
+    :return: dict
+    """
+    if max_tokens is None:
+        return ANSWER_PARAMS
+
+    return {**ANSWER_PARAMS, "max_tokens": max_tokens}
+
+
+class AnswerBatch(object):
+    """
+    Research questions with their cached answers, and the questions Azure
+    OpenAI still has to answer. The sync, async and streaming ways of
+    answering share it and only differ in how they wait on Azure OpenAI.
+    """
+
+    def __init__(self, questions, cache_mode="use", max_tokens=None):
+        self.client = get_client()
+        self.params = answer_params(max_tokens)
+        self.cache = AnswerCache.from_config()
+        self.cache_mode = cache_mode
+        self.keys = [
+            self.cache.key(
+                question,
+                RESEARCH_CONTEXT,
+                self.client.deployment,
+                **self.params,
+            )
+            for question in questions
+        ]
+        self.answers = self.cache.lookup(self.keys, cache_mode)
+        self.missing = [
+            i for i, answer in enumerate(self.answers) if answer is None
+        ]
+        # The questions to ask Azure OpenAI.
+        self.questions = [questions[i] for i in self.missing]
+
+    def answered(self, answers):
+        """
+        Fill in (and cache) the answers to the questions asked.
+
+        :param answers: str or None per question, in the same order
+        :type answers: iterable
+        :return: list of every question's answer
+        """
+        answers = list(answers)
+
+        for i, answer in zip(self.missing, answers):
+            self.answers[i] = answer
+
+        self.cache.store(
+            [self.keys[i] for i in self.missing], answers, self.cache_mode
+        )
+
+        return self.answers
+
+
+def answer_content(ai_response):
+    """
+    Read the answer of an Azure OpenAI response.
+
+    :param ai_response: Completion as a dict, or None if it failed
+    :type ai_response: dict
+    :return: str or None
+    """
+    if not ai_response:
+        return None
+
+    return ai_response["choices"][0]["message"]["content"]
+
+
+def search_query(query):
+    """
+    Parse a search query the way web search engines do.
+
+    :param query: Search query
+    :type query: str
+    :return: SQLAlchemy tsquery expression
+    """
+    return db.func.websearch_to_tsquery(SEARCH_CONFIG, query)
+
+
+def headline(column, query, options=HEADLINE_OPTIONS):
+    """
+    Highlight the words of a column matching a search query.
+
+    :param column: Text column
+    :type column: Column
+    :param query: Search query
+    :type query: str
+    :param options: ts_headline options
+    :type options: str
+    :return: SQLAlchemy expression
+    """
+    return db.func.ts_headline(
+        SEARCH_CONFIG,
+        db.func.translate(column, START_SEL + STOP_SEL, ""),
+        search_query(query),
+        options,
+    )
+
+
+def mark_matches(text):
+    """
+    HTML escape a headline and wrap its matches in <mark> tags.
+
+    :param text: Text returned by headline()
+    :type text: str
+    :return: str
+    """
+    if text is None:
+        return None
+
+    return (
+        str(escape(text))
+        .replace(START_SEL, "<mark>")
+        .replace(STOP_SEL, "</mark>")
+    )
+
+
+def preview(text, length=PREVIEW_LENGTH):
+    """
+    Shorten text to at most length characters.
+
+    :param text: Text
+    :type text: str
+    :param length: Maximum length
+    :type length: int
+    :return: str
+    """
+    if not text or len(text) <= length:
+        return text
+
+    return text[: length - 1].rstrip() + "…"
+
+
+def count_researches(connection, deltas):
+    """
+    Add to (or subtract from) users' researches counters.
+
+    :param connection: Connection of the transaction changing the researches
+    :type connection: Connection
+    :param deltas: How much to change the counter by for each user id
+    :type deltas: dict
+    :return: None
+    """
+    if not deltas:
+        return None
+
+    users = db.metadata.tables["users"]
+
+    connection.execute(
+        users.update()
+        .where(users.c.id == db.bindparam("user_id"))
+        .values(
+            researches_count=users.c.researches_count + db.bindparam("delta")
+        ),
+        [
+            {"user_id": user_id, "delta": delta}
+            for user_id, delta in deltas.items()
+        ],
+    )
+
+    return None
+
+
+@db.event.listens_for(db.session, "after_flush")
+@db.event.listens_for(async_db.sync_session_class, "after_flush")
+def count_flushed_researches(session, flush_context):
+    """
+    Update the counters of every user whose researches were just inserted or
+    deleted, with 1 statement per flush rather than 1 per research.
+    """
+    deltas = Counter()
+
+    for instance in session.new:
+        if isinstance(instance, Research):
+            deltas[instance.user_id] += 1
+
+    for instance in session.deleted:
+        if isinstance(instance, Research):
+            deltas[instance.user_id] -= 1
+
+    count_researches(
+        session.connection(),
+        {user_id: delta for user_id, delta in deltas.items() if delta},
+    )
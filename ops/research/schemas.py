@@ -1,20 +1,57 @@
+from flask import current_app
+from marshmallow import ValidationError
 from marshmallow import fields
 from marshmallow import validate
+from marshmallow import validates
+from marshmallow import validates_schema
 
 from ops.extensions import marshmallow
 
 
 class ResearchSchema(marshmallow.Schema):
     class Meta:
-        fields = ("created_on", "id", "question", "answer")
+        fields = ("created_on", "id", "status", "question", "answer")
 
 
 class AddResearchSchema(marshmallow.Schema):
     question = fields.Str(
         required=True, validate=validate.Length(min=1, max=2000)
     )
+    max_tokens = fields.Int(validate=validate.Range(min=1, max=4096))
+
+
+class BatchResearchSchema(marshmallow.Schema):
+    # Questions are validated 1 at a time, invalid ones fail on their own.
+    questions = fields.List(fields.Raw(), required=True)
+    max_tokens = fields.Int(validate=validate.Range(min=1, max=4096))
+
+    @validates("questions")
+    def validate_questions(self, questions, **kwargs):
+        max_questions = current_app.config["RESEARCH_BATCH_MAX_QUESTIONS"]
+
+        if not 1 <= len(questions) <= max_questions:
+            raise ValidationError(
+                f"Must be a list of 1 to {max_questions} questions."
+            )
+
+
+class BulkDeleteSchema(marshmallow.Schema):
+    scope = fields.Str(
+        load_default="all_selected_items",
+        validate=validate.OneOf(["all_selected_items", "all_search_results"]),
+    )
+    ids = fields.List(fields.Int(), load_default=list)
+    omit_ids = fields.List(fields.Int(), load_default=list)
+    q = fields.Str(load_default="", validate=validate.Length(max=200))
+
+    @validates_schema
+    def ensure_search_query(self, data, **kwargs):
+        if data["scope"] == "all_search_results" and not data["q"].strip():
+            raise ValidationError("A search query is required.", "q")
 
 
 research_schema = ResearchSchema()
 researches_schema = ResearchSchema(many=True)
 add_research_schema = AddResearchSchema()
+batch_research_schema = BatchResearchSchema()
+bulk_delete_schema = BulkDeleteSchema()
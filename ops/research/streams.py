@@ -0,0 +1,195 @@
+import json
+import time
+import uuid
+
+import httpx
+from flask import current_app
+from openai import OpenAIError
+
+from lib.admission import AdmissionRejected
+from lib.circuit_breaker import CircuitOpenError
+from ops.initializers import redis
+from ops.research.models import Research
+from ops.research.schemas import research_schema
+
+TERMINAL_EVENTS = ("done", "error")
+
+
+class AnswerStream(object):
+    """
+    Relay an answer from Azure OpenAI as it's generated while buffering every
+    event in Redis, that way a client who lost its connection can resume the
+    stream (from any web worker) with Last-Event-ID.
+    """
+
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.key = f"research:stream:{stream_id}"
+        self.owner_key = f"{self.key}:owner"
+
+    @classmethod
+    def start(cls, user_id):
+        """
+        Start a new stream owned by a user.
+
+        :param user_id: Id of the user asking the question
+        :type user_id: int
+        :return: AnswerStream instance
+        """
+        stream = cls(uuid.uuid4().hex)
+        redis.set(
+            stream.owner_key,
+            user_id,
+            ex=current_app.config["RESEARCH_STREAM_TTL"],
+        )
+
+        return stream
+
+    @classmethod
+    def find(cls, stream_id, user_id):
+        """
+        Find a stream that is still buffered and owned by a user.
+
+        :param stream_id: Stream id
+        :type stream_id: str
+        :param user_id: Id of the user resuming the stream
+        :type user_id: int
+        :return: AnswerStream instance or None
+        """
+        stream = cls(stream_id)
+        owner = redis.get(stream.owner_key)
+
+        if owner is None or int(owner) != user_id:
+            return None
+
+        return stream
+
+    def answer(self, question, user_id, cache_mode="use", max_tokens=None):
+        """
+        Answer a question, yielding each event as soon as it's buffered.
+
+        If the client disconnects half way through we keep consuming the
+        answer so it still gets buffered and saved, and can be resumed.
+
+        :param question: Research question
+        :type question: str
+        :param user_id: Id of the user asking the question
+        :type user_id: int
+        :param cache_mode: Either use, refresh or bypass the answer cache
+        :type cache_mode: str
+        :param max_tokens: Longest answer in tokens, None for the default
+        :type max_tokens: int
+        :return: Generator of (event id, event, data) tuples
+        """
+        events = self._answer(question, user_id, cache_mode, max_tokens)
+
+        try:
+            for event in events:
+                yield event
+        finally:
+            for _ in events:
+                pass
+
+    def events(self, last_event_id=-1):
+        """
+        Replay the buffered events after an event id and then follow the
+        stream until it's finished.
+
+        :param last_event_id: Id of the last event the client received
+        :type last_event_id: int
+        :return: Generator of (event id, event, data) tuples
+        """
+        index = last_event_id + 1
+        idle_timeout = current_app.config["RESEARCH_STREAM_IDLE_TIMEOUT"]
+        idle_since = time.monotonic()
+
+        while time.monotonic() - idle_since < idle_timeout:
+            entries = redis.lrange(self.key, index, -1)
+
+            if not entries:
+                time.sleep(0.25)
+                continue
+
+            for entry in entries:
+                message = json.loads(entry)
+                yield index, message["event"], message["data"]
+
+                if message["event"] in TERMINAL_EVENTS:
+                    return
+
+                index += 1
+
+            idle_since = time.monotonic()
+
+        yield None, "error", {"message": "The answer stream has expired"}
+
+    def _answer(self, question, user_id, cache_mode, max_tokens=None):
+        """
+        Stream the answer from Azure OpenAI into Redis and save the research.
+
+        :param question: Research question
+        :type question: str
+        :param user_id: Id of the user asking the question
+        :type user_id: int
+        :param cache_mode: Either use, refresh or bypass the answer cache
+        :type cache_mode: str
+        :param max_tokens: Longest answer in tokens, None for the default
+        :type max_tokens: int
+        :return: Generator of (event id, event, data) tuples
+        """
+        try:
+            deltas = Research.stream_answer(question, cache_mode, max_tokens)
+        except (AdmissionRejected, CircuitOpenError) as e:
+            yield self._publish(
+                "error",
+                {
+                    "message": "Azure OpenAI is unavailable",
+                    "retry_after": e.retry_after,
+                },
+            )
+            return
+
+        if deltas is None:
+            yield self._publish(
+                "error",
+                {"message": "Failed to get response from Azure OpenAI"},
+            )
+            return
+
+        chunks = []
+
+        try:
+            for delta in deltas:
+                chunks.append(delta)
+                yield self._publish("delta", {"content": delta})
+        except (OpenAIError, httpx.HTTPError):
+            yield self._publish(
+                "error", {"message": "The answer stream was interrupted"}
+            )
+            return
+
+        research = Research()
+        research.user_id = user_id
+        research.question = question
+        research.answer = "".join(chunks)
+        research.notify()
+        research.save()
+
+        yield self._publish("done", research_schema.dump(research))
+
+    def _publish(self, event, data):
+        """
+        Append an event to the stream's buffer.
+
+        :param event: Event name
+        :type event: str
+        :param data: JSON serializable payload
+        :type data: dict
+        :return: (event id, event, data) tuple
+        """
+        pipeline = redis.pipeline()
+        pipeline.rpush(self.key, json.dumps({"event": event, "data": data}))
+        pipeline.expire(self.key, current_app.config["RESEARCH_STREAM_TTL"])
+        length, _ = pipeline.execute()
+
+        return length - 1, event, data
@@ -0,0 +1,125 @@
+import logging
+
+from celery import shared_task
+
+from lib.admission import AdmissionRejected
+from lib.circuit_breaker import CircuitOpenError
+from lib.util_jobs import JobProgress
+from ops.extensions import db
+from ops.research.models import Research
+
+log = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, max_retries=5)
+def answer_research(self, research_id, cache_mode="use", max_tokens=None):
+    """
+    Answer a pending research with Azure OpenAI and notify its owner. While
+    Azure OpenAI's circuit is open or it's at capacity the job is retried
+    later.
+
+    :param research_id: Id of the pending research
+    :type research_id: int
+    :param cache_mode: Either use, refresh or bypass the answer cache
+    :type cache_mode: str
+    :param max_tokens: Longest answer in tokens, None for the default
+    :type max_tokens: int
+    :return: Research status
+    """
+    research = db.session.get(Research, research_id)
+
+    if research is None or research.status != "pending":
+        return None
+
+    try:
+        answer = Research.fetch_answer(
+            research.question, cache_mode, max_tokens
+        )
+    except KeyError:
+        answer = None
+    except (AdmissionRejected, CircuitOpenError) as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(countdown=e.retry_after)
+
+        answer = None
+    except Exception:
+        # Redis, the database or the job's deadline failing mustn't leave
+        # the research pending forever.
+        log.exception("Answering research %s failed", research_id)
+        mark_failed(research_id)
+        raise
+
+    if answer is None:
+        research.status = "failed"
+        research.save()
+
+        return research.status
+
+    research.answer = answer
+    research.status = "completed"
+    research.notify()
+    research.save()
+
+    return research.status
+
+
+def mark_failed(research_id):
+    """
+    Mark a research as failed in a new transaction, in case the job's
+    transaction is the reason it failed.
+
+    :param research_id: Id of the research
+    :type research_id: int
+    :return: None
+    """
+    try:
+        db.session.rollback()
+        research = db.session.get(Research, research_id)
+
+        if research is not None and research.status == "pending":
+            research.status = "failed"
+            research.save()
+    except Exception:
+        db.session.rollback()
+        log.exception("Research %s could not be marked failed", research_id)
+
+    return None
+
+
+@shared_task()
+def delete_researches(job_id, user_id, scope, ids, omit_ids=(), query=""):
+    """
+    Delete a user's researches in chunks, each in its own short transaction.
+
+    :param job_id: Id of the JobProgress tracking this job
+    :type job_id: str
+    :param user_id: Only this user's researches get deleted
+    :type user_id: int
+    :param scope: Either all_selected_items or all_search_results
+    :type scope: str
+    :param ids: Selected research ids
+    :type ids: list
+    :param omit_ids: Research ids to keep
+    :type omit_ids: list
+    :param query: Search query when deleting all search results
+    :type query: str
+    :return: Number of deleted researches
+    """
+    job = JobProgress("research:bulk_delete", job_id)
+
+    try:
+        ids = Research.get_bulk_action_ids(
+            scope,
+            ids,
+            omit_ids=omit_ids,
+            query=query,
+            criteria=(Research.user_id == user_id,),
+        )
+        deleted = Research.bulk_delete_in_chunks(ids, progress=job.update)
+    except Exception:
+        job.finish("failed")
+        raise
+
+    job.finish()
+
+    return deleted
@@ -0,0 +1,140 @@
+import multiprocessing
+import time
+
+import click
+import psycopg
+from flask import current_app
+from flask.cli import AppGroup
+
+from lib.util_sqlalchemy import unit_of_work
+from ops.extensions import db
+from ops.research.models import Research
+from ops.seeds.synthetic import chunks
+from ops.seeds.synthetic import copy_researches
+from ops.seeds.synthetic import copy_users
+from ops.seeds.synthetic import psycopg_url
+from ops.seeds.synthetic import reserve_ids
+from ops.user.models import User
+from ops.user.models import missing_user_cache
+
+seed = AppGroup("seed", help="Generate data to develop and benchmark with.")
+
+# Building the GIN index once is faster than updating it for every row.
+DEFERRED_INDEXES = ("ix_researches_search_vector",)
+
+
+def run_chunks(label, worker, tasks, workers):
+    """
+    Run COPY tasks over a pool of processes and show their progress.
+
+    :return: Number of rows copied
+    """
+    started = time.monotonic()
+    total = 0
+
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        with click.progressbar(length=len(tasks), label=label) as bar:
+            for count in pool.imap_unordered(worker, tasks):
+                total += count
+                bar.update(1)
+
+    elapsed = time.monotonic() - started
+    click.echo(f"{label}: {total} rows, {total / elapsed:.0f} rows/s")
+
+    return total
+
+
+@seed.command("synthetic")
+@click.option(
+    "--users",
+    default=10000,
+    type=click.IntRange(min=1),
+    help="Users to create.",
+)
+@click.option(
+    "--researches",
+    default=500000,
+    type=click.IntRange(min=0),
+    help="Researches to create.",
+)
+@click.option(
+    "--workers",
+    default=4,
+    type=click.IntRange(min=1),
+    help="Processes (and connections).",
+)
+@click.option(
+    "--chunk-size",
+    default=50000,
+    type=click.IntRange(min=1),
+    help="Rows per COPY.",
+)
+@click.option("--days", default=365, help="Spread created_on over this.")
+@click.option("--password", default="password", help="Every user's password.")
+@click.option("--random-seed", default=0, help="Same seed, same dataset.")
+@click.option(
+    "--defer-indexes/--keep-indexes",
+    default=True,
+    help="Drop the search index while loading and rebuild it afterwards.",
+)
+def synthetic(
+    users,
+    researches,
+    workers,
+    chunk_size,
+    days,
+    password,
+    random_seed,
+    defer_indexes,
+):
+    """
+    Stream synthetic users and researches into the database with COPY.
+
+    The defaults are a quick local dataset, use something like
+    --users 1000000 --researches 50000000 to test at production volumes.
+    """
+    database_url = psycopg_url(current_app.config["SQLALCHEMY_DATABASE_URI"])
+    password_hash = User.encrypt_password(password)
+
+    with psycopg.connect(database_url) as connection:
+        first_user_id = reserve_ids(connection, "users", users)
+
+    tasks = [
+        (database_url, start, count, days, password_hash, random_seed + i)
+        for i, (start, count) in enumerate(
+            chunks(first_user_id, users, chunk_size)
+        )
+    ]
+    run_chunks("Users", copy_users, tasks, workers)
+    # COPY skips the ORM, so the new users' identities may still be cached
+    # as unknown.
+    missing_user_cache.clear()
+
+    if researches:
+        tasks = [
+            (database_url, first_user_id, users, count, days, random_seed + i)
+            for i, (_, count) in enumerate(chunks(0, researches, chunk_size))
+        ]
+        indexes = [
+            index
+            for index in Research.__table__.indexes
+            if defer_indexes and index.name in DEFERRED_INDEXES
+        ]
+
+        for index in indexes:
+            index.drop(db.engine)
+
+        try:
+            run_chunks("Researches", copy_researches, tasks, workers)
+        finally:
+            for index in indexes:
+                click.echo(f"Rebuilding {index.name}")
+                index.create(db.engine)
+
+    # COPY skips the ORM so the counters are filled in afterwards.
+    count = User.reconcile_researches_count()
+    click.echo(f"Fixed the researches count of {count} user(s)")
+
+    with unit_of_work():
+        db.session.execute(db.text("ANALYZE users"))
+        db.session.execute(db.text("ANALYZE researches"))
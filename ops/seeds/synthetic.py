@@ -0,0 +1,222 @@
+"""
+Generate a large, realistic looking dataset to validate indexes, pagination
+and search against.
+
+Rows are streamed into Postgres with COPY FROM STDIN by several worker
+processes, each with its own connection and a chunk of the rows.
+"""
+
+import datetime
+import math
+import random
+
+import psycopg
+from faker import Faker
+from sqlalchemy.engine import make_url
+
+USER_COLUMNS = (
+    "id",
+    "username",
+    "email",
+    "password",
+    "created_on",
+    "updated_on",
+)
+RESEARCH_COLUMNS = (
+    "user_id",
+    "question",
+    "answer",
+    "status",
+    "created_on",
+    "updated_on",
+)
+
+# Median lengths in characters, lengths are log-normally distributed around
+# them (a few long ones, many short ones) and capped by the columns' size.
+QUESTION_LENGTH = 80
+ANSWER_LENGTH = 900
+MAX_LENGTH = 2000
+
+
+def psycopg_url(database_url):
+    """
+    Turn a SQLAlchemy database URL into one psycopg accepts.
+
+    :param database_url: SQLAlchemy database URL
+    :type database_url: str
+    :return: str
+    """
+    url = make_url(database_url).set(drivername="postgresql")
+
+    return url.render_as_string(hide_password=False)
+
+
+def reserve_ids(connection, table, count):
+    """
+    Move a table's id sequence past count ids and return the first one, so
+    workers can COPY rows with known ids.
+
+    :param connection: psycopg connection
+    :type connection: psycopg.Connection
+    :param table: Table name
+    :type table: str
+    :param count: Number of ids, at least 1
+    :type count: int
+    :raises ValueError: When count is less than 1
+    :return: int
+    """
+    # setval() can't move a sequence back to before its first id.
+    if count < 1:
+        raise ValueError(f"Can't reserve {count} ids, reserve at least 1")
+
+    query = (
+        "SELECT setval(pg_get_serial_sequence(%(table)s, 'id'), "
+        "nextval(pg_get_serial_sequence(%(table)s, 'id')) + %(count)s - 1)"
+    )
+    last_id = connection.execute(
+        query, {"table": table, "count": count}
+    ).fetchone()[0]
+
+    return last_id - count + 1
+
+
+def chunks(start, count, chunk_size):
+    """
+    Split a range of rows into (start, count) chunks.
+
+    :return: list of tuples
+    """
+    return [
+        (i, min(chunk_size, start + count - i))
+        for i in range(start, start + count, chunk_size)
+    ]
+
+
+class TextGenerator(object):
+    """
+    Build text out of a fixed pool of words, calling Faker for every row
+    would take longer than writing the rows.
+    """
+
+    def __init__(self, seed, pool_size=5000):
+        faker = Faker()
+        faker.seed_instance(seed)
+
+        self.random = random.Random(seed)
+        self.words = faker.words(nb=pool_size, unique=False)
+
+    def text(self, median_length):
+        """
+        Generate text of a log-normal length around median_length.
+
+        :param median_length: Median length in characters
+        :type median_length: int
+        :return: str
+        """
+        length = int(self.random.lognormvariate(math.log(median_length), 0.6))
+        length = max(10, min(length, MAX_LENGTH))
+
+        # Words average about 7 characters including the space.
+        words = self.random.choices(self.words, k=length // 7 + 1)
+        text = " ".join(words)[:length].rsplit(" ", 1)[0]
+
+        return text[0].upper() + text[1:] + "."
+
+    def question(self):
+        return self.text(QUESTION_LENGTH)[:-1] + "?"
+
+    def answer(self):
+        return self.text(ANSWER_LENGTH)
+
+    def created_on(self, now, days):
+        seconds = self.random.uniform(0, days * 86400)
+
+        return now - datetime.timedelta(seconds=seconds)
+
+
+def copy_users(task):
+    """
+    COPY a chunk of users, this runs in a worker process.
+
+    :param task: (database_url, first id, count, days, password hash, seed)
+    :type task: tuple
+    :return: Number of rows copied
+    """
+    database_url, start, count, days, password_hash, seed = task
+    generator = TextGenerator(seed)
+    faker = Faker()
+    faker.seed_instance(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    with psycopg.connect(database_url) as connection:
+        with connection.cursor() as cursor:
+            statement = f"COPY users ({', '.join(USER_COLUMNS)}) FROM STDIN"
+
+            with cursor.copy(statement) as copy:
+                for id in range(start, start + count):
+                    created_on = generator.created_on(now, days)
+                    # The id suffix keeps both unique (usernames max 24).
+                    name = faker.user_name()[:14]
+
+                    copy.write_row(
+                        (
+                            id,
+                            f"{name}_{id}",
+                            f"{name}.{id}@{faker.free_email_domain()}",
+                            password_hash,
+                            created_on,
+                            created_on,
+                        )
+                    )
+
+    return count
+
+
+def copy_researches(task):
+    """
+    COPY a chunk of researches, this runs in a worker process.
+
+    Researches are spread over users with a power law so a few users have
+    very long histories and most have a handful.
+
+    :param task: (database_url, first user id, users, count, days, seed)
+    :type task: tuple
+    :return: Number of rows copied
+    """
+    database_url, first_user_id, users, count, days, seed = task
+    generator = TextGenerator(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    columns = ", ".join(RESEARCH_COLUMNS)
+
+    with psycopg.connect(database_url) as connection:
+        with connection.cursor() as cursor:
+            statement = f"COPY researches ({columns}) FROM STDIN"
+
+            with cursor.copy(statement) as copy:
+                for _ in range(count):
+                    user_id = first_user_id + int(
+                        users * generator.random.random() ** 3
+                    )
+                    created_on = generator.created_on(now, days)
+                    status = (
+                        "failed"
+                        if generator.random.random() < 0.01
+                        else "completed"
+                    )
+
+                    copy.write_row(
+                        (
+                            user_id,
+                            generator.question(),
+                            (
+                                generator.answer()
+                                if status == "completed"
+                                else ""
+                            ),
+                            status,
+                            created_on,
+                            created_on,
+                        )
+                    )
+
+    return count
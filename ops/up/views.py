@@ -1,8 +1,16 @@
+import hmac
+
 from flask import Blueprint
+from flask import current_app
+from flask import jsonify
+from flask import request
 from sqlalchemy import text
 
 from ops.extensions import db
 from ops.initializers import redis
+from ops.notifications.models import Outbox
+from ops.research.cache import AnswerCache
+from utils.openai import deployment_metrics
 
 up = Blueprint("up", __name__, template_folder="templates", url_prefix="/up")
 
@@ -18,3 +26,24 @@ def databases():
     with db.engine.connect() as connection:
         connection.execute(text("SELECT 1"))
     return ""
+
+
+@up.get("/metrics")
+def metrics():
+    token = current_app.config["METRICS_TOKEN"]
+
+    if not token:
+        return "", 404
+
+    authorization = request.headers.get("Authorization", "")
+
+    if not hmac.compare_digest(authorization, f"Bearer {token}"):
+        return "", 401, {"WWW-Authenticate": "Bearer"}
+
+    return jsonify(
+        {
+            "research_cache": AnswerCache.from_config().stats(),
+            "outbox": Outbox.stats(),
+            "azure_openai": deployment_metrics(),
+        }
+    )
@@ -0,0 +1,50 @@
+import time
+
+import click
+from flask.cli import AppGroup
+
+from lib.util_jobs import JobProgress
+from ops.user.models import User
+from ops.user.tasks import delete_users
+
+users = AppGroup("users", help="Manage users.")
+
+
+@users.command("reconcile-counts")
+def reconcile_counts():
+    """
+    Recount researches for users whose counter drifted.
+    """
+    count = User.reconcile_researches_count()
+
+    click.echo(f"Fixed the researches count of {count} user(s)")
+
+
+@users.command("bulk-delete")
+@click.argument("ids", nargs=-1, type=int)
+@click.option("--query", help="Delete every user matching this search.")
+@click.option("--omit", multiple=True, type=int, help="User id to keep.")
+@click.option("--chunk-size", default=1000, help="Researches per delete.")
+@click.confirmation_option(prompt="Delete these users and their researches?")
+def bulk_delete(ids, query, omit, chunk_size):
+    """
+    Delete users with a Celery job and follow its progress, stopping this
+    command (CTRL+C) leaves the job running.
+    """
+    scope = "all_search_results" if query else "all_selected_items"
+    ids = User.get_bulk_action_ids(scope, ids, omit_ids=omit, query=query)
+
+    job = JobProgress.start("user:bulk_delete", "cli")
+    delete_users.delay(job.job_id, ids, chunk_size)
+    click.echo(f"Deleting {len(ids)} user(s) in job {job.job_id}")
+
+    while True:
+        progress = job.to_dict()
+        click.echo(
+            f"{progress['status']}: {progress['done']}/{len(ids)} deleted"
+        )
+
+        if progress["status"] in ("completed", "failed"):
+            break
+
+        time.sleep(1)
@@ -1,14 +1,42 @@
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import or_
 from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import check_password_hash
 from werkzeug.security import generate_password_hash
 
+from config import settings
+from lib.util_cache import TieredCache
 from lib.util_sqlalchemy import ResourceMixin
+from ops.extensions import async_db
 from ops.extensions import db
 from ops.research.models import Research
 
+# Users resolved from JWT identities (usernames), see find_by_jwt_identity().
+user_cache = TieredCache(
+    "user:jwt",
+    settings.USER_CACHE_TTL,
+    settings.USER_CACHE_LOCAL_TTL,
+    settings.USER_CACHE_LOCAL_MAXSIZE,
+)
+
+# Identities nobody has, it's only kept in Redis since a process local copy
+# couldn't be cleared when another process registers the identity.
+missing_user_cache = TieredCache(
+    "user:missing", settings.USER_MISSING_CACHE_TTL, 0, 0
+)
+
 
 class User(ResourceMixin, db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        # Lets Postgres walk the users newest first for pagination.
+        db.Index(
+            "ix_users_created_on_id",
+            db.text("created_on DESC"),
+            db.text("id DESC"),
+        ),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     # Relationships.
@@ -27,6 +55,11 @@ class User(ResourceMixin, db.Model):
     )
     password = db.Column(db.String(255), nullable=False, server_default="")
 
+    # Activity tracking, kept up to date by Research's mapper events.
+    researches_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+
     def __init__(self, **kwargs):
         # Call Flask-SQLAlchemy's constructor.
         super(User, self).__init__(**kwargs)
@@ -40,20 +73,180 @@ class User(ResourceMixin, db.Model):
 
         :return: Integer
         """
-        return len(self.researches)
+        return self.researches_count
+
+    @researches_posted.expression
+    def researches_posted(cls):
+        return cls.researches_count
+
+    @classmethod
+    def reconcile_researches_count(cls):
+        """
+        Recount every user's researches, fixing counters which drifted (such
+        as after inserting researches without the ORM).
+
+        :return: Number of users whose counter was fixed
+        """
+        count = (
+            db.select(func.count(Research.id))
+            .where(Research.user_id == User.id)
+            .scalar_subquery()
+        )
+        result = db.session.execute(
+            db.update(User)
+            .where(User.researches_count != count)
+            .values(researches_count=count)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        return result.rowcount
 
     @classmethod
     def find_by_identity(cls, identity):
         """
-        Find a user by their e-mail or username.
+        Find a user by their e-mail or username, ignoring case.
+
+        Identities with an @ are e-mails and everything else is a username,
+        this way each lookup uses 1 index instead of OR'ing both of them.
+        Unknown identities are remembered for a little while so repeatedly
+        trying them doesn't reach the database.
 
         :param identity: Email or username
         :type identity: str
         :return: User instance
         """
-        return User.query.filter(
-            (User.email == identity) | (User.username == identity)
-        ).first()
+        key = identity.lower()
+
+        if missing_user_cache.get(key):
+            return None
+
+        column = User.email if "@" in identity else User.username
+
+        # Exact matches first in case of users who only differ by case.
+        user = (
+            User.query.filter(func.lower(column) == key)
+            .order_by((column == identity).desc())
+            .first()
+        )
+
+        if user is None:
+            missing_user_cache.set(key, True)
+
+        return user
+
+    @classmethod
+    def search(cls, query):
+        """
+        Search users by their e-mail or username.
+
+        :param query: Search query
+        :type query: str
+        :return: SQLAlchemy filter
+        """
+        search_query = f"%{query.lower()}%"
+
+        return or_(
+            func.lower(User.email).like(search_query),
+            func.lower(User.username).like(search_query),
+        )
+
+    @classmethod
+    def delete_with_researches(cls, user_id, chunk_size=1000):
+        """
+        Delete a user after deleting their researches a chunk at a time,
+        rather than letting 1 long ON DELETE CASCADE lock all of them.
+
+        :param user_id: Id of the user to delete
+        :type user_id: int
+        :param chunk_size: Researches deleted per transaction
+        :type chunk_size: int
+        :return: Number of deleted researches
+        """
+        deleted = 0
+
+        while True:
+            research_ids = db.session.scalars(
+                db.select(Research.id)
+                .where(Research.user_id == user_id)
+                .limit(chunk_size)
+            ).all()
+
+            if not research_ids:
+                break
+
+            deleted += Research.bulk_delete(research_ids)
+
+        User.bulk_delete([user_id])
+
+        return deleted
+
+    @classmethod
+    def find_by_jwt_identity(cls, identity):
+        """
+        Find the user a JWT was issued to, from the cache when possible.
+
+        The password hash and researches count are never cached, they get
+        lazy loaded if they're used.
+
+        :param identity: Username the JWT was issued to
+        :type identity: str
+        :return: User instance
+        """
+        data = user_cache.get(identity)
+
+        if data is not None:
+            return User.from_cache(data)
+
+        user = User.query.filter(User.username == identity).first()
+
+        if user:
+            user_cache.set(
+                identity,
+                user.to_cache(exclude=("password", "researches_count")),
+            )
+
+        return user
+
+    @classmethod
+    def bulk_insert(cls, mappings):
+        """
+        Insert many users, ORM events don't run so they're dropped from the
+        unknown identities here.
+
+        :param mappings: 1 dict of column values per user
+        :type mappings: list
+        :return: Ids of the inserted users, in the same order as mappings
+        """
+        ids = super(User, cls).bulk_insert(mappings)
+        forget_missing_users(
+            identity
+            for mapping in mappings
+            for identity in (mapping.get("username"), mapping.get("email"))
+        )
+
+        return ids
+
+    @classmethod
+    def bulk_delete(cls, ids):
+        """
+        Delete 1 or more users and drop them from the cache.
+
+        :param ids: List of ids to be deleted
+        :type ids: list
+        :return: Number of deleted instances
+        """
+        usernames = db.session.scalars(
+            db.delete(User)
+            .where(User.id.in_(ids))
+            .returning(User.username)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+
+        user_cache.delete(*usernames)
+
+        return len(usernames)
 
     @classmethod
     def encrypt_password(cls, plaintext_password):
@@ -87,3 +280,98 @@ class User(ResourceMixin, db.Model):
             return check_password_hash(self.password, password)
 
         return True
+
+    def save(self):
+        """
+        Save the user and drop any cached copy of it.
+
+        :return: User instance
+        """
+        usernames = self._cached_usernames()
+        super(User, self).save()
+        user_cache.delete(*usernames)
+
+        return self
+
+    def delete(self):
+        """
+        Delete the user and drop any cached copy of it.
+
+        :return: db.session.commit()'s result
+        """
+        usernames = self._cached_usernames()
+        result = super(User, self).delete()
+        user_cache.delete(*usernames)
+
+        return result
+
+    def _cached_usernames(self):
+        """
+        Usernames this user may be cached under, the current one as well as
+        the one it had before an unsaved rename.
+
+        :return: list
+        """
+        history = inspect(self).attrs.username.history
+
+        return [self.username, *history.deleted]
+
+
+def forget_missing_users(identities):
+    """
+    Drop identities from the unknown identities, once a user has them.
+
+    :param identities: E-mails and usernames, None is skipped
+    :type identities: iterable
+    :return: None
+    """
+    missing_user_cache.delete(
+        *{identity.lower() for identity in identities if identity}
+    )
+
+    return None
+
+
+@db.event.listens_for(db.session, "after_flush")
+@db.event.listens_for(async_db.sync_session_class, "after_flush")
+def collect_flushed_identities(session, flush_context):
+    """
+    Remember the identities of users which were just inserted or changed,
+    they're no longer unknown once the transaction commits.
+    """
+    identities = session.info.setdefault("user_identities", set())
+
+    for instance in session.new:
+        if isinstance(instance, User):
+            identities.update((instance.username, instance.email))
+
+    for instance in session.dirty:
+        if isinstance(instance, User):
+            attrs = inspect(instance).attrs
+
+            if attrs.username.history.added:
+                identities.add(instance.username)
+
+            if attrs.email.history.added:
+                identities.add(instance.email)
+
+
+@db.event.listens_for(db.session, "after_commit")
+@db.event.listens_for(async_db.sync_session_class, "after_commit")
+def forget_committed_identities(session):
+    """
+    Drop the identities of committed users from the unknown identities. It's
+    done after the commit so a lookup in between can't cache them again.
+    """
+    forget_missing_users(session.info.pop("user_identities", ()))
+
+
+@db.event.listens_for(db.session, "after_rollback")
+@db.event.listens_for(async_db.sync_session_class, "after_rollback")
+def discard_flushed_identities(session):
+    session.info.pop("user_identities", None)
+
+
+# Case insensitive lookups, see User.find_by_identity().
+db.Index("ix_users_lower_email", func.lower(User.email))
+db.Index("ix_users_lower_username", func.lower(User.username))
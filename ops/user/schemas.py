@@ -17,14 +17,19 @@ def ensure_unique_identity(data):
 
 class UserSchema(marshmallow.Schema):
     class Meta:
-        fields = ("created_on", "username", "facts_posted")
+        fields = ("created_on", "username", "researches_posted")
 
 
 class RegistrationSchema(marshmallow.Schema):
     email = fields.Email(required=True, validate=ensure_unique_identity)
     username = fields.Str(
         required=True,
-        validate=[validate.Length(min=3, max=255), ensure_unique_identity],
+        validate=[
+            validate.Length(min=3, max=255),
+            # An @ is how find_by_identity() tells e-mails apart.
+            validate.ContainsNoneOf("@", error="Can't contain an @"),
+            ensure_unique_identity,
+        ],
     )
     password = fields.Str(
         required=True, validate=validate.Length(min=8, max=255)
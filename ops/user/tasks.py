@@ -0,0 +1,32 @@
+from celery import shared_task
+
+from lib.util_jobs import JobProgress
+from ops.user.models import User
+
+
+@shared_task()
+def delete_users(job_id, ids, chunk_size=1000):
+    """
+    Delete users along with their researches, 1 user at a time.
+
+    :param job_id: Id of the JobProgress tracking this job
+    :type job_id: str
+    :param ids: Ids of the users to delete
+    :type ids: list
+    :param chunk_size: Researches deleted per transaction
+    :type chunk_size: int
+    :return: Number of deleted users
+    """
+    job = JobProgress("user:bulk_delete", job_id)
+
+    try:
+        for deleted, user_id in enumerate(ids, start=1):
+            User.delete_with_researches(int(user_id), chunk_size)
+            job.update(deleted, len(ids))
+    except Exception:
+        job.finish("failed")
+        raise
+
+    job.finish()
+
+    return len(ids)
@@ -1,24 +1,8 @@
-import pytest
 from flask import url_for
 
-from ops.user.models import User
-
-
-@pytest.fixture
-def user(session):
-    # First check if user exists and delete if it does
-    existing_user = (
-        session.query(User).filter_by(email="demo@gmail.com").first()
-    )
-    if existing_user:
-        session.delete(existing_user)
-        session.commit()
-
-    user = User(username="demo_user", email="demo@gmail.com")
-    user.password = user.encrypt_password("password101")
-    session.add(user)
-    session.commit()
-    return user
+from lib import rate_limit
+from lib import util_cache
+from ops.initializers import redis
 
 
 def test_login(client, user):
@@ -30,27 +14,30 @@ def test_login(client, user):
     assert "access_token" in response.json["data"]
 
 
-def test_login_invalid_credentials(client):
+def test_login_without_redis(client, user, unreachable_redis, monkeypatch):
+    monkeypatch.setattr(util_cache, "_redis", unreachable_redis)
+    monkeypatch.setattr(rate_limit, "_redis", unreachable_redis)
+
     response = client.post(
         url_for("api_v1.auth.post"),
-        json={"identity": "wronguser", "password": "wrongpassword"},
+        json={"identity": user.email, "password": "password101"},
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        url_for("api_v1.auth.post"),
+        json={"identity": "nobody@local.host", "password": "password101"},
     )
     assert response.status_code == 401
-    assert response.json["error"]["message"] == "Invalid identity or password"
 
 
-@pytest.fixture
-def auth_headers(client, user):
-    """Fixture to get authenticated headers"""
+def test_login_invalid_credentials(client):
     response = client.post(
         url_for("api_v1.auth.post"),
-        json={"identity": user.username, "password": "password101"},
+        json={"identity": "wronguser", "password": "wrongpassword"},
     )
-    assert (
-        response.status_code == 200
-    ), f"Login failed with response: {response.json}"
-    token = response.json["data"]["access_token"]
-    return {"Authorization": f"Bearer {token}"}
+    assert response.status_code == 401
+    assert response.json["error"]["message"] == "Invalid identity or password"
 
 
 def test_logout(client, auth_headers):
@@ -61,10 +48,47 @@ def test_logout(client, auth_headers):
     assert response.json["data"]["logout"] is True
 
 
-def test_pusher_auth(client, auth_headers):
+def test_pusher_auth(client, auth_headers, user):
     response = client.post(
         url_for("api_v1.auth.pusher"),
-        data={"channel_name": "test_channel", "socket_id": "123.456"},
+        data={
+            "channel_name": f"private-research-{user.id}",
+            "socket_id": "123.456",
+        },
         headers=auth_headers,
     )
     assert response.status_code == 200
+
+
+def test_pusher_auth_forbids_other_channels(client, auth_headers, user):
+    response = client.post(
+        url_for("api_v1.auth.pusher"),
+        data={
+            "channel_name": f"private-research-{user.id + 1}",
+            "socket_id": "123.456",
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 403
+
+
+def test_login_rate_limited(app, client, monkeypatch):
+    monkeypatch.setitem(app.config, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setitem(
+        app.config, "RATE_LIMITS", {"api_v1.auth.post": {"per_ip": "2/hour"}}
+    )
+    redis.delete("rate_limit:api_v1.auth.post:ip:127.0.0.1")
+
+    for _ in range(2):
+        response = client.post(
+            url_for("api_v1.auth.post"),
+            json={"identity": "wronguser", "password": "wrongpassword"},
+        )
+        assert response.status_code == 401
+
+    response = client.post(
+        url_for("api_v1.auth.post"),
+        json={"identity": "wronguser", "password": "wrongpassword"},
+    )
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 1000
@@ -0,0 +1,509 @@
+import re
+
+import pytest
+from flask import url_for
+
+from lib.admission import AdmissionRejected
+from lib.circuit_breaker import CircuitOpenError
+from lib.notifier import RedisNotifier
+from lib.util_sse import SSE_KEEPALIVE
+from ops.api.v1 import research as research_views
+from ops.extensions import db
+from ops.initializers import redis
+from ops.research import models
+from ops.research import tasks
+from ops.research.models import Research
+from ops.user.models import User
+
+
+@pytest.fixture
+def fake_answer(monkeypatch):
+    """Answer every research without calling Azure OpenAI or Pusher."""
+    monkeypatch.setattr(
+        Research,
+        "fetch_answer",
+        classmethod(lambda cls, question, *args: "42"),
+    )
+    monkeypatch.setattr(Research, "notify", lambda self, session=None: None)
+
+
+def test_create_research(client, auth_headers, fake_answer):
+    response = client.post(
+        url_for("api_v1.researches.post"),
+        json={"question": "What is the answer?"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.json["data"]["answer"] == "42"
+
+
+def test_create_research_batch(client, auth_headers, user, monkeypatch):
+    monkeypatch.setattr(
+        Research,
+        "fetch_answers",
+        classmethod(
+            lambda cls, questions, *args: [
+                "42" if question == "Answered?" else None
+                for question in questions
+            ]
+        ),
+    )
+    monkeypatch.setattr(Research, "notify", lambda self, session=None: None)
+
+    response = client.post(
+        url_for("api_v1.researches.batch"),
+        json={"questions": ["Answered?", "", "Unanswered?"]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    answered, invalid, unanswered = response.json["data"]
+    assert answered["success"] is True
+    assert answered["research"]["answer"] == "42"
+    research = db.session.get(Research, answered["research"]["id"])
+    assert research.user_id == user.id
+    assert invalid["success"] is False
+    assert "question" in invalid["error"]
+    assert unanswered["success"] is False
+
+
+def test_create_research_batch_limit(app, client, auth_headers, monkeypatch):
+    monkeypatch.setitem(app.config, "RESEARCH_BATCH_MAX_QUESTIONS", 2)
+
+    response = client.post(
+        url_for("api_v1.researches.batch"),
+        json={"questions": ["1?", "2?", "3?"]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize(
+    "body",
+    [[1], {"questions": "Why?"}, {"questions": ["Why?"], "max_tokens": 0}],
+    ids=["array", "questions_not_a_list", "invalid_max_tokens"],
+)
+def test_create_research_batch_invalid(client, auth_headers, body):
+    response = client.post(
+        url_for("api_v1.researches.batch"), json=body, headers=auth_headers
+    )
+
+    assert response.status_code == 422
+
+
+def test_create_research_circuit_open(client, auth_headers, monkeypatch):
+    def fetch_answer(cls, question, cache_mode="use", max_tokens=None):
+        raise CircuitOpenError("azure-openai:test", 12.5)
+
+    monkeypatch.setattr(Research, "fetch_answer", classmethod(fetch_answer))
+
+    response = client.post(
+        url_for("api_v1.researches.post"),
+        json={"question": "Is it down?"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "13"
+
+
+def test_create_research_at_capacity(client, auth_headers, monkeypatch):
+    def fetch_answer(cls, question, cache_mode="use", max_tokens=None):
+        raise AdmissionRejected("azure-openai:test", 2)
+
+    monkeypatch.setattr(Research, "fetch_answer", classmethod(fetch_answer))
+
+    response = client.post(
+        url_for("api_v1.researches.post"),
+        json={"question": "Is it busy?"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+
+
+@pytest.fixture
+def rate_limits(app, monkeypatch):
+    """Enable rate limiting with empty buckets."""
+    monkeypatch.setitem(app.config, "RATE_LIMIT_ENABLED", True)
+
+    for key in redis.scan_iter("rate_limit:*"):
+        redis.delete(key)
+
+    def set_limits(limits):
+        monkeypatch.setitem(app.config, "RATE_LIMITS", limits)
+
+    return set_limits
+
+
+def test_create_research_rate_limited(
+    client, auth_headers, fake_answer, rate_limits
+):
+    rate_limits(
+        {
+            "api_v1.researches.post": {
+                "per_user": "2000/minute",
+                "cost": "max_tokens",
+            }
+        }
+    )
+
+    def create(max_tokens):
+        return client.post(
+            url_for("api_v1.researches.post"),
+            json={"question": "Am I limited?", "max_tokens": max_tokens},
+            headers=auth_headers,
+        )
+
+    response = create(1500)
+
+    assert response.status_code == 200
+    assert response.headers["RateLimit-Limit"] == "2000"
+    assert response.headers["RateLimit-Remaining"] == "500"
+    assert response.headers["RateLimit-Policy"] == "2000;w=60"
+
+    response = create(1000)
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 15
+    assert response.headers["RateLimit-Remaining"] == "500"
+
+    # Cheaper researches still fit in what's left.
+    assert create(400).status_code == 200
+
+
+def test_list_researches_shares_blueprint_rate_limit(
+    client, auth_headers, user, rate_limits
+):
+    rate_limits({"api_v1.researches": {"per_user": "1/minute"}})
+
+    response = client.get(
+        url_for("api_v1.researches.index", username=user.username),
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+    response = client.get(
+        url_for("api_v1.researches.search", q="anything"),
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 429
+
+
+def test_create_research_job(
+    app, client, auth_headers, user, fake_answer, monkeypatch
+):
+    queued = []
+    monkeypatch.setitem(app.config, "RESEARCH_JOBS", True)
+    monkeypatch.setattr(
+        tasks.answer_research,
+        "delay",
+        lambda research_id, cache_mode, max_tokens: queued.append(research_id),
+    )
+
+    response = client.post(
+        url_for("api_v1.researches.post"),
+        json={"question": "What is a job?"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 202
+    assert response.json["data"]["status"] == "pending"
+    assert queued == [response.json["data"]["id"]]
+
+    status = client.get(response.headers["Location"], headers=auth_headers)
+    assert status.json["data"]["status"] == "pending"
+
+    assert tasks.answer_research.run(queued[0]) == "completed"
+
+    status = client.get(response.headers["Location"], headers=auth_headers)
+    assert status.json["data"]["status"] == "completed"
+    assert status.json["data"]["answer"] == "42"
+
+
+def test_research_job_failure(app, client, auth_headers, user, monkeypatch):
+    research = Research(user_id=user.id, question="Unlucky?", status="pending")
+    research.save()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("Redis is down")
+
+    monkeypatch.setattr(Research, "fetch_answer", fail)
+
+    with pytest.raises(RuntimeError):
+        tasks.answer_research.run(research.id)
+
+    status = client.get(
+        url_for("api_v1.researches.show", research_id=research.id),
+        headers=auth_headers,
+    )
+    assert status.json["data"]["status"] == "failed"
+
+
+def test_show_missing_research(client, auth_headers):
+    response = client.get(
+        url_for("api_v1.researches.show", research_id=0),
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 404
+
+
+def test_stream_research(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(
+        Research,
+        "stream_answer",
+        classmethod(lambda cls, question, *args: iter(["4", "2"])),
+    )
+    monkeypatch.setattr(Research, "notify", lambda self, session=None: None)
+
+    response = client.post(
+        url_for("api_v1.researches.stream"),
+        json={"question": "What is the answer?"},
+        headers=auth_headers,
+    )
+    body = response.get_data(as_text=True)
+
+    assert response.mimetype == "text/event-stream"
+    assert 'id: 0\nevent: delta\ndata: {"content": "4"}' in body
+    assert "id: 2\nevent: done\n" in body
+
+    resumed = client.get(
+        response.headers["Location"],
+        headers={**auth_headers, "Last-Event-ID": "0"},
+    )
+    body = resumed.get_data(as_text=True)
+
+    assert '"content": "4"' not in body
+    assert 'id: 1\nevent: delta\ndata: {"content": "2"}' in body
+    assert '"answer": "42"' in body
+
+
+def test_create_research_cache_hit(client, auth_headers, monkeypatch):
+    calls = []
+
+    class FakeClient(object):
+        deployment = "fake"
+
+        def get_answer(self, **kwargs):
+            calls.append(kwargs)
+            return {"choices": [{"message": {"content": "cached"}}]}
+
+    monkeypatch.setattr(models, "get_client", FakeClient)
+    monkeypatch.setattr(Research, "notify", lambda self, session=None: None)
+    question = {"question": "test_create_research_cache_hit"}
+    headers = {**auth_headers, "X-Research-Cache": "refresh"}
+
+    response = client.post(
+        url_for("api_v1.researches.post"), json=question, headers=headers
+    )
+    assert response.headers["X-Research-Cache"] == "REFRESH"
+
+    response = client.post(
+        url_for("api_v1.researches.post"), json=question, headers=auth_headers
+    )
+    assert response.headers["X-Research-Cache"] == "HIT"
+    assert response.json["data"]["answer"] == "cached"
+    assert len(calls) == 1
+
+
+def test_index_paginates(client, auth_headers, user, session):
+    for i in range(3):
+        research = Research(user_id=user.id, question=f"Q{i}", answer="A")
+        session.add(research)
+    session.commit()
+
+    url = url_for("api_v1.researches.index", username=user.username, limit=2)
+    response = client.get(url, headers=auth_headers)
+
+    assert [r["question"] for r in response.json["data"]] == ["Q2", "Q1"]
+
+    cursor = response.json["meta"]["next_cursor"]
+    response = client.get(
+        url_for(
+            "api_v1.researches.index",
+            username=user.username,
+            limit=2,
+            cursor=cursor,
+        ),
+        headers=auth_headers,
+    )
+
+    assert [r["question"] for r in response.json["data"]] == ["Q0"]
+    assert response.json["meta"]["next_cursor"] is None
+
+
+def test_index_invalid_cursor(client, auth_headers, user):
+    response = client.get(
+        url_for(
+            "api_v1.researches.index", username=user.username, cursor="nope"
+        ),
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 400
+
+
+def test_events_stream(app, client, auth_headers, user, monkeypatch):
+    monkeypatch.setitem(app.config, "NOTIFIER", "redis")
+    monkeypatch.setattr(research_views, "EVENTS_KEEPALIVE", 0.1)
+    monkeypatch.setattr(research_views, "EVENTS_MAX_AGE", 2)
+
+    response = client.get(
+        url_for("api_v1.researches.events"), headers=auth_headers
+    )
+    chunks = iter(response.response)
+
+    assert response.mimetype == "text/event-stream"
+    assert next(chunks).decode("utf-8") == SSE_KEEPALIVE
+
+    RedisNotifier(redis).send(
+        [
+            {
+                "channel": f"private-research-{user.id}",
+                "name": "new-research",
+                "data": {"id": 1},
+            }
+        ]
+    )
+
+    received = b"".join(chunk for chunk, _ in zip(chunks, range(50)))
+    assert b'event: new-research\ndata: {"id": 1}' in received
+    response.close()
+
+
+def test_events_need_redis_notifier(client, auth_headers):
+    response = client.get(
+        url_for("api_v1.researches.events"), headers=auth_headers
+    )
+
+    assert response.status_code == 404
+
+
+def test_search(client, auth_headers, user, session):
+    for question, answer in [
+        ("What is a goroutine?", "A lightweight thread managed by Go."),
+        ("Explain Postgres vacuum", "Vacuum reclaims storage of goroutine-"),
+        ("What is Redis?", "An in-memory data store."),
+    ]:
+        Research(user_id=user.id, question=question, answer=answer).save()
+
+    response = client.get(
+        url_for("api_v1.researches.search", q="goroutines", limit=1),
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    first = response.json["data"][0]
+    assert first["question"] == "What is a <mark>goroutine</mark>?"
+
+    response = client.get(
+        url_for(
+            "api_v1.researches.search",
+            q="goroutines",
+            cursor=response.json["meta"]["next_cursor"],
+        ),
+        headers=auth_headers,
+    )
+
+    assert [item["question"] for item in response.json["data"]] == [
+        "Explain Postgres vacuum"
+    ]
+    assert response.json["meta"]["next_cursor"] is None
+
+
+def test_search_escapes_html(client, auth_headers, user, session):
+    Research(
+        user_id=user.id,
+        question="Is <b>goroutine</b> markup \ue000safe?",
+        answer="A goroutine <script>alert(1)</script> runs concurrently.",
+    ).save()
+
+    response = client.get(
+        url_for("api_v1.researches.search", q="goroutine"),
+        headers=auth_headers,
+    )
+
+    result = response.json["data"][0]
+    assert result["question"] == (
+        "Is &lt;b&gt;<mark>goroutine</mark>&lt;/b&gt; markup safe?"
+    )
+    assert "<mark>goroutine</mark>" in result["answer"]
+    # Markup other than <mark> never comes back unescaped.
+    unmarked = re.sub("</?mark>", "", result["answer"])
+    assert "<" not in unmarked and ">" not in unmarked
+
+
+def test_search_needs_a_query(client, auth_headers):
+    response = client.get(
+        url_for("api_v1.researches.search", q=" "), headers=auth_headers
+    )
+
+    assert response.status_code == 400
+
+
+def test_bulk_delete(client, auth_headers, user, session, monkeypatch):
+    monkeypatch.setattr(
+        tasks.delete_researches, "delay", tasks.delete_researches.run
+    )
+
+    other = User(username="bulk_other", email="bulk_other@local.host")
+    other.save()
+    mine = [
+        Research(user_id=user.id, question=f"Delete {i}", answer="").save().id
+        for i in range(3)
+    ]
+    theirs = Research(user_id=other.id, question="Keep", answer="").save().id
+
+    response = client.post(
+        url_for("api_v1.researches.bulk_delete"),
+        json={"ids": mine + [theirs], "omit_ids": [mine[0]]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 202
+
+    progress = client.get(response.headers["Location"], headers=auth_headers)
+    assert progress.json["data"]["status"] == "completed"
+    assert progress.json["data"]["done"] == 2
+
+    remaining = Research.query.filter(Research.id.in_(mine + [theirs]))
+    assert {research.id for research in remaining} == {mine[0], theirs}
+
+    other.delete()
+
+
+def test_bulk_delete_search_results(
+    client, auth_headers, user, session, monkeypatch
+):
+    monkeypatch.setattr(
+        tasks.delete_researches, "delay", tasks.delete_researches.run
+    )
+
+    Research(user_id=user.id, question="Kubernetes pods", answer="").save()
+    Research(user_id=user.id, question="Redis streams", answer="").save()
+
+    response = client.post(
+        url_for("api_v1.researches.bulk_delete"),
+        json={"scope": "all_search_results", "q": "kubernetes"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 202
+    assert [r.question for r in Research.query.filter_by(user_id=user.id)] == [
+        "Redis streams"
+    ]
+
+    response = client.post(
+        url_for("api_v1.researches.bulk_delete"),
+        json={"scope": "all_search_results"},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 422
@@ -0,0 +1,71 @@
+import json
+
+from flask import url_for
+
+from ops.user.models import User
+
+
+def test_index(client, auth_headers, user):
+    response = client.get(url_for("api_v1.user.index"), headers=auth_headers)
+
+    assert response.status_code == 200
+
+    users = {item["username"]: item for item in response.json["data"]}
+    assert users[user.username]["created_on"] == user.created_on.isoformat()
+    assert users[user.username]["researches_posted"] == 0
+
+
+def test_index_paginates(client, auth_headers, session, user):
+    for i in range(2):
+        other = User(username=f"page_user{i}", email=f"page{i}@gmail.com")
+        other.password = other.encrypt_password("password101")
+        session.add(other)
+    session.commit()
+
+    seen = []
+    cursor = None
+
+    for _ in range(User.query.count()):
+        response = client.get(
+            url_for("api_v1.user.index", limit=1, cursor=cursor),
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 200
+        assert len(response.json["data"]) == 1
+
+        seen.append(response.json["data"][0]["username"])
+        cursor = response.json["meta"]["next_cursor"]
+
+    assert cursor is None
+    assert len(seen) >= 3
+    assert seen[:2] == ["page_user1", "page_user0"]
+    assert len(set(seen)) == len(seen)
+    # The keyset columns aren't part of the response.
+    assert set(response.json["data"][0]) == {
+        "created_on",
+        "username",
+        "researches_posted",
+    }
+
+
+def test_index_rejects_invalid_cursor(client, auth_headers):
+    response = client.get(
+        url_for("api_v1.user.index", cursor="nope"), headers=auth_headers
+    )
+
+    assert response.status_code == 400
+
+
+def test_index_streams_ndjson(client, auth_headers, user):
+    response = client.get(
+        url_for("api_v1.user.index"),
+        headers={**auth_headers, "Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert len(users) == User.query.count()
+    assert users[0]["username"] == user.username
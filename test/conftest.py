@@ -1,8 +1,12 @@
 import pytest
+import redis as redis_py
+from flask import url_for
 
 from config import settings
 from ops.app import create_app
 from ops.extensions import db as _db
+from ops.initializers import redis
+from ops.user.models import User
 
 
 @pytest.fixture(scope="session")
@@ -24,6 +28,7 @@ def app():
         "TESTING": True,
         "WTF_CSRF_ENABLED": False,
         "SQLALCHEMY_DATABASE_URI": db_uri,
+        "RATE_LIMIT_ENABLED": False,
     }
 
     _app = create_app(settings_override=params)
@@ -59,6 +64,10 @@ def db(app):
     _db.drop_all()
     _db.create_all()
 
+    # Ids start over, users cached by an earlier run are gone.
+    for key in redis.scan_iter("user:*"):
+        redis.delete(key)
+
     return _db
 
 
@@ -79,3 +88,41 @@ def session(db):
     yield db.session
 
     db.session.rollback()
+
+
+@pytest.fixture
+def user(session):
+    # First check if user exists and delete if it does
+    existing_user = (
+        session.query(User).filter_by(email="demo@gmail.com").first()
+    )
+    if existing_user:
+        existing_user.delete()
+
+    user = User(username="demo_user", email="demo@gmail.com")
+    user.password = user.encrypt_password("password101")
+    session.add(user)
+    session.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(client, user):
+    """Fixture to get authenticated headers"""
+    response = client.post(
+        url_for("api_v1.auth.post"),
+        json={"identity": user.username, "password": "password101"},
+    )
+    assert (
+        response.status_code == 200
+    ), f"Login failed with response: {response.json}"
+    token = response.json["data"]["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def unreachable_redis():
+    """A Redis client whose every command fails, to test Redis outages."""
+    return redis_py.Redis(
+        host="127.0.0.1", port=1, socket_connect_timeout=0.1, retry=None
+    )
@@ -1,6 +1,8 @@
 from flask import url_for
 
 from lib.test import ViewTestMixin
+from ops.research import cache
+from utils import openai as openai_utils
 
 
 class TestUp(ViewTestMixin):
@@ -15,3 +17,44 @@ class TestUp(ViewTestMixin):
         response = self.client.get(url_for("up.databases"))
 
         assert response.status_code == 200
+
+    def test_up_metrics_is_off_without_a_token(self, app, monkeypatch):
+        """Up metrics should not be served without a token configured."""
+        monkeypatch.setitem(app.config, "METRICS_TOKEN", "")
+        response = self.client.get(url_for("up.metrics"))
+
+        assert response.status_code == 404
+
+    def test_up_metrics_needs_the_token(self, app, monkeypatch):
+        """Up metrics should only be served with the right token."""
+        monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+
+        response = self.client.get(url_for("up.metrics"))
+        assert response.status_code == 401
+
+        response = self.client.get(
+            url_for("up.metrics"), headers={"Authorization": "Bearer nope"}
+        )
+        assert response.status_code == 401
+
+        response = self.client.get(
+            url_for("up.metrics"), headers={"Authorization": "Bearer s3cret"}
+        )
+        assert response.status_code == 200
+        assert "outbox" in response.json
+
+    def test_up_metrics_without_redis(
+        self, app, monkeypatch, unreachable_redis
+    ):
+        """Up metrics should still be served while Redis is down."""
+        monkeypatch.setitem(app.config, "METRICS_TOKEN", "s3cret")
+        monkeypatch.setattr(cache, "redis", unreachable_redis)
+        monkeypatch.setattr(openai_utils, "redis", unreachable_redis)
+
+        response = self.client.get(
+            url_for("up.metrics"), headers={"Authorization": "Bearer s3cret"}
+        )
+
+        assert response.status_code == 200
+        assert response.json["research_cache"] is None
+        assert response.json["azure_openai"]["circuit"]["state"] == "unknown"
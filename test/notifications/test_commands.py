@@ -0,0 +1,40 @@
+from sqlalchemy.exc import OperationalError
+
+from ops.notifications import commands
+
+
+class Stop(Exception):
+    pass
+
+
+def test_relay_survives_database_errors(app, monkeypatch):
+    batches = []
+    listeners = []
+    sleeps = []
+    listen = commands.listen
+
+    def relay_batch(batch_size, batch_deadline):
+        batches.append(batch_size)
+
+        if len(batches) == 1:
+            raise OperationalError("SELECT", {}, Exception("server closed"))
+
+        raise Stop()
+
+    def counted_listen():
+        listeners.append(listen())
+
+        return listeners[-1]
+
+    monkeypatch.setattr(commands, "relay_batch", relay_batch)
+    monkeypatch.setattr(commands, "listen", counted_listen)
+    monkeypatch.setattr(commands.time, "sleep", sleeps.append)
+
+    result = app.test_cli_runner().invoke(commands.relay, [])
+
+    assert isinstance(result.exception, Stop)
+    assert len(batches) == 2
+    assert sleeps == [1]
+    # The listening connection is replaced after a database error.
+    assert len(listeners) == 2
+    assert not listeners[0].is_valid
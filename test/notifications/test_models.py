@@ -0,0 +1,87 @@
+import pytest
+from pusher.errors import PusherBadStatus
+
+from lib.flask_pusher import PusherDispatcher
+from ops.extensions import db
+from ops.notifications import models
+from ops.notifications.models import Outbox
+from ops.research.models import Research
+
+
+class FakePusher(object):
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def trigger_batch(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise PusherBadStatus("503: unavailable")
+
+        self.batches.append(batch)
+
+        return {}
+
+
+@pytest.fixture
+def fake_pusher(session, monkeypatch):
+    fake_pusher = FakePusher()
+    monkeypatch.setattr(
+        models, "notifier", PusherDispatcher(fake_pusher, retry_attempts=1)
+    )
+
+    Outbox.query.delete()
+    db.session.commit()
+
+    return fake_pusher
+
+
+def test_relay_sends_batches(fake_pusher):
+    for i in range(25):
+        Outbox.add("private-research", "new-research", {"id": i})
+    db.session.commit()
+
+    assert Outbox.relay(batch_size=20) == 20
+    assert Outbox.relay(batch_size=20) == 5
+    assert Outbox.relay(batch_size=20) == 0
+
+    assert [len(batch) for batch in fake_pusher.batches] == [10, 10, 5]
+    assert fake_pusher.batches[0][0] == {
+        "channel": "private-research",
+        "name": "new-research",
+        "data": {"id": 0},
+    }
+
+
+def test_relay_keeps_events_pusher_did_not_accept(fake_pusher):
+    fake_pusher.failures = 1
+    Outbox.add("private-research", "new-research", {"id": 1})
+    db.session.commit()
+
+    with pytest.raises(PusherBadStatus):
+        Outbox.relay()
+
+    assert Outbox.stats()["depth"] == 1
+    assert Outbox.relay() == 1
+
+
+def test_relay_skips_locked_events(fake_pusher):
+    Outbox.add("private-research", "new-research", {"id": 1})
+    db.session.commit()
+
+    with db.engine.connect() as other_relay:
+        other_relay.execute(db.select(Outbox.id).with_for_update())
+
+        assert Outbox.relay() == 0
+
+    assert Outbox.relay() == 1
+
+
+def test_notify_does_not_wait_on_pusher(fake_pusher, user):
+    fake_pusher.failures = 100
+    research = Research(user_id=user.id, question="Is Pusher up?", answer="No")
+    research.notify()
+    research.save()
+
+    assert fake_pusher.batches == []
+    assert Outbox.stats()["depth"] == 1
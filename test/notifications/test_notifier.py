@@ -0,0 +1,76 @@
+import queue
+import threading
+
+from lib.notifier import RedisHub
+from lib.notifier import RedisNotifier
+from ops.initializers import redis
+
+
+def test_hub_fans_out_published_events(app):
+    hub = RedisHub(redis, prefix="test:notifications")
+    notifier = RedisNotifier(redis, prefix="test:notifications")
+
+    first = hub.subscribe("private-research-1")
+    second = hub.subscribe("private-research-1")
+    other = hub.subscribe("private-research-2")
+
+    notifier.send(
+        [
+            {
+                "channel": "private-research-1",
+                "name": "new-research",
+                "data": {"id": 1},
+            }
+        ]
+    )
+
+    expected = {"name": "new-research", "data": {"id": 1}}
+    assert first.get(timeout=2) == expected
+    assert second.get(timeout=2) == expected
+    assert other.empty()
+
+    hub.unsubscribe("private-research-1", first)
+    hub.unsubscribe("private-research-1", second)
+    hub.unsubscribe("private-research-2", other)
+
+    assert hub._queues == {}
+
+    # The subscription is dropped once nobody listens and comes back later.
+    again = hub.subscribe("private-research-1")
+    notifier.send(
+        [{"channel": "private-research-1", "name": "ping", "data": {}}]
+    )
+
+    try:
+        assert again.get(timeout=2)["name"] == "ping"
+    except queue.Empty:
+        raise AssertionError("Event was not received after resubscribing")
+    finally:
+        hub.unsubscribe("private-research-1", again)
+
+
+def test_hub_subscribes_from_many_threads(app):
+    hub = RedisHub(redis, prefix="test:notifications")
+    notifier = RedisNotifier(redis, prefix="test:notifications")
+    received = {}
+
+    def listen(i):
+        channel = f"private-research-{i % 4}"
+        events = hub.subscribe(channel)
+        notifier.send([{"channel": channel, "name": "ping", "data": {}}])
+
+        try:
+            received[i] = events.get(timeout=5)["name"]
+        finally:
+            hub.unsubscribe(channel, events)
+
+    threads = [threading.Thread(target=listen, args=(i,)) for i in range(20)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert received == {i: "ping" for i in range(20)}
+    assert hub._queues == {}
@@ -0,0 +1,58 @@
+import pytest
+from pusher.errors import PusherBadStatus
+
+from lib.flask_pusher import PusherDispatcher
+
+
+class FakePusher(object):
+    def __init__(self, failures=0, error=None):
+        self.batches = []
+        self.failures = failures
+        self.error = error or PusherBadStatus("503: unavailable")
+
+    def trigger_batch(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+
+        self.batches.append(batch)
+
+        return {}
+
+
+def events(count):
+    return [
+        {
+            "channel": "private-research",
+            "name": "new-research",
+            "data": {"id": i},
+        }
+        for i in range(count)
+    ]
+
+
+def test_send_batches():
+    dispatcher = PusherDispatcher(FakePusher(), retry_attempts=2)
+
+    assert dispatcher.send(events(25)) == 25
+    assert [len(batch) for batch in dispatcher.client.batches] == [10, 10, 5]
+    assert dispatcher.client.batches[0][0] == events(1)[0]
+
+
+def test_send_retries_then_raises():
+    dispatcher = PusherDispatcher(FakePusher(failures=1), retry_attempts=2)
+
+    assert dispatcher.send(events(1)) == 1
+
+    dispatcher.client.failures = 2
+
+    with pytest.raises(PusherBadStatus):
+        dispatcher.send(events(1))
+
+
+def test_send_drops_rejected_batches():
+    client = FakePusher(failures=1, error=ValueError("Too many events"))
+    dispatcher = PusherDispatcher(client, retry_attempts=2)
+
+    assert dispatcher.send(events(15)) == 5
+    assert [len(batch) for batch in client.batches] == [5]
@@ -0,0 +1,43 @@
+import pytest
+
+from ops.initializers import redis
+from ops.research.cache import AnswerCache
+
+
+@pytest.fixture
+def answer_cache(app):
+    answer_cache = AnswerCache(ttl=60, max_entries=2)
+
+    yield answer_cache
+
+    redis.delete(answer_cache.index_key)
+
+
+def test_key_normalizes_question():
+    key = AnswerCache.key("What  is\nRedis? ", "ctx", "gpt-4", top_p=0.95)
+
+    assert key == AnswerCache.key("what is redis?", "ctx", "gpt-4", top_p=0.95)
+    assert key != AnswerCache.key("what is redis?", "ctx", "gpt-4", top_p=0.5)
+
+
+def test_fetch_computes_once(answer_cache):
+    key = AnswerCache.key("test_fetch_computes_once", "ctx", "gpt-4")
+    answers = iter(["first", "second"])
+    redis.delete(key)
+
+    assert answer_cache.fetch(key, lambda: next(answers)) == "first"
+    assert answer_cache.fetch(key, lambda: next(answers)) == "first"
+    assert (
+        answer_cache.fetch(key, lambda: next(answers), "refresh") == "second"
+    )
+
+
+def test_set_evicts_least_recently_used(answer_cache):
+    keys = [AnswerCache.key(f"question {i}", "ctx", "gpt-4") for i in range(3)]
+
+    for key in keys:
+        answer_cache.set(key, "answer")
+
+    assert answer_cache.get(keys[0]) is None
+    assert answer_cache.get(keys[2]) == "answer"
+    assert answer_cache.stats()["entries"] == 2
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from bench.stub_openai import StubOpenAIHandler
+from bench.stub_openai import StubServer
+from lib.util_sqlalchemy import unit_of_work
+from ops.extensions import db
+from ops.notifications.models import Outbox
+from ops.research import models
+from ops.research.models import PREVIEW_LENGTH
+from ops.research.models import Research
+from utils.openai import AzureOpenAIClient
+
+
+def test_notify_sends_a_preview_to_the_owner(session, user):
+    research = Research(
+        user_id=user.id, question="What is Redis?", answer="Redis " * 100
+    )
+    research.notify()
+    research.save()
+
+    outbox = Outbox.query.filter_by(channel=f"private-research-{user.id}")
+    data = outbox.order_by(Outbox.id.desc()).first().data
+
+    assert data["id"] == research.id
+    assert data["question"] == "What is Redis?"
+    assert len(data["preview"]) == PREVIEW_LENGTH
+    assert data["preview"].endswith("…")
+    assert "answer" not in data
+
+
+def test_save_all_counts_in_one_flush(session, user):
+    researches = Research.save_all(
+        [
+            Research(user_id=user.id, question=f"Question {i}", answer="")
+            for i in range(3)
+        ]
+    )
+
+    assert all(research.id for research in researches)
+    session.refresh(user)
+    assert user.researches_posted == 3
+
+
+def test_bulk_insert_returns_ids_in_order(session, user):
+    ids = Research.bulk_insert(
+        [
+            {"user_id": user.id, "question": f"Question {i}", "answer": ""}
+            for i in range(5)
+        ]
+    )
+
+    questions = dict(
+        session.execute(
+            db.select(Research.id, Research.question).where(
+                Research.id.in_(ids)
+            )
+        ).all()
+    )
+    assert [questions[id] for id in ids] == [f"Question {i}" for i in range(5)]
+
+    session.refresh(user)
+    assert user.researches_posted == 5
+
+
+def test_unit_of_work_rolls_back(session, user):
+    with pytest.raises(RuntimeError):
+        with unit_of_work() as uow:
+            uow.add(Research(user_id=user.id, question="Gone", answer=""))
+            uow.flush()
+            raise RuntimeError
+
+    assert Research.query.filter_by(user_id=user.id).count() == 0
+
+
+def test_fetch_answers_concurrently(app, monkeypatch):
+    server = StubServer(StubOpenAIHandler, latency=0.2).start()
+    client = AzureOpenAIClient(endpoint=server.url, api_key="test")
+    monkeypatch.setattr(models, "get_client", lambda: client)
+    questions = [f"test_fetch_answers_concurrently {i}?" for i in range(4)]
+
+    start = time.monotonic()
+    answers = Research.fetch_answers(questions, 4, "bypass")
+    elapsed = time.monotonic() - start
+
+    assert len(answers) == 4 and all(answers)
+    assert elapsed < 0.6
+    server.shutdown()
@@ -0,0 +1,327 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+from openai import BadRequestError
+from openai import RateLimitError
+
+from bench.stub_openai import StubOpenAIHandler
+from bench.stub_openai import StubServer
+from lib import deadline
+from lib.admission import AdmissionControl
+from lib.admission import AdmissionRejected
+from lib.circuit_breaker import CircuitBreaker
+from lib.circuit_breaker import CircuitOpenError
+from ops.initializers import redis
+from utils import openai as openai_utils
+from utils.openai import AzureOpenAIClient
+from utils.openai import is_retryable
+from utils.openai import retry_after
+
+
+def api_error(error_class, status_code, headers=None):
+    request = httpx.Request("POST", "http://azure.local")
+    response = httpx.Response(status_code, headers=headers, request=request)
+
+    return error_class("Failed", response=response, body=None)
+
+
+@pytest.fixture
+def breaker():
+    breaker = CircuitBreaker(
+        redis, f"test:{time.time()}", failure_threshold=2, reset_timeout=0.2
+    )
+
+    yield breaker
+
+    redis.delete(breaker.open_key, breaker.probe_key, breaker.failures_key)
+
+
+@pytest.fixture
+def admission():
+    def create(**limits):
+        admission = AdmissionControl(redis, f"test:{time.time()}", **limits)
+        created.append(admission)
+
+        return admission
+
+    created = []
+
+    yield create
+
+    for admission in created:
+        redis.delete(
+            admission.slots_key,
+            admission.queue_key,
+            admission.bucket_key,
+            admission.stats_key,
+        )
+
+
+def fail(breaker, error=RuntimeError):
+    with pytest.raises(error):
+        with breaker.protect():
+            raise error()
+
+
+def test_breaker_opens_at_the_threshold(breaker):
+    fail(breaker)
+    with breaker.protect():
+        pass
+    assert breaker.state() == {"state": "closed", "failures": 1}
+
+    fail(breaker)
+    assert breaker.state()["state"] == "open"
+
+    with pytest.raises(CircuitOpenError) as error:
+        with breaker.protect():
+            pass
+    assert error.value.retry_after == 1
+
+
+def test_breaker_probes_when_half_open(breaker):
+    fail(breaker)
+    fail(breaker)
+    time.sleep(0.25)
+
+    # A failed probe opens the circuit again right away.
+    fail(breaker)
+    assert breaker.state()["state"] == "open"
+    time.sleep(0.25)
+
+    with breaker.protect():
+        # Everyone else fails fast while the probe is in flight.
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+
+    assert breaker.state() == {"state": "closed", "failures": 0}
+
+
+def test_breaker_ignores_errors_which_are_not_failures(breaker):
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            with breaker.protect(is_failure=lambda error: False):
+                raise ValueError()
+
+    assert breaker.state()["state"] == "closed"
+
+
+def test_breaker_state_without_redis(breaker, unreachable_redis):
+    breaker.client = unreachable_redis
+
+    assert breaker.state() == {"state": "unknown", "failures": None}
+
+
+def test_retryable_errors():
+    assert is_retryable(api_error(RateLimitError, 429))
+    assert is_retryable(api_error(openai_utils.APIStatusError, 503))
+    assert not is_retryable(api_error(BadRequestError, 400))
+    assert not is_retryable(ValueError())
+
+
+def test_retry_after():
+    error = api_error(RateLimitError, 429, {"retry-after": "2"})
+    assert retry_after(error) == 2
+
+    error = api_error(RateLimitError, 429, {"retry-after-ms": "1500"})
+    assert retry_after(error) == 1.5
+
+    date = "Wed, 21 Oct 2015 07:28:00 GMT"
+    error = api_error(RateLimitError, 429, {"retry-after": date})
+    assert retry_after(error) is None
+    assert retry_after(api_error(RateLimitError, 429)) is None
+
+
+def test_get_answer_retries_then_opens_the_circuit(monkeypatch):
+    monkeypatch.setattr(openai_utils, "backoff", lambda retry_state: 0)
+    server = StubServer(StubOpenAIHandler, error_rate=1).start()
+    deployment = f"test-{time.time()}"
+    client = AzureOpenAIClient(
+        endpoint=server.url, deployment=deployment, api_key="test"
+    )
+
+    assert client.get_answer("Question?", "Context") is None
+    assert server.stats["requests"] == 3
+
+    # The 5th failure opens the circuit, so the 6th attempt isn't sent.
+    with pytest.raises(CircuitOpenError):
+        client.get_answer("Question?", "Context")
+    assert server.stats["requests"] == 5
+
+    with pytest.raises(CircuitOpenError):
+        client.get_answer("Question?", "Context")
+    assert server.stats["requests"] == 5
+
+    server.shutdown()
+    redis.delete(client.breaker.open_key)
+
+
+@pytest.mark.parametrize("use_async", [False, True], ids=["sync", "async"])
+def test_get_answer_refunds_failed_attempts(monkeypatch, admission, use_async):
+    monkeypatch.setattr(openai_utils, "backoff", lambda retry_state: 0)
+    server = StubServer(StubOpenAIHandler, error_rate=1, error_status=429)
+    server.start()
+    client = AzureOpenAIClient(
+        endpoint=server.url, deployment=f"test-{time.time()}", api_key="test"
+    )
+    client.admission = admission(tokens_per_minute=60000)
+
+    if use_async:
+        assert asyncio.run(client.aget_answer("Question?", "Context")) is None
+    else:
+        assert client.get_answer("Question?", "Context") is None
+    assert server.stats["requests"] == 3
+
+    # Each retried 429 gave back the tokens it took.
+    tokens = float(redis.hget(client.admission.bucket_key, "tokens"))
+    assert tokens > 60000 - 100
+
+    server.shutdown()
+    redis.delete(client.breaker.failures_key)
+
+
+def test_async_client_is_closed_with_its_loop():
+    server = StubServer(StubOpenAIHandler).start()
+    client = AzureOpenAIClient(
+        endpoint=server.url, deployment=f"test-{time.time()}", api_key="test"
+    )
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+
+    async def ask(close=False):
+        assert await client.aget_answer("Question?", "Context")
+        async_client = client.async_client
+
+        if close:
+            await client.aclose()
+
+        return async_client
+
+    # Switching loops closes the previous loop's client on that loop.
+    first = asyncio.run_coroutine_threadsafe(ask(), other_loop).result()
+    second = asyncio.run(ask(close=True))
+
+    assert second.is_closed()
+    assert client.async_client is None
+
+    for _ in range(50):
+        if first.is_closed():
+            break
+
+        time.sleep(0.01)
+    assert first.is_closed()
+
+    other_loop.call_soon_threadsafe(other_loop.stop)
+    thread.join()
+    other_loop.close()
+    server.shutdown()
+
+
+def test_get_answer_does_not_retry_bad_requests():
+    server = StubServer(StubOpenAIHandler, error_rate=1, error_status=400)
+    server.start()
+    client = AzureOpenAIClient(
+        endpoint=server.url, deployment=f"test-{time.time()}", api_key="test"
+    )
+
+    assert client.get_answer("Question?", "Context") is None
+    assert server.stats["requests"] == 1
+    assert client.breaker.state()["failures"] == 0
+
+    server.shutdown()
+
+
+def test_get_answer_does_not_retry_past_the_deadline():
+    server = StubServer(StubOpenAIHandler, error_rate=1).start()
+    client = AzureOpenAIClient(
+        endpoint=server.url, deployment=f"test-{time.time()}", api_key="test"
+    )
+
+    # Backing off takes at least 4s, that retry would start too late.
+    start = time.monotonic()
+    with deadline.limit(3):
+        assert client.get_answer("Question?", "Context") is None
+    assert time.monotonic() - start < 1
+    assert server.stats["requests"] == 1
+
+    server.shutdown()
+    redis.delete(client.breaker.failures_key)
+
+
+def test_admission_limits_calls_in_flight(admission):
+    admission = admission(max_in_flight=1)
+
+    with admission.admit(1):
+        with pytest.raises(AdmissionRejected):
+            with admission.admit(1):
+                pass
+
+        assert admission.stats()["in_flight"] == 1
+
+    with admission.admit(1):
+        pass
+
+    stats = admission.stats()
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 2
+    assert stats["rejected"] == 1
+
+
+def test_admission_queues_calls(admission):
+    admission = admission(max_in_flight=1, max_queue_wait=2)
+    holding = threading.Event()
+
+    def hold_slot():
+        with admission.admit(1):
+            holding.set()
+            time.sleep(0.3)
+
+    thread = threading.Thread(target=hold_slot)
+    thread.start()
+    holding.wait()
+
+    with admission.admit(1):
+        pass
+
+    thread.join()
+    stats = admission.stats()
+    assert stats["queued"] == 1
+    assert stats["waiting"] == 0
+    assert stats["avg_queue_wait_ms"] > 100
+
+
+def test_admission_disabled_skips_redis(admission):
+    admission = admission()
+    # Without limits neither script may run.
+    admission._acquire = admission._release = None
+
+    with admission.admit(1):
+        pass
+
+
+def test_admission_stats_without_redis(admission, unreachable_redis):
+    admission = admission(max_in_flight=1)
+    admission.client = unreachable_redis
+
+    assert admission.stats() is None
+
+
+def test_admission_token_budget(admission):
+    admission = admission(tokens_per_minute=600)
+
+    with admission.admit(600) as lease:
+        lease.used_tokens = 100
+
+    # The 500 unused tokens went back to the budget.
+    with admission.admit(400):
+        pass
+
+    with pytest.raises(AdmissionRejected) as error:
+        with admission.admit(300):
+            pass
+
+    # Refilling 200 tokens at 10 tokens per second takes about 20 seconds.
+    assert 19 <= error.value.retry_after <= 21
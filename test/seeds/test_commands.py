@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import func
+
+from ops.extensions import db
+from ops.research.models import Research
+from ops.seeds.commands import synthetic
+from ops.seeds.synthetic import TextGenerator
+from ops.seeds.synthetic import chunks
+from ops.user.models import User
+
+
+def test_chunks():
+    assert chunks(10, 25, 10) == [(10, 10), (20, 10), (30, 5)]
+    assert chunks(0, 0, 10) == []
+
+
+def test_text_fits_columns():
+    generator = TextGenerator(seed=1)
+
+    for _ in range(1000):
+        question = generator.question()
+        answer = generator.answer()
+
+        assert question.endswith("?")
+        assert 0 < len(question) <= 2000
+        assert 0 < len(answer) <= 2000
+
+
+def test_synthetic(app, session):
+    last_id = session.scalar(db.select(func.max(User.id))) or 0
+
+    result = app.test_cli_runner().invoke(
+        synthetic,
+        [
+            "--users=20",
+            "--researches=300",
+            "--workers=1",
+            "--chunk-size=100",
+            "--password=secret",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+
+    users = session.scalars(db.select(User).where(User.id > last_id)).all()
+    assert len(users) == 20
+    assert sum(user.researches_posted for user in users) == 300
+    assert users[0].authenticated(password="secret")
+
+    research = session.scalars(
+        db.select(Research).where(Research.user_id == users[0].id)
+    ).first()
+    word = max(research.question.rstrip("?").split(), key=len)
+    results, _ = Research.search_page(word, users[0].id, 10)
+    assert results
+
+
+@pytest.mark.parametrize("option", ["--users=0", "--workers=0"])
+def test_synthetic_needs_users_and_workers(app, option):
+    result = app.test_cli_runner().invoke(synthetic, [option])
+
+    assert result.exit_code == 2
+    assert "x>=1" in result.output
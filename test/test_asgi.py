@@ -0,0 +1,164 @@
+import asyncio
+import contextvars
+import time
+
+import httpx
+import pytest
+from flask import url_for
+
+from bench.stub_openai import StubOpenAIHandler
+from bench.stub_openai import StubServer
+from lib.flask_asgi import FlaskASGI
+from ops.extensions import async_db
+from ops.extensions import db
+from ops.notifications.models import Outbox
+from ops.research.models import Research
+from ops.user.models import User
+from utils import openai as openai_utils
+from utils.openai import AzureOpenAIClient
+from utils.openai import aclose_client
+
+
+@pytest.fixture
+def asgi(app):
+    """
+    Send requests to the ASGI app. Each call runs in a new event loop,
+    outside of the tests' app context like requests of an ASGI server.
+    """
+
+    def send(method, path, times=1, **kwargs):
+        async def send_all():
+            transport = httpx.ASGITransport(app=FlaskASGI(app))
+
+            try:
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://localhost"
+                ) as client:
+                    return await asyncio.gather(
+                        *(
+                            client.request(method, path, **kwargs)
+                            for _ in range(times)
+                        )
+                    )
+            finally:
+                await async_db.dispose(app)
+                await aclose_client()
+
+        return contextvars.Context().run(asyncio.run, send_all())
+
+    return send
+
+
+def test_create_research(asgi, auth_headers, user, monkeypatch):
+    async def afetch_answer(cls, question, cache_mode="use", max_tokens=None):
+        return "42"
+
+    monkeypatch.setattr(Research, "afetch_answer", classmethod(afetch_answer))
+    researches_count = user.researches_count
+    path = url_for("api_v1.researches.post")
+
+    (response,) = asgi(
+        "POST", path, json={"question": "Async?"}, headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response.json()["data"]["answer"] == "42"
+
+    research = db.session.get(Research, response.json()["data"]["id"])
+    assert research.status == "completed"
+
+    # Saved with its event and counted, in the same transaction.
+    event = db.session.scalars(
+        db.select(Outbox.data).where(
+            Outbox.channel == Research.channel(user.id)
+        )
+    ).all()[-1]
+    assert event["id"] == research.id
+    assert db.session.scalar(
+        db.select(User.researches_count).where(User.id == user.id)
+    ) == (researches_count + 1)
+
+
+def test_create_research_batch(asgi, auth_headers, monkeypatch):
+    async def afetch_answers(cls, questions, *args):
+        return [
+            "42" if question == "Answered?" else None for question in questions
+        ]
+
+    monkeypatch.setattr(
+        Research, "afetch_answers", classmethod(afetch_answers)
+    )
+    path = url_for("api_v1.researches.batch")
+    body = {"questions": ["Answered?", "", "Unanswered?"]}
+
+    (response,) = asgi("POST", path, json=body, headers=auth_headers)
+
+    answered, invalid, unanswered = response.json()["data"]
+    assert response.status_code == 200
+    assert answered["research"]["answer"] == "42"
+    assert db.session.get(Research, answered["research"]["id"])
+    assert invalid["success"] is False
+    assert unanswered["success"] is False
+
+
+def test_create_research_requires_auth(asgi):
+    path = url_for("api_v1.researches.post")
+
+    (response,) = asgi("POST", path, json={"question": "Who am I?"})
+
+    assert response.status_code == 401
+
+
+def test_other_routes_run_the_wsgi_app(asgi, auth_headers, user):
+    path = url_for("api_v1.researches.index", username=user.username)
+
+    (response,) = asgi("GET", path, headers=auth_headers)
+
+    assert response.status_code == 200
+    assert "data" in response.json()
+
+
+def test_waits_on_azure_openai_concurrently(
+    app, asgi, auth_headers, monkeypatch
+):
+    server = StubServer(StubOpenAIHandler, latency=0.5).start()
+    client = AzureOpenAIClient(endpoint=server.url, api_key="test")
+    monkeypatch.setattr(openai_utils, "_client", client)
+    path = url_for("api_v1.researches.post")
+    headers = {**auth_headers, "X-Research-Cache": "bypass"}
+
+    start = time.monotonic()
+    responses = asgi(
+        "POST", path, times=40, json={"question": "Async?"}, headers=headers
+    )
+    elapsed = time.monotonic() - start
+
+    assert [response.status_code for response in responses] == [200] * 40
+    # 1 worker, 40 answers which take 0.5s each.
+    assert elapsed < 4
+    assert server.stats["requests"] == 40
+    server.shutdown()
+
+
+def test_cancelled_at_the_deadline(app, asgi, auth_headers, monkeypatch):
+    server = StubServer(StubOpenAIHandler, latency=2).start()
+    client = AzureOpenAIClient(
+        endpoint=server.url, deployment=f"test-{time.time()}", api_key="test"
+    )
+    monkeypatch.setattr(openai_utils, "_client", client)
+    path = url_for("api_v1.researches.post")
+    headers = {
+        **auth_headers,
+        "X-Research-Cache": "bypass",
+        "X-Request-Deadline": "0.5",
+    }
+
+    start = time.monotonic()
+    (response,) = asgi(
+        "POST", path, json={"question": "Slow?"}, headers=headers
+    )
+
+    assert response.status_code == 504
+    assert time.monotonic() - start < 1.5
+    assert client.breaker.state()["failures"] == 0
+    server.shutdown()
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+from flask import url_for
+
+from bench.stub_openai import StubOpenAIHandler
+from bench.stub_openai import StubServer
+from lib import deadline
+from lib.deadline import DeadlineExceeded
+from ops.research import models
+from ops.research.models import Research
+from utils.openai import AzureOpenAIClient
+
+
+def test_limit_keeps_the_earliest_deadline():
+    assert deadline.remaining() is None
+
+    with deadline.limit(10):
+        with deadline.limit(60):
+            assert deadline.remaining() <= 10
+
+        with deadline.limit(1):
+            assert deadline.remaining() <= 1
+            assert deadline.timeout(5) <= 1
+
+        assert 1 < deadline.remaining() <= 10
+
+    assert deadline.remaining() is None
+    assert deadline.timeout(5) == 5
+
+
+def test_statements_are_cancelled_at_the_deadline(db):
+    start = time.monotonic()
+
+    with pytest.raises(DeadlineExceeded):
+        with deadline.limit(0.2):
+            db.session.execute(db.select(db.func.pg_sleep(2)))
+
+    db.session.rollback()
+    assert time.monotonic() - start < 1
+
+    # Transactions without a deadline have no statement timeout.
+    assert db.session.scalar(db.text("SHOW statement_timeout")) == "0"
+    db.session.rollback()
+
+
+def test_transactions_do_not_begin_after_the_deadline(db):
+    with pytest.raises(DeadlineExceeded):
+        with deadline.limit(0):
+            db.session.execute(db.select(1))
+
+    db.session.rollback()
+
+
+def test_expired_deadline_is_a_504(client, auth_headers):
+    response = client.post(
+        url_for("api_v1.researches.post"),
+        json={"question": "Too late?"},
+        headers={**auth_headers, "X-Request-Deadline": "0"},
+    )
+
+    assert response.status_code == 504
+    assert "deadline" in response.json["error"]["message"]
+
+
+@pytest.mark.parametrize(
+    "request_deadline, header",
+    [(100, "0.5"), (0.5, "60"), (0.5, "soon")],
+    ids=["header", "setting", "invalid_header"],
+)
+def test_research_is_cut_short_at_the_deadline(
+    app, client, auth_headers, monkeypatch, request_deadline, header
+):
+    server = StubServer(StubOpenAIHandler, latency=2).start()
+    openai_client = AzureOpenAIClient(
+        endpoint=server.url, deployment=f"test-{time.time()}", api_key="test"
+    )
+    monkeypatch.setattr(models, "get_client", lambda: openai_client)
+    monkeypatch.setitem(app.config, "REQUEST_DEADLINE", request_deadline)
+    researches_count = Research.query.count()
+
+    start = time.monotonic()
+    response = client.post(
+        url_for("api_v1.researches.post"),
+        json={"question": "Slow?"},
+        headers={
+            **auth_headers,
+            "X-Request-Deadline": header,
+            "X-Research-Cache": "bypass",
+        },
+    )
+
+    # A header can only shorten the deadline.
+    assert response.status_code == 504
+    assert time.monotonic() - start < 1.5
+    assert Research.query.count() == researches_count
+    # Giving up on time isn't Azure OpenAI failing.
+    assert openai_client.breaker.state()["failures"] == 0
+    server.shutdown()
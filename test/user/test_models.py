@@ -0,0 +1,165 @@
+from lib import util_cache
+from lib.util_jobs import JobProgress
+from ops.extensions import db
+from ops.research.models import Research
+from ops.user.commands import reconcile_counts
+from ops.user.models import User
+from ops.user.models import missing_user_cache
+from ops.user.models import user_cache
+from ops.user.tasks import delete_users
+
+
+def test_find_by_jwt_identity_is_cached(session, user):
+    user_cache.delete(user.username)
+
+    assert User.find_by_jwt_identity(user.username).id == user.id
+    cached = user_cache.get(user.username)
+    assert cached["id"] == user.id
+    assert "password" not in cached
+
+    session.expunge_all()
+    found = User.find_by_jwt_identity(user.username)
+
+    assert found.id == user.id
+    assert found.created_on == user.created_on
+    assert found.authenticated(password="password101")
+
+
+def test_find_by_jwt_identity_without_redis(
+    session, user, unreachable_redis, monkeypatch
+):
+    monkeypatch.setattr(util_cache, "_redis", unreachable_redis)
+    user_cache.local.clear()
+
+    assert User.find_by_jwt_identity(user.username).id == user.id
+    assert User.find_by_jwt_identity("nobody_at_all") is None
+
+
+def test_save_without_redis(session, unreachable_redis, monkeypatch):
+    User.query.filter(User.username.like("offline_%")).delete()
+    monkeypatch.setattr(util_cache, "_redis", unreachable_redis)
+
+    user = User(username="offline_user", email="offline_user@local.host")
+    user.save()
+    user.email = "offline_renamed@local.host"
+    user.save()
+    User.save_all([User(username="offline_all", email="offline@local.host")])
+
+    assert User.find_by_identity("offline_renamed@local.host").id == user.id
+    assert User.find_by_identity("offline_all") is not None
+
+
+def test_save_invalidates_old_username(session, user):
+    User.find_by_jwt_identity(user.username)
+
+    user.username = "demo_renamed"
+    user.save()
+
+    assert user_cache.get("demo_user") is None
+    assert User.find_by_jwt_identity("demo_user") is None
+
+    user.username = "demo_user"
+    user.save()
+
+
+def test_bulk_delete_invalidates(session):
+    user = User(username="bulk_cached", email="bulk_cached@local.host")
+    user.save()
+    User.find_by_jwt_identity(user.username)
+
+    assert User.bulk_delete([user.id]) == 1
+    assert User.find_by_jwt_identity("bulk_cached") is None
+
+
+def test_find_by_identity_ignores_case(session, user):
+    assert User.find_by_identity("DEMO_User").id == user.id
+    assert User.find_by_identity("Demo@Gmail.com").id == user.id
+
+
+def test_find_by_identity_remembers_unknown_identities(session):
+    User.query.filter_by(username="ghost_user").delete()
+    missing_user_cache.delete("ghost_user")
+
+    assert User.find_by_identity("Ghost_User") is None
+    assert missing_user_cache.get("ghost_user")
+
+    user = User(username="ghost_user", email="ghost_user@local.host")
+    user.save()
+
+    assert User.find_by_identity("ghost_user").id == user.id
+    user.delete()
+
+
+def test_bulk_insert_forgets_unknown_identities(session):
+    User.query.filter_by(username="ghost_bulk").delete()
+    missing_user_cache.delete("ghost_bulk")
+
+    assert User.find_by_identity("ghost_bulk") is None
+
+    User.bulk_insert([{"username": "ghost_bulk", "email": "ghost_bulk@x.io"}])
+
+    assert User.find_by_identity("Ghost_Bulk").username == "ghost_bulk"
+
+
+def test_session_commit_forgets_unknown_identities(session):
+    User.query.filter_by(email="ghost_all@x.io").delete()
+    missing_user_cache.delete("ghost_all@x.io")
+
+    assert User.find_by_identity("ghost_all@x.io") is None
+
+    User.save_all([User(username="ghost_all", email="ghost_all@x.io")])
+
+    assert User.find_by_identity("ghost_all@x.io").username == "ghost_all"
+
+
+def test_researches_count_follows_inserts_and_deletes(session, user):
+    researches = [
+        Research(user_id=user.id, question=f"Question {i}", answer="Answer")
+        for i in range(3)
+    ]
+
+    for research in researches:
+        research.save()
+
+    session.refresh(user)
+    assert user.researches_posted == 3
+
+    researches[0].delete()
+    Research.bulk_delete([researches[1].id, researches[2].id])
+
+    session.refresh(user)
+    assert user.researches_posted == 0
+
+
+def test_reconcile_counts(app, session, user):
+    db.session.execute(
+        Research.__table__.insert(),
+        [{"user_id": user.id, "question": "Untracked", "answer": ""}],
+    )
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(reconcile_counts)
+
+    assert "Fixed the researches count of 1 user(s)" in result.output
+    session.refresh(user)
+    assert user.researches_posted == 1
+
+
+def test_search(session, user):
+    assert User.query.filter(User.search("DEMO@gmail")).all() == [user]
+    assert User.query.filter(User.search("nobody_has_this")).all() == []
+
+
+def test_delete_users_job(session):
+    user_id = User(username="job_deleted", email="job_deleted@local.host")
+    user_id = user_id.save().id
+
+    for i in range(5):
+        Research(user_id=user_id, question=f"Question {i}", answer="").save()
+
+    job = JobProgress.start("user:bulk_delete", "test")
+
+    assert delete_users.run(job.job_id, [user_id], chunk_size=2) == 1
+    assert job.to_dict()["status"] == "completed"
+    assert User.find_by_identity("job_deleted") is None
+    assert Research.query.filter_by(user_id=user_id).count() == 0
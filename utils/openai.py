@@ -1,15 +1,49 @@
+import asyncio
+import importlib.util
+import logging
 import os
+import threading
 from typing import Dict
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Union
 
+import httpx
+from openai import NOT_GIVEN
+from openai import APIConnectionError
+from openai import APIStatusError
+from openai import APITimeoutError
+from openai import AsyncAzureOpenAI
 from openai import AzureOpenAI
+from openai import NotGiven
+from openai import OpenAIError
+from openai import Stream
 from openai.types.chat import ChatCompletion
-from tenacity import retry
+from openai.types.chat import ChatCompletionChunk
+from tenacity import AsyncRetrying
+from tenacity import RetryCallState
+from tenacity import Retrying
+from tenacity import retry_if_exception
 from tenacity import stop_after_attempt
 from tenacity import wait_exponential
 
+from config import settings
+from lib import deadline
+from lib.admission import AdmissionControl
+from lib.circuit_breaker import CircuitBreaker
+from ops.initializers import redis
+
+log = logging.getLogger(__name__)
+
+API_VERSION = "2024-05-01-preview"
+
+# Throttling, server errors and timeouts are worth retrying, anything else
+# (a bad request, a wrong API key, etc.) fails no matter how often it's sent.
+RETRYABLE_STATUS_CODES = (408, 429)
+
+backoff = wait_exponential(multiplier=1, min=4, max=10)
+
 
 class AzureOpenAIClient:
     """A client for interacting with Azure OpenAI services."""
@@ -19,6 +53,7 @@ class AzureOpenAIClient:
         endpoint: Optional[str] = None,
         deployment: Optional[str] = None,
         api_key: Optional[str] = None,
+        http_client: Optional[httpx.Client] = None,
     ):
         """
         Initialize the Azure OpenAI client.
@@ -27,6 +62,8 @@ class AzureOpenAIClient:
             endpoint: Azure OpenAI endpoint URL. Defaults to env variable.
             deployment: Model deployment name. Defaults to env variable.
             api_key: Azure OpenAI API key. Defaults to environment variable.
+            http_client: HTTP client (and connection pool) to send requests
+                with. Defaults to a new one from create_http_client().
         """
         self.endpoint = endpoint or os.getenv("AZURE_OPENAI_ENDPOINT")
         self.deployment = deployment or os.getenv("DEPLOYMENT_NAME", "gpt-4")
@@ -35,17 +72,21 @@ class AzureOpenAIClient:
         if not self.api_key:
             raise ValueError("Azure OpenAI API key must be provided")
 
+        # Retries are up to this class, so they can use the circuit breaker.
         self.client = AzureOpenAI(
             azure_endpoint=self.endpoint,
             api_key=self.api_key,
-            api_version="2024-05-01-preview",
+            api_version=API_VERSION,
+            http_client=http_client or create_http_client(),
+            max_retries=0,
         )
+        self.breaker = create_breaker(self.deployment)
+        self.admission = create_admission(self.deployment)
+
+        # Created for (and bound to) the event loop of async callers.
+        self.async_client: Optional[AsyncAzureOpenAI] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry_error_callback=lambda retry_state: None,
-    )
     def get_answer(
         self,
         question: str,
@@ -57,7 +98,7 @@ class AzureOpenAIClient:
         presence_penalty: float = 0,
         stop: Optional[Union[str, List[str]]] = None,
         stream: bool = False,
-    ) -> Optional[Dict]:
+    ) -> Optional[Union[Dict, Stream[ChatCompletionChunk]]]:
         """
         Get an answer from the Azure OpenAI service.
 
@@ -73,29 +114,318 @@ class AzureOpenAIClient:
             stream: Whether to stream the response
 
         Returns:
-            Completion response as a dictionary, or None if the request fails
+            Completion response as a dictionary (or the raw chunk stream when
+            stream is True), or None if the request fails after retries
 
         Raises:
-            openai.APIError: If the API request fails after retries
+            CircuitOpenError: If Azure OpenAI is failing and isn't called
+            AdmissionRejected: If the deployment is at capacity
+            DeadlineExceeded: If the request's deadline passed
         """
+        cost = estimate_tokens(question, context, max_tokens)
+        deadline.check()
+
         try:
-            completion: ChatCompletion = self.client.chat.completions.create(
-                model=self.deployment,
-                messages=self._prepare_chat(question, context),
-                max_tokens=max_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                frequency_penalty=frequency_penalty,
-                presence_penalty=presence_penalty,
-                stop=stop,
-                stream=stream,
+            for attempt in Retrying(**retry_policy()):
+                # Streams hold their slot until their response starts.
+                with self.admission.admit(cost, deadline.remaining()) as lease:
+                    with attempt, self.breaker.protect(is_failure):
+                        # Failed attempts get their whole cost refunded.
+                        lease.used_tokens = 0
+                        completion = self.client.chat.completions.create(
+                            model=self.deployment,
+                            messages=self._prepare_chat(question, context),
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                            top_p=top_p,
+                            frequency_penalty=frequency_penalty,
+                            presence_penalty=presence_penalty,
+                            stop=stop,
+                            stream=stream,
+                            timeout=request_timeout(),
+                        )
+                        lease.used_tokens = used_tokens(completion)
+        except OpenAIError as e:
+            if deadline.expired():
+                raise deadline.DeadlineExceeded() from e
+
+            log.warning("Error getting completion: %s", e)
+            return None
+
+        if stream:
+            return completion
+
+        return completion.model_dump()
+
+    def get_answers(
+        self,
+        questions: List[str],
+        context: str,
+        concurrency: int = 5,
+        **kwargs,
+    ) -> List[Optional[Dict]]:
+        """
+        Get answers to several questions at once, with at most concurrency
+        requests in flight, so it takes about as long as the slowest answer.
+
+        Args:
+            questions: The user's questions
+            context: The system context/prompt
+            concurrency: Maximum number of requests sent at the same time
+            **kwargs: Any other get_answer() sampling parameter
+
+        Returns:
+            A completion response (or None if its request failed) for each
+            question, in the same order as the questions
+        """
+        if len(questions) == 1:
+            # No need for an event loop (and its connection pool) for 1.
+            return [self.get_answer(questions[0], context, **kwargs)]
+
+        return asyncio.run(
+            self._get_answers(questions, context, concurrency, **kwargs)
+        )
+
+    async def aget_answer(
+        self, question: str, context: str, **kwargs
+    ) -> Optional[Dict]:
+        """
+        The async version of get_answer(), without streaming, for callers
+        already running on an event loop such as async views.
+
+        Args:
+            question: The user's question
+            context: The system context/prompt
+            **kwargs: Any other get_answer() sampling parameter
+
+        Returns:
+            Completion response as a dictionary, or None if the request fails
+            after retries
+
+        Raises:
+            CircuitOpenError: If Azure OpenAI is failing and isn't called
+            AdmissionRejected: If the deployment is at capacity
+            DeadlineExceeded: If the request's deadline passed
+        """
+        return await self._aget_answer(
+            self._get_async_client(), question, context, **kwargs
+        )
+
+    async def aget_answers(
+        self,
+        questions: List[str],
+        context: str,
+        concurrency: int = 5,
+        **kwargs,
+    ) -> List[Optional[Dict]]:
+        """
+        The async version of get_answers(), for callers already running on an
+        event loop such as async views.
+
+        Args:
+            questions: The user's questions
+            context: The system context/prompt
+            concurrency: Maximum number of requests sent at the same time
+            **kwargs: Any other get_answer() sampling parameter
+
+        Returns:
+            A completion response (or None if its request failed) for each
+            question, in the same order as the questions
+        """
+        return await self._gather_answers(
+            self._get_async_client(), questions, context, concurrency, **kwargs
+        )
+
+    async def _get_answers(
+        self, questions: List[str], context: str, concurrency: int, **kwargs
+    ) -> List[Optional[Dict]]:
+        """
+        Send every question with an async client on the current event loop.
+
+        Async connections can't outlive their event loop, so each batch gets
+        its own client and connection pool.
+        """
+        async with self._create_async_client() as client:
+            return await self._gather_answers(
+                client, questions, context, concurrency, **kwargs
             )
-            return completion.model_dump()
 
-        except Exception as e:
-            print(f"Error getting completion: {str(e)}")
+    async def _gather_answers(
+        self,
+        client: AsyncAzureOpenAI,
+        questions: List[str],
+        context: str,
+        concurrency: int,
+        **kwargs,
+    ) -> List[Optional[Dict]]:
+        """
+        Send every question with at most concurrency requests in flight.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def answer(question: str) -> Optional[Dict]:
+            async with semaphore:
+                return await self._aget_answer(
+                    client, question, context, **kwargs
+                )
+
+        return await asyncio.gather(
+            *(answer(question) for question in questions)
+        )
+
+    def _get_async_client(self) -> AsyncAzureOpenAI:
+        """
+        Get the async client of the running event loop, creating it on first
+        use. An ASGI worker runs 1 loop for its lifetime so its connections
+        stay warm, like the sync client's.
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._async_loop is not loop:
+            self._close_async_client()
+            self.async_client = self._create_async_client()
+            self._async_loop = loop
+
+        return self.async_client
+
+    async def aclose(self) -> None:
+        """
+        Close the async client of the running event loop and its connections.
+        They can only be closed on the loop they were used on, so whoever runs
+        the loop calls this before stopping it (an ASGI lifespan shutdown).
+
+        Returns:
+            None
+        """
+        if self._async_loop is asyncio.get_running_loop():
+            client = self.async_client
+            self.async_client = self._async_loop = None
+            await client.close()
+
+        return None
+
+    def _close_async_client(self) -> None:
+        """
+        Close the async client of a previous event loop on that loop. A loop
+        which was closed without aclose() can't run it anymore, its sockets
+        are only released once the client is garbage collected.
+        """
+        client, loop = self.async_client, self._async_loop
+        self.async_client = self._async_loop = None
+
+        if client is None or loop.is_closed():
+            return None
+
+        asyncio.run_coroutine_threadsafe(client.close(), loop)
+
+        return None
+
+    def _create_async_client(self) -> AsyncAzureOpenAI:
+        """
+        Create an async client with its own connection pool.
+        """
+        return AsyncAzureOpenAI(
+            azure_endpoint=self.endpoint,
+            api_key=self.api_key,
+            api_version=API_VERSION,
+            http_client=create_async_http_client(),
+            max_retries=0,
+        )
+
+    async def _aget_answer(
+        self,
+        client: AsyncAzureOpenAI,
+        question: str,
+        context: str,
+        max_tokens: int = 800,
+        temperature: float = 0.7,
+        top_p: float = 0.95,
+        frequency_penalty: float = 0,
+        presence_penalty: float = 0,
+        stop: Optional[Union[str, List[str]]] = None,
+    ) -> Optional[Dict]:
+        """
+        The async version of get_answer(), without streaming.
+        """
+        cost = estimate_tokens(question, context, max_tokens)
+        deadline.check()
+
+        try:
+            async for attempt in AsyncRetrying(**retry_policy()):
+                async with self.admission.admit_async(
+                    cost, deadline.remaining()
+                ) as lease:
+                    with attempt:
+                        async with self.breaker.protect_async(is_failure):
+                            # Failed attempts get their whole cost refunded.
+                            lease.used_tokens = 0
+                            completion: ChatCompletion = (
+                                await client.chat.completions.create(
+                                    model=self.deployment,
+                                    messages=self._prepare_chat(
+                                        question, context
+                                    ),
+                                    max_tokens=max_tokens,
+                                    temperature=temperature,
+                                    top_p=top_p,
+                                    frequency_penalty=frequency_penalty,
+                                    presence_penalty=presence_penalty,
+                                    stop=stop,
+                                    timeout=request_timeout(),
+                                )
+                            )
+                            lease.used_tokens = used_tokens(completion)
+        except OpenAIError as e:
+            if deadline.expired():
+                raise deadline.DeadlineExceeded() from e
+
+            log.warning("Error getting completion: %s", e)
+            return None
+
+        return completion.model_dump()
+
+    def stream_answer(
+        self, question: str, context: str, **kwargs
+    ) -> Optional[Iterator[str]]:
+        """
+        Stream an answer from the Azure OpenAI service as it is generated.
+
+        Args:
+            question: The user's question
+            context: The system context/prompt
+            **kwargs: Any other get_answer() sampling parameter
+
+        Returns:
+            An iterator of answer text deltas, or None if the request fails
+        """
+        completion = self.get_answer(question, context, stream=True, **kwargs)
+
+        if completion is None:
             return None
 
+        return self._iter_deltas(completion)
+
+    @staticmethod
+    def _iter_deltas(completion: Stream[ChatCompletionChunk]) -> Iterator[str]:
+        """
+        Extract the text deltas from a stream of completion chunks.
+
+        Args:
+            completion: Chunk stream returned by the chat completions API
+
+        Returns:
+            An iterator of non-empty text deltas
+        """
+        with completion:
+            for chunk in completion:
+                # Azure sends content filter results in chunks without choices.
+                if not chunk.choices:
+                    continue
+
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
     @staticmethod
     def _prepare_chat(
         question: str, context: str
@@ -114,3 +444,349 @@ class AzureOpenAIClient:
             {"role": "system", "content": [{"type": "text", "text": context}]},
             {"role": "user", "content": [{"type": "text", "text": question}]},
         ]
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Check whether a failed request is worth retrying. These errors are also
+    the ones counting towards opening the circuit breaker.
+
+    Args:
+        error: Exception raised by the openai client
+
+    Returns:
+        True for throttling, server errors, timeouts and connection errors
+    """
+    if isinstance(error, APIConnectionError):
+        return True
+
+    if isinstance(error, APIStatusError):
+        return (
+            error.status_code in RETRYABLE_STATUS_CODES
+            or error.status_code >= 500
+        )
+
+    return False
+
+
+def is_failure(error: BaseException) -> bool:
+    """
+    Check whether a failed request counts towards opening the circuit
+    breaker. Timeouts cut short by the request's deadline aren't Azure
+    OpenAI's fault.
+
+    Args:
+        error: Exception raised by the openai client
+
+    Returns:
+        True for retryable errors, except timeouts past the deadline
+    """
+    if isinstance(error, APITimeoutError) and deadline.expired():
+        return False
+
+    return is_retryable(error)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Read how long Azure OpenAI asked to wait before retrying.
+
+    Args:
+        error: Exception raised by the openai client
+
+    Returns:
+        Seconds to wait, or None if the response didn't say
+    """
+    if not isinstance(error, APIStatusError):
+        return None
+
+    headers = error.response.headers
+
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        # Retry-After can also be an HTTP date, back off as usual instead.
+        pass
+
+    return None
+
+
+def wait_for_retry(retry_state: RetryCallState) -> float:
+    """
+    Wait as long as Retry-After asks (up to a limit), or back off
+    exponentially when it's not set.
+
+    Args:
+        retry_state: Tenacity's state of the failed attempt
+
+    Returns:
+        Seconds to wait before the next attempt
+    """
+    delay = retry_after(retry_state.outcome.exception())
+
+    if delay is None:
+        return backoff(retry_state)
+
+    return min(delay, settings.AZURE_OPENAI_MAX_RETRY_WAIT)
+
+
+def retry_policy() -> Dict:
+    """
+    Build the Retrying (and AsyncRetrying) arguments of Azure OpenAI calls.
+    Retries which would start after the request's deadline aren't made.
+
+    Returns:
+        A dict of tenacity arguments
+    """
+    return {
+        "retry": retry_if_exception(is_retryable),
+        "wait": wait_for_retry,
+        "stop": stop_after_attempt(settings.AZURE_OPENAI_RETRY_ATTEMPTS)
+        | deadline.stop_at_deadline(wait_for_retry),
+        "reraise": True,
+    }
+
+
+def request_timeout() -> Union[httpx.Timeout, NotGiven]:
+    """
+    Shorten the HTTP client's timeouts so a request ends by the deadline.
+
+    Returns:
+        An httpx timeout, or NOT_GIVEN to keep the client's without one
+    """
+    if deadline.remaining() is None:
+        return NOT_GIVEN
+
+    return httpx.Timeout(
+        deadline.timeout(settings.AZURE_OPENAI_READ_TIMEOUT),
+        connect=deadline.timeout(settings.AZURE_OPENAI_CONNECT_TIMEOUT),
+    )
+
+
+def estimate_tokens(question: str, context: str, max_tokens: int) -> int:
+    """
+    Estimate how many tokens a request uses at most, before sending it.
+
+    Args:
+        question: The user's question
+        context: The system context/prompt
+        max_tokens: Maximum number of tokens in the response
+
+    Returns:
+        Prompt tokens (about 4 characters each) plus max_tokens
+    """
+    return (len(question) + len(context)) // 4 + max_tokens
+
+
+def used_tokens(completion: Union[ChatCompletion, Stream]) -> Optional[int]:
+    """
+    Read how many tokens a completion used, streams don't say.
+
+    Args:
+        completion: Chat completion or chunk stream
+
+    Returns:
+        Total tokens or None if unknown
+    """
+    usage = getattr(completion, "usage", None)
+
+    return usage.total_tokens if usage else None
+
+
+def deployment_limits(deployment: str) -> Dict:
+    """
+    Look up the admission limits of a deployment.
+
+    Args:
+        deployment: Model deployment name
+
+    Returns:
+        A dict with max_in_flight, tokens_per_minute and max_queue_wait
+    """
+    limits = {
+        "max_in_flight": settings.AZURE_OPENAI_MAX_IN_FLIGHT,
+        "tokens_per_minute": settings.AZURE_OPENAI_TOKENS_PER_MINUTE,
+        "max_queue_wait": settings.AZURE_OPENAI_MAX_QUEUE_WAIT,
+    }
+
+    return {
+        **limits,
+        **settings.AZURE_OPENAI_DEPLOYMENT_LIMITS.get(deployment, {}),
+    }
+
+
+def create_admission(deployment: str) -> AdmissionControl:
+    """
+    Create the admission control of a deployment, shared by every process.
+
+    Args:
+        deployment: Model deployment name
+
+    Returns:
+        An AdmissionControl instance
+    """
+    return AdmissionControl(
+        redis, f"azure-openai:{deployment}", **deployment_limits(deployment)
+    )
+
+
+def deployment_metrics(deployment: Optional[str] = None) -> Dict:
+    """
+    Report a deployment's admission gauges and circuit breaker state.
+
+    Args:
+        deployment: Model deployment name. Defaults to env variable.
+
+    Returns:
+        A dict of metrics
+    """
+    deployment = deployment or os.getenv("DEPLOYMENT_NAME", "gpt-4")
+
+    return {
+        "deployment": deployment,
+        "admission": create_admission(deployment).stats(),
+        "circuit": create_breaker(deployment).state(),
+    }
+
+
+def create_breaker(deployment: str) -> CircuitBreaker:
+    """
+    Create the circuit breaker of a deployment, shared by every process.
+
+    Args:
+        deployment: Model deployment name
+
+    Returns:
+        A CircuitBreaker instance
+    """
+    return CircuitBreaker(
+        redis,
+        f"azure-openai:{deployment}",
+        failure_threshold=settings.AZURE_OPENAI_BREAKER_FAILURES,
+        window=settings.AZURE_OPENAI_BREAKER_WINDOW,
+        reset_timeout=settings.AZURE_OPENAI_BREAKER_RESET_TIMEOUT,
+        slow_call_seconds=settings.AZURE_OPENAI_BREAKER_SLOW_CALL,
+    )
+
+
+def create_http_client(**kwargs) -> httpx.Client:
+    """
+    Create an HTTP client with a keep-alive connection pool and explicit
+    timeouts for talking to Azure OpenAI.
+
+    Args:
+        **kwargs: Any other httpx.Client argument, such as verify
+
+    Returns:
+        An httpx client
+    """
+    return httpx.Client(**_http_client_options(), **kwargs)
+
+
+def create_async_http_client(**kwargs) -> httpx.AsyncClient:
+    """
+    Create an async HTTP client with the same timeouts as
+    create_http_client(), its pool holds as many requests as async views
+    wait on at once.
+
+    Args:
+        **kwargs: Any other httpx.AsyncClient argument, such as verify
+
+    Returns:
+        An async httpx client
+    """
+    return httpx.AsyncClient(
+        **_http_client_options(settings.AZURE_OPENAI_ASYNC_MAX_CONNECTIONS),
+        **kwargs,
+    )
+
+
+def _http_client_options(max_connections: Optional[int] = None) -> Dict:
+    """
+    Build the connection pool and timeout options of HTTP clients.
+
+    Args:
+        max_connections: Pool size. Defaults to AZURE_OPENAI_MAX_CONNECTIONS.
+
+    Returns:
+        A dict of httpx client arguments
+    """
+    max_connections = max_connections or settings.AZURE_OPENAI_MAX_CONNECTIONS
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=settings.AZURE_OPENAI_MAX_KEEPALIVE,
+        keepalive_expiry=settings.AZURE_OPENAI_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        settings.AZURE_OPENAI_READ_TIMEOUT,
+        connect=settings.AZURE_OPENAI_CONNECT_TIMEOUT,
+    )
+
+    # HTTP/2 needs the optional h2 package, fall back to HTTP/1.1 without it.
+    http2 = (
+        settings.AZURE_OPENAI_HTTP2
+        and importlib.util.find_spec("h2") is not None
+    )
+
+    return {"limits": limits, "timeout": timeout, "http2": http2}
+
+
+_client: Optional[AzureOpenAIClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> AzureOpenAIClient:
+    """
+    Get this process' shared Azure OpenAI client, creating it on first use.
+
+    Reusing 1 client per process keeps its connections to Azure warm so
+    requests skip the TCP and TLS handshakes.
+
+    Returns:
+        An AzureOpenAIClient instance
+    """
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AzureOpenAIClient()
+
+    return _client
+
+
+async def aclose_client() -> None:
+    """
+    Close the shared client's async connections of the running event loop,
+    if the shared client was ever created.
+
+    Returns:
+        None
+    """
+    if _client is not None:
+        await _client.aclose()
+
+    return None
+
+
+def reset_client() -> None:
+    """
+    Forget the shared client so the next get_client() call creates a new one.
+
+    This runs in every forked child (gunicorn and Celery workers) because
+    sockets inherited from the parent process must never be shared.
+
+    Returns:
+        None
+    """
+    global _client, _client_lock
+
+    _client = None
+    _client_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_client)